@@ -3,13 +3,19 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from datetime import datetime, timedelta
 import os
+import sys
 from functools import wraps
 import base64
 import jwt
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.database import configure_flask
+
 # Initialize Flask app and database
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///admin_controls.db'
+configure_flask(app, 'admin', 'instance/admin_controls.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this in production
 db = SQLAlchemy(app)
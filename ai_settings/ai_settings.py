@@ -2,14 +2,24 @@ from flask import Flask, Blueprint, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, time
 import os
+import sys
 import operator
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import track_changes, table_versions, make_etag, etag_matches
+from common.database import configure_flask
+
 # Initialize Flask app and database
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ai_settings.db'
+configure_flask(app, 'ai', 'instance/ai_settings.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# Keep per-table change counters for ETags
+track_changes(db.session)
+
 # AI Models
 class AITemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -362,8 +372,11 @@ def delete_template(template_id):
 # API Routes - Training Data
 @app.route('/ai/training', methods=['GET'])
 def get_training_data():
+    etag = make_etag(table_versions(db.session, [TrainingData.__tablename__]), sorted(request.args.items(multi=True)))
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return '', 304, {'ETag': etag}
     training = TrainingData.query.all()
-    return jsonify([t.to_dict() for t in training])
+    return jsonify([t.to_dict() for t in training]), 200, {'ETag': etag}
 
 @app.route('/ai/training', methods=['POST'])
 def create_training_data():
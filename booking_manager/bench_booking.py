@@ -0,0 +1,441 @@
+"""Benchmarks for the booking manager.
+
+Fills a scratch database with the synthetic data generator, then times
+the main endpoints through an in-process ASGI client (latency percentiles,
+throughput and status codes under concurrency), the availability
+lookup and single-worker conflict checks (original load-everything-and-
+filter, SQL anti-join, occupancy bitmaps) and
+compares peak memory of listing every shift as JSON and as an NDJSON
+stream, times bulk creation and assignment of 10k shifts through the API,
+times auto-assignment of a batch of open shifts, and hammers
+single assignments from many threads to count conflicts and double
+bookings. Every run uses the same seeds; ``--output`` saves the results
+with the run's settings and versions, for comparing runs. Run from the
+project root:
+
+    python -m booking_manager.bench_booking --workers 20000 --shifts 500000
+    python -m booking_manager.bench_booking --scenario api --output before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EPOCH = datetime(2030, 1, 1)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def legacy_available_workers(booking, db, shift_start, shift_end):
+    """The original implementation, kept here as the baseline."""
+    available_workers = db.query(booking.Worker).filter(booking.Worker.status == True).all()
+    conflicting_worker_ids = db.query(booking.Shift.worker_id).filter(
+        booking.Shift.start_time < shift_end,
+        booking.Shift.end_time > shift_start,
+        booking.Shift.status == booking.ShiftStatus.ACTIVE
+    ).distinct().all()
+    conflicting_ids = [row[0] for row in conflicting_worker_ids]
+    return [worker for worker in available_workers if worker.id not in conflicting_ids]
+
+
+def summarize(latencies, elapsed=None):
+    result = {
+        "calls": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+    if elapsed is not None:
+        result["throughput_rps"] = round(len(latencies) / elapsed, 1)
+    return result
+
+
+async def run_load(client, make_request, total, concurrency):
+    """``total`` requests from ``make_request()``, ``concurrency`` at a time."""
+    latencies = []
+    codes = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        method, url, options = make_request()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append(time.perf_counter() - started)
+            codes[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["status"] = {str(code): count for code, count in sorted(codes.items())}
+    return result
+
+
+def api_requests(booking, args):
+    """Request factories for the endpoints under test, by name"""
+    rng = random.Random(23)
+    with booking.engine.connect() as connection:
+        open_ids = connection.execute(booking.select(booking.Shift.id).where(
+            booking.Shift.status == booking.ShiftStatus.ACTIVE, booking.Shift.worker_id.is_(None),
+        ).order_by(booking.Shift.id)).scalars().all()
+        max_id = connection.execute(booking.select(func.max(booking.Shift.id))).scalar() or 0
+    rng.shuffle(open_ids)
+
+    def window(days=90, hours=4):
+        start = EPOCH + timedelta(minutes=15 * rng.randrange(days * 96))
+        return start, start + timedelta(hours=hours)
+
+    def by_status():
+        return "GET", "/shifts", {"params": {"status": "active", "limit": 100, "after_id": rng.randrange(max_id + 1)}}
+
+    def by_worker():
+        return "GET", "/shifts", {"params": {"worker_id": rng.randrange(1, args.workers + 1)}}
+
+    def by_flag_and_dates():
+        start, _ = window()
+        return "GET", "/shifts", {"params": {
+            "flag": "urgent", "limit": 100,
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=1)).isoformat(),
+        }}
+
+    def by_start_time():
+        start, _ = window()
+        return "GET", "/shifts", {"params": {"sort": "start_time", "after_start_time": start.isoformat(), "limit": 100}}
+
+    def available():
+        start, end = window()
+        return "GET", "/shifts/available-workers", {"params": {
+            "shift_start": start.isoformat(), "shift_end": end.isoformat(),
+        }}
+
+    def create():
+        # Past the generated range, so most succeed and some collide
+        start, end = window()
+        start, end = start + timedelta(days=400), end + timedelta(days=400)
+        return "POST", "/shifts", {"json": {
+            "worker_id": rng.randrange(1, args.workers + 1),
+            "start_time": start.isoformat(), "end_time": end.isoformat(),
+        }}
+
+    def assign():
+        shift_id = open_ids.pop() if open_ids else rng.randrange(1, max_id + 1)
+        worker_id = rng.randrange(1, args.workers + 1)
+        return "POST", f"/workers/{worker_id}/assign-shift", {"params": {"shift_id": shift_id}}
+
+    return {
+        "GET /shifts?status": by_status,
+        "GET /shifts?worker_id": by_worker,
+        "GET /shifts?flag&start_date&end_date": by_flag_and_dates,
+        "GET /shifts?sort=start_time": by_start_time,
+        "GET /shifts/available-workers": available,
+        "POST /shifts": create,
+        "POST /workers/{id}/assign-shift": assign,
+    }
+
+
+def api(booking, args):
+    """Each endpoint in turn, ``args.requests`` requests at ``args.concurrency``."""
+    booking.load_occupancy()
+
+    async def run():
+        results = {"requests": args.requests, "concurrency": args.concurrency}
+        transport = httpx.ASGITransport(app=booking.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, make_request in api_requests(booking, args).items():
+                results[name] = await run_load(client, make_request, args.requests, args.concurrency)
+        return results
+
+    return asyncio.run(run())
+
+
+def time_calls(fn, windows):
+    latencies = []
+    for window in windows:
+        started = time.perf_counter()
+        fn(*window)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def available_workers(booking, args):
+    rng = random.Random(11)
+    windows = []
+    for _ in range(args.calls):
+        start = EPOCH + timedelta(minutes=15 * rng.randrange(90 * 96))
+        windows.append((start, start + timedelta(hours=4)))
+
+    started = time.perf_counter()
+    booking.load_occupancy()
+    load_seconds = time.perf_counter() - started
+
+    db = booking.SessionLocal()
+    try:
+        worker_ids = [rng.randrange(1, args.workers + 1) for _ in windows]
+        conflicts = iter(worker_ids * 2)
+        results = {
+            "occupancy_load_seconds": round(load_seconds, 2),
+            "legacy": time_calls(lambda start, end: legacy_available_workers(booking, db, start, end), windows),
+            "anti_join": time_calls(lambda start, end: db.execute(booking.select(booking.Worker.__table__).where(
+                booking.Worker.status == True,
+                booking.Worker.id.notin_(booking.busy_worker_ids(start, end)),
+            )).all(), windows),
+            "occupancy": time_calls(lambda start, end: booking.get_available_workers(start, end, db), windows),
+            "conflict_sql": time_calls(lambda start, end: db.execute(booking.busy_worker_ids(start, end).where(
+                booking.Shift.worker_id == next(conflicts)).limit(1)).first(), windows),
+            "conflict_occupancy": time_calls(
+                lambda start, end: booking.worker_is_busy(db, next(conflicts), start, end), windows),
+        }
+        request = booking.AvailabilityRequest(windows=[{"start": start, "end": end} for start, end in windows])
+        started = time.perf_counter()
+        booking.get_available_workers_for_windows(request, db)
+        results["batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    finally:
+        db.close()
+    return results
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 2), "peak_mb": round(peak / 2 ** 20, 1), "bytes": size}
+
+
+def list_shifts(booking):
+    """Full shift history as one JSON body versus an NDJSON stream."""
+    query = booking.select(booking.Shift.__table__).order_by(booking.Shift.id)
+
+    def as_json():
+        db = booking.SessionLocal()
+        try:
+            shifts = [booking.ShiftResponse.model_validate(row) for row in db.execute(query).all()]
+            return len(json.dumps([shift.model_dump(mode="json") for shift in shifts]))
+        finally:
+            db.close()
+
+    def as_ndjson():
+        async def consume():
+            size = 0
+            async for chunk in booking.ndjson_response(query).body_iterator:
+                size += len(chunk)
+            return size
+        return asyncio.run(consume())
+
+    return {"json": measure(as_json), "ndjson": measure(as_ndjson)}
+
+
+def bulk_shifts(booking, workers, items=10000):
+    """POST /shifts/bulk and /shifts/assign/bulk with ``items`` entries each."""
+    booking.load_occupancy()
+    rng = random.Random(13)
+    client = TestClient(booking.app)
+    shifts = []
+    for _ in range(items):
+        start = EPOCH + timedelta(days=120, minutes=15 * rng.randrange(7 * 96))
+        shifts.append({
+            "worker_id": rng.randrange(1, workers + 1),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=4)).isoformat(),
+        })
+
+    started = time.perf_counter()
+    created = client.post("/shifts/bulk", json={"shifts": shifts}).json()["created"]
+    create_seconds = time.perf_counter() - started
+
+    assignments = [{"shift_id": shift_id, "worker_id": rng.randrange(1, workers + 1)} for shift_id in created]
+    started = time.perf_counter()
+    assigned = client.post("/shifts/assign/bulk", json={"assignments": assignments}).json()["assigned"]
+    assign_seconds = time.perf_counter() - started
+    return {
+        "items": items,
+        "created": len(created),
+        "create_ms": round(create_seconds * 1000, 1),
+        "assigned": len(assigned),
+        "assign_ms": round(assign_seconds * 1000, 1),
+    }
+
+
+def auto_assign(booking, open_shifts, days=90):
+    """POST /shifts/auto-assign over ``open_shifts`` unassigned shifts."""
+    rng = random.Random(17)
+    flags = list(booking.ShiftFlag)
+    rows = []
+    for _ in range(open_shifts):
+        start = EPOCH + timedelta(minutes=15 * rng.randrange(days * 96))
+        rows.append({
+            "start_time": start,
+            "end_time": start + timedelta(hours=rng.choice((2, 4, 6, 8))),
+            "status": "ACTIVE",
+            "flag": rng.choice(flags).name,
+        })
+    with booking.engine.begin() as connection:
+        connection.execute(booking.Shift.__table__.insert(), rows)
+
+    client = TestClient(booking.app)
+    results = {"shifts": open_shifts}
+    for dry_run in (True, False):
+        started = time.perf_counter()
+        result = client.post("/shifts/auto-assign", json={"dry_run": dry_run, "include_cancelled": False}).json()
+        results["dry_run_ms" if dry_run else "commit_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    results["assigned"] = len(result["assignments"])
+    return results
+
+
+def legacy_assign(booking, db, worker_id, shift_id):
+    """Read, check, then write unconditionally: the pre-versioning flow."""
+    shift = db.execute(booking.select(booking.Shift.__table__).where(booking.Shift.id == shift_id)).first()
+    if db.execute(booking.busy_worker_ids(shift.start_time, shift.end_time).where(
+            booking.Shift.worker_id == worker_id).limit(1)).first():
+        raise HTTPException(status_code=409)
+    db.execute(booking.update(booking.Shift.__table__).where(booking.Shift.id == shift_id).values(worker_id=worker_id))
+    db.commit()
+
+
+def double_bookings(booking, since):
+    """Pairs of overlapping active shifts of one worker starting after ``since``"""
+    with booking.engine.connect() as connection:
+        return connection.execute(booking.text(
+            "SELECT count(*) FROM shifts a JOIN shifts b ON b.worker_id = a.worker_id AND b.id > a.id "
+            "AND b.start_time < a.end_time AND b.end_time > a.start_time "
+            "WHERE a.status = 'ACTIVE' AND b.status = 'ACTIVE' AND a.start_time >= :since AND b.start_time >= :since"
+        ), {"since": since}).scalar()
+
+
+def stress(booking, threads, attempts, workers=50):
+    """Concurrent single assignments of open shifts to a few contested workers."""
+    rng = random.Random(19)
+    results = {"threads": threads, "attempts": attempts}
+    for offset, name, assign in (
+        (200, "legacy", lambda db, worker_id, shift_id: legacy_assign(booking, db, worker_id, shift_id)),
+        (300, "conditional", lambda db, worker_id, shift_id: booking.assign_shift_to_worker(worker_id, shift_id, db=db)),
+    ):
+        # Open shifts packed into one day, so most attempts collide
+        since = EPOCH + timedelta(days=offset)
+        rows = []
+        for _ in range(attempts):
+            start = since + timedelta(minutes=15 * rng.randrange(96))
+            rows.append({"start_time": start, "end_time": start + timedelta(hours=2),
+                         "status": "ACTIVE", "flag": "NORMAL"})
+        with booking.engine.begin() as connection:
+            created = connection.execute(
+                booking.insert(booking.Shift.__table__).returning(booking.Shift.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+        booking.load_occupancy()
+        jobs = [(rng.randrange(1, workers + 1), shift_id) for shift_id in created]
+
+        def run(job):
+            db = booking.SessionLocal()
+            try:
+                assign(db, *job)
+                return 200
+            except HTTPException as error:
+                return error.status_code
+            finally:
+                db.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            codes = list(pool.map(run, jobs))
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "per_second": round(len(jobs) / elapsed),
+            "assigned": codes.count(200),
+            "conflicts": codes.count(409),
+            "double_bookings": double_bookings(booking, since),
+        }
+    return results
+
+
+SCENARIOS = {
+    "api": api,
+    "available_workers": available_workers,
+    "bulk_shifts": lambda booking, args: bulk_shifts(booking, args.workers),
+    "auto_assign": lambda booking, args: auto_assign(booking, args.open_shifts),
+    "stress": lambda booking, args: stress(booking, args.threads, args.attempts),
+    "list_shifts": lambda booking, args: list_shifts(booking),
+}
+
+
+def run_info(args):
+    """Settings and versions, so saved results say what they measured"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "args": vars(args),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=20000)
+    parser.add_argument("--shifts", type=int, default=500000)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--open-shifts", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=2000)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="run only this scenario (repeatable; default all)")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"run": run_info(args)}
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["BOOKING_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bookings.db')}"
+        from booking_manager import datagen
+        from booking_manager import main as booking
+        from common.database import create_schema
+
+        create_schema(booking.Base.metadata, booking.engine)
+        started = time.perf_counter()
+        datagen.generate(booking, args.workers, args.shifts, start=EPOCH.date())
+        results["seed_seconds"] = round(time.perf_counter() - started, 2)
+        for name in args.scenario or SCENARIOS:
+            results[name] = SCENARIOS[name](booking, args)
+        booking.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Synthetic workers and shifts at scale.
+
+Workers get one shift a day at most, drawn from common shift patterns, so
+active shifts never overlap; past shifts are mostly completed, future ones
+mostly active with some cancelled, standby and open (unassigned) shifts.
+Rows are generated and inserted in batches, so millions of shifts never sit
+in memory at once. Run from the project root to fill the configured
+database (BOOKING_DATABASE_URL):
+
+    python -m booking_manager.datagen --workers 20000 --shifts 1000000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = (
+    "Ada", "Ben", "Carla", "Dev", "Elena", "Farah", "Gus", "Hana", "Ivan", "Jo",
+    "Kemal", "Lena", "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sam", "Tariq",
+    "Uma", "Victor", "Wen", "Yara", "Zoe",
+)
+LAST_NAMES = (
+    "Abbott", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jensen",
+    "Kowalski", "Lopez", "Murphy", "Nguyen", "Okafor", "Patel", "Rossi", "Singh", "Tanaka", "Walsh",
+)
+
+# (start hour, hours, weight): day, early, late and night shifts plus a few
+# short ones; none runs past the next morning's 06:00
+PATTERNS = ((6, 8, 25), (8, 8, 30), (14, 8, 20), (22, 8, 10), (9, 4, 10), (17, 5, 5))
+
+FLAGS = (("NORMAL", 80), ("HIGH_PRIORITY", 8), ("URGENT", 7), ("NO_SHOW_RISK", 5))
+PAST_STATUSES = (("COMPLETED", 85), ("CANCELLED", 10), ("ACTIVE", 5))
+FUTURE_STATUSES = (("ACTIVE", 85), ("CANCELLED", 8), ("STANDBY", 7))
+NOTES = ("Cover for sick leave", "Bring ID badge", "Client requested", "Training shift", "Event setup")
+
+# Share of future active shifts left open for auto-assignment
+OPEN_SHARE = 0.05
+
+
+def _weighted(rng, choices, count):
+    values = [value for value, _ in choices]
+    weights = [weight for _, weight in choices]
+    return rng.choices(values, weights, k=count)
+
+
+def worker_rows(rng, count, now):
+    for i in range(count):
+        created = now - timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+        yield {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+            "status": rng.random() < 0.9,
+            "is_standby": rng.random() < 0.15,
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+def shift_batches(rng, worker_ids, shifts, start, days, now, batch_size):
+    """Lists of up to ``batch_size`` shift rows, ``shifts`` in total.
+
+    Spread evenly over ``days`` days from ``start``; each day a different
+    sample of workers gets one shift.
+    """
+    per_day, extra = divmod(shifts, days)
+    batch = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        count = per_day + (offset < extra)
+        if not count:
+            continue
+        workers = rng.sample(worker_ids, count)
+        patterns = _weighted(rng, [((hour, hours), weight) for hour, hours, weight in PATTERNS], count)
+        flags = _weighted(rng, FLAGS, count)
+        past = _weighted(rng, PAST_STATUSES, count)
+        future = _weighted(rng, FUTURE_STATUSES, count)
+        for i, (worker_id, (hour, hours), flag) in enumerate(zip(workers, patterns, flags)):
+            begins = datetime.combine(day, clock(hour))
+            upcoming = begins >= now
+            status = future[i] if upcoming else past[i]
+            if upcoming and status == "ACTIVE" and rng.random() < OPEN_SHARE:
+                worker_id = None
+            created = min(now, begins) - timedelta(days=rng.randrange(1, 30))
+            batch.append({
+                "start_time": begins,
+                "end_time": begins + timedelta(hours=hours),
+                "status": status,
+                "flag": flag,
+                "worker_id": worker_id,
+                "notes": rng.choice(NOTES) if rng.random() < 0.1 else None,
+                "created_at": created,
+                "updated_at": created,
+            })
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def generate(booking, workers, shifts, days=None, start=None, seed=7, batch_size=50000):
+    """Insert ``workers`` workers and ``shifts`` shifts in one transaction.
+
+    ``days`` defaults to 90, widened when there are more shifts than
+    workers can take at one a day; ``start`` defaults to half the range
+    before today. Logs a ``reset`` change so running processes and change
+    feed clients reload instead of replaying every row.
+    """
+    from common.changes import bump_versions
+    from common.feed import record_changes
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    days = max(days or 90, math.ceil(shifts / workers)) if workers else 0
+    if start is None:
+        start = date.today() - timedelta(days=days // 2)
+    with booking.engine.begin() as connection:
+        worker_ids = []
+        rows = list(worker_rows(rng, workers, now))
+        for offset in range(0, len(rows), batch_size):
+            worker_ids += connection.execute(
+                booking.insert(booking.Worker.__table__).returning(booking.Worker.id, sort_by_parameter_order=True),
+                rows[offset:offset + batch_size],
+            ).scalars().all()
+        if worker_ids and shifts:
+            for batch in shift_batches(rng, worker_ids, shifts, start, days, now, batch_size):
+                connection.execute(booking.insert(booking.Shift.__table__), batch)
+        bump_versions(connection, ["workers", "shifts"])
+        record_changes(connection, [("reset", {})])
+    return {"workers": workers, "shifts": shifts if workers else 0, "days": days, "start": start.isoformat()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=20000)
+    parser.add_argument("--shifts", type=int, default=500000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--start", type=date.fromisoformat, help="first day (default: half the range before today)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from booking_manager import main as booking
+    from common.database import create_schema
+
+    create_schema(booking.Base.metadata, booking.engine)
+    started = time.perf_counter()
+    result = generate(booking, args.workers, args.shifts, args.days, args.start, args.seed)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,43 @@
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from typing import List, Optional, TYPE_CHECKING
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Date, DateTime, Time, Boolean, ForeignKey, Enum, Index, MetaData, Table, and_, bindparam, exists, inspect, insert, literal, or_, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum as PyEnum
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import bump_versions, track_changes, table_versions, make_etag, etag_matches
+from common.database import create_schema, get_engine
+from common.feed import READ_BATCH, ChangeFeed, latest_seq, log_changes, log_table, read_changes, track_events
+from booking_manager.matching import match
+from booking_manager.occupancy import Occupancy
+from booking_manager.recurrence import expand, mask_weekdays, weekday_mask
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Booking Manager API")
 
-# Database configuration
-import os
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'bookings.db')}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# Database configuration (BOOKING_DATABASE_URL overrides the default file)
+engine = get_engine("booking", "booking_manager/bookings.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Keep per-table change counters for ETags
+track_changes(SessionLocal)
+
 class ShiftStatus(str, PyEnum):
     ACTIVE = "active"
     COMPLETED = "completed"
@@ -39,11 +60,37 @@ class Shift(Base):
     flag = Column(Enum(ShiftFlag))
     worker_id = Column(Integer, ForeignKey("workers.id"))
     notes = Column(String)
+    template_id = Column(Integer, ForeignKey("shift_templates.id"))
+    occurrence_date = Column(Date)
+    # Bumped by every write; updates only apply to the version they read
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     worker = relationship("Worker", back_populates="shifts")
 
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        # Overlap lookups: range scan on active shifts by start time, with
+        # end_time and worker_id read from the index instead of the table
+        Index("ix_shifts_status_start_end", "status", "start_time", "end_time", "worker_id"),
+        # Keyset pages ordered by (start_time, id); id is the rowid, so it
+        # is part of every SQLite index already
+        Index("ix_shifts_start_time", "start_time"),
+        # One row per template occurrence, so materializing twice is a no-op
+        Index("ux_shifts_template_occurrence", "template_id", "occurrence_date", unique=True),
+        # One worker's shifts by time, for the conflict check inside writes
+        # and GET /shifts?worker_id=; the check filters on end_time and
+        # status in the index, so only clashing rows are read from the table
+        Index("ix_shifts_worker_start_end", "worker_id", "start_time", "end_time", "status"),
+        # GET /shifts?flag= (optionally with status and a date range)
+        Index("ix_shifts_flag_status_start", "flag", "status", "start_time"),
+        # GET /shifts?status= pages in id order: entries of one status are
+        # already sorted by rowid
+        Index("ix_shifts_status", "status"),
+    )
+
 class Worker(Base):
     __tablename__ = "workers"
     
@@ -56,6 +103,76 @@ class Worker(Base):
     
     shifts = relationship("Shift", back_populates="worker")
 
+class ShiftTemplate(Base):
+    __tablename__ = "shift_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    weekday_mask = Column(Integer)  # bit 0 is Monday
+    start_time = Column(Time)
+    duration_minutes = Column(Integer)
+    start_date = Column(Date)
+    end_date = Column(Date)  # None repeats indefinitely
+    worker_id = Column(Integer, ForeignKey("workers.id"))  # None leaves shifts open for the pool
+    flag = Column(Enum(ShiftFlag), default=ShiftFlag.NORMAL)
+    notes = Column(String)
+    materialized_until = Column(Date)  # last date expanded into shifts
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    exceptions = relationship("ShiftTemplateException", back_populates="template")
+
+    @property
+    def weekdays(self):
+        return mask_weekdays(self.weekday_mask)
+
+class ShiftTemplateException(Base):
+    __tablename__ = "shift_template_exceptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(Integer, ForeignKey("shift_templates.id"))
+    date = Column(Date)
+    skip = Column(Boolean, default=False)
+    worker_id = Column(Integer, ForeignKey("workers.id"))  # replacement worker for that date
+    notes = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    template = relationship("ShiftTemplate", back_populates="exceptions")
+
+    __table_args__ = (
+        Index("ux_template_exceptions_date", "template_id", "date", unique=True),
+    )
+
+# Change feed: shift and worker writes are logged as they commit and pushed
+# to /changes subscribers from one in-process reader
+log_table(Base.metadata)
+feed = ChangeFeed(
+    engine,
+    replay_size=int(os.getenv("CHANGE_FEED_REPLAY", 1000)),
+    queue_size=int(os.getenv("CHANGE_FEED_QUEUE", 1000)),
+)
+
+def describe_change(obj, created):
+    if isinstance(obj, Shift):
+        if created:
+            kind = "shift.created"
+        elif inspect(obj).attrs.worker_id.history.has_changes():
+            kind = "shift.assigned"
+        else:
+            kind = "shift.updated"
+    elif isinstance(obj, Worker):
+        kind = "worker.created" if created else "worker.updated"
+    else:
+        return None
+    return kind, {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+track_events(SessionLocal, describe_change, on_commit=feed.notify)
+
+def log_shift_changes(db: Session, kind: str, ids):
+    """Log ``kind`` events for shifts changed by Core statements"""
+    rows = db.execute(select(Shift.__table__).where(Shift.id.in_(list(ids)))).all()
+    log_changes(db, [(kind, row._mapping) for row in rows])
+
 # Pydantic Models
 class WorkerBase(BaseModel):
     name: str
@@ -78,7 +195,7 @@ class ShiftBase(BaseModel):
     end_time: datetime
     status: ShiftStatus = ShiftStatus.ACTIVE
     flag: ShiftFlag = ShiftFlag.NORMAL
-    worker_id: int
+    worker_id: Optional[int] = None
     notes: Optional[str] = None
 
 class ShiftCreate(BaseModel):
@@ -92,15 +209,116 @@ class ShiftUpdate(BaseModel):
     status: Optional[ShiftStatus] = None
     flag: Optional[ShiftFlag] = None
     notes: Optional[str] = None
+    version: Optional[int] = None  # the version read; defaults to the current one
 
 class ShiftResponse(ShiftBase):
     id: int
+    template_id: Optional[int] = None
+    occurrence_date: Optional[date] = None
+    version: int
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+class BulkShiftCreate(BaseModel):
+    shifts: List[ShiftCreate] = Field(..., max_length=10000)
+
+class ShiftAssignment(BaseModel):
+    shift_id: int
+    worker_id: int
+
+class BulkShiftAssignment(ShiftAssignment):
+    version: Optional[int] = None  # the version read; defaults to the current one
+
+class BulkShiftAssign(BaseModel):
+    assignments: List[BulkShiftAssignment] = Field(..., max_length=10000)
+
+class BulkItemError(BaseModel):
+    index: int
+    detail: str
+
+class BulkShiftResult(BaseModel):
+    created: List[int]
+    errors: List[BulkItemError]
+
+class BulkAssignResult(BaseModel):
+    assigned: List[int]
+    errors: List[BulkItemError]
+
+class AutoAssignRequest(BaseModel):
+    shift_ids: Optional[List[int]] = Field(None, max_length=10000)  # default: every open shift
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    include_cancelled: bool = True
+    use_standby: bool = True
+    dry_run: bool = True
+
+class AutoAssignResult(BaseModel):
+    dry_run: bool
+    assignments: List[ShiftAssignment]
+    unassigned: List[int]
+
+class TemplateCreate(BaseModel):
+    name: str
+    weekdays: List[int] = Field(..., min_length=1)  # 0 is Monday
+    start_time: time
+    duration_minutes: int = Field(..., gt=0, le=24 * 60)
+    start_date: date
+    end_date: Optional[date] = None
+    worker_id: Optional[int] = None
+    flag: ShiftFlag = ShiftFlag.NORMAL
+    notes: Optional[str] = None
+
+class TemplateResponse(BaseModel):
+    id: int
+    name: str
+    weekdays: List[int]
+    start_time: time
+    duration_minutes: int
+    start_date: date
+    end_date: Optional[date] = None
+    worker_id: Optional[int] = None
+    flag: ShiftFlag
+    notes: Optional[str] = None
+    materialized_until: Optional[date] = None
+
+    class Config:
+        from_attributes = True
+
+class TemplateExceptionCreate(BaseModel):
+    date: date
+    skip: bool = False
+    worker_id: Optional[int] = None
+    notes: Optional[str] = None
+
+class TemplateExceptionResponse(TemplateExceptionCreate):
+    id: int
+    template_id: int
+
+    class Config:
+        from_attributes = True
+
+class Occurrence(BaseModel):
+    template_id: int
+    occurrence_date: date
+    start_time: datetime
+    end_time: datetime
+    worker_id: Optional[int] = None
+    flag: ShiftFlag
+    notes: Optional[str] = None
+
+class TimeWindow(BaseModel):
+    start: datetime
+    end: datetime
+
+class AvailabilityRequest(BaseModel):
+    windows: List[TimeWindow]
+
+class WindowAvailability(TimeWindow):
+    worker_ids: List[int]
+
 # Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -110,6 +328,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Largest page a list endpoint returns; use format=ndjson for everything
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per round trip while streaming NDJSON
+STREAM_BATCH_SIZE = 1000
+
+# Days ahead that recurring templates are kept expanded into shifts
+TEMPLATE_HORIZON_DAYS = int(os.getenv("TEMPLATE_HORIZON_DAYS", 14))
+
+# Longest range GET /templates/occurrences expands in one call
+MAX_OCCURRENCE_DAYS = 366
+
 # Dependency - SINGLE DEFINITION
 def get_db():
     db = SessionLocal()
@@ -118,30 +348,345 @@ def get_db():
     finally:
         db.close()
 
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def ndjson_response(query, headers=None):
+    """Stream a Core select as newline-delimited JSON in constant memory.
+
+    Uses its own session, which stays open only while the body is streamed.
+    """
+    def lines():
+        db = SessionLocal()
+        try:
+            result = db.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            for rows in result.partitions():
+                yield "".join(json.dumps(dict(row._mapping), default=_json_default) + "\n" for row in rows)
+        finally:
+            db.close()
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+def next_page_link(request: Request, response: Response, rows, limit, **cursor):
+    """Set a Link header for the page after ``rows`` when the page was full"""
+    if limit and len(rows) == limit:
+        url = request.url.include_query_params(**cursor)
+        response.headers["Link"] = f'<{url}>; rel="next"'
+
+def template_exceptions(db: Session, template_ids, start: date, end: date):
+    """Exceptions between the dates, keyed by template id then date"""
+    exceptions = {}
+    if template_ids:
+        for exception in db.query(ShiftTemplateException).filter(
+            ShiftTemplateException.template_id.in_(template_ids),
+            ShiftTemplateException.date >= start,
+            ShiftTemplateException.date <= end,
+        ):
+            exceptions.setdefault(exception.template_id, {})[exception.date] = exception
+    return exceptions
+
+def materialize_templates(db: Session, until: date, template_ids=None):
+    """Expand templates into shifts up to ``until``.
+
+    Returns the number of occurrences expanded and the ids of the shifts
+    created open because their worker was already booked at that time.
+    Each template resumes the day after its ``materialized_until`` watermark
+    (never before today), so rows already created are never regenerated and
+    the unique (template_id, occurrence_date) index guards against races.
+    """
+    today = date.today()
+    query = db.query(ShiftTemplate).filter(
+        or_(ShiftTemplate.materialized_until.is_(None), ShiftTemplate.materialized_until < until),
+        or_(ShiftTemplate.end_date.is_(None), ShiftTemplate.end_date >= today),
+    )
+    if template_ids is not None:
+        query = query.filter(ShiftTemplate.id.in_(template_ids))
+    templates = query.all()
+    if not templates:
+        return 0, []
+
+    starts = {}
+    for template in templates:
+        resume = template.materialized_until + timedelta(days=1) if template.materialized_until else template.start_date
+        starts[template.id] = max(resume, today)
+    exceptions = template_exceptions(db, list(starts), min(starts.values()), until)
+
+    rows = []
+    for template in templates:
+        for occurrence in expand(template, starts[template.id], until, exceptions.get(template.id, {})):
+            rows.append(dict(occurrence, status=ShiftStatus.ACTIVE))
+        template.materialized_until = until
+
+    unassigned = []
+    if rows:
+        # Occurrences whose worker is already booked go in open, with the
+        # checks of create_shifts_bulk
+        windows = {
+            index: (row["worker_id"], row["start_time"], row["end_time"], None)
+            for index, row in enumerate(rows) if row["worker_id"] is not None
+        }
+        busy = busy_items(db, windows)
+        busy |= batch_overlaps({index: window for index, window in windows.items() if index not in busy})
+        opened = set()
+        for index in busy:
+            rows[index]["worker_id"] = None
+            opened.add((rows[index]["template_id"], rows[index]["occurrence_date"]))
+
+        shifts = Shift.__table__
+        result = db.connection().execute(
+            sqlite_insert(shifts)
+            .on_conflict_do_nothing(index_elements=[shifts.c.template_id, shifts.c.occurrence_date])
+            .returning(*shifts.c),
+            rows
+        ).all()
+        # Backstop for a shift booked since the check: open those too
+        assigned = [row.id for row in result if row.worker_id is not None]
+        clashes = set(db.execute(select(shifts.c.id).where(
+            shifts.c.id.in_(assigned), ~worker_free(shifts.c.worker_id)
+        )).scalars()) if assigned else set()
+        if clashes:
+            db.execute(update(shifts).where(shifts.c.id.in_(clashes)).values(worker_id=None))
+        unassigned = sorted(
+            row.id for row in result
+            if row.id in clashes or (row.template_id, row.occurrence_date) in opened
+        )
+        # Core statements bypass the ORM flush hooks for ETags and the feed
+        log_changes(db, [
+            ("shift.created", dict(row._mapping, worker_id=None) if row.id in clashes else row._mapping)
+            for row in result
+        ])
+        bump_versions(db.connection(), ["shifts"])
+    db.commit()
+    return len(rows), unassigned
+
+def roll_template_horizon():
+    """Materialize every template up to TEMPLATE_HORIZON_DAYS from today"""
+    db = SessionLocal()
+    try:
+        materialize_templates(db, date.today() + timedelta(days=TEMPLATE_HORIZON_DAYS))
+    finally:
+        db.close()
+
+_materializer = None
+_materializer_lock = threading.Lock()
+
+def _materialize_daily():
+    while True:
+        try:
+            roll_template_horizon()
+        except Exception:
+            # The horizon keeps what it has; the next day's run catches up
+            logger.exception("Materializing templates failed")
+        tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        threading.Event().wait((tomorrow - datetime.now()).total_seconds())
+
+def start_materializer():
+    """Roll the template horizon now and after every midnight, in a daemon
+    thread, so reads never write; starts once per process"""
+    global _materializer
+    with _materializer_lock:
+        if _materializer is None:
+            _materializer = threading.Thread(target=_materialize_daily, name="template-materializer", daemon=True)
+            _materializer.start()
+
+# Occupancy bitmaps of this process. Writes from any process bump the shifts
+# change counter and log their rows to the change log; a moved counter makes
+# the next check re-read the days of the shifts logged since the last sync
+# (shift times never change, so a cancelled or reassigned shift only affects
+# days it still crosses).
+occupancy = Occupancy()
+_occupancy_lock = threading.Lock()
+
+# Catch-ups touching more days than this rebuild everything instead
+OCCUPANCY_MAX_REFRESH_DAYS = 31
+
+def _active_assigned():
+    return select(Shift.worker_id, Shift.start_time, Shift.end_time).where(
+        Shift.status == ShiftStatus.ACTIVE,
+        Shift.worker_id.isnot(None),
+    )
+
+def _rebuild_occupancy(db: Session, versions):
+    global occupancy
+    fresh = Occupancy()
+    # Same read transaction as the rows, so nothing falls between the two
+    fresh.seq = latest_seq(db.connection())
+    result = db.execute(_active_assigned().execution_options(yield_per=STREAM_BATCH_SIZE))
+    for rows in result.partitions():
+        for worker_id, start, end in rows:
+            fresh.add(worker_id, start, end)
+    fresh.version = versions
+    occupancy = fresh
+
+def _logged_days(db: Session, after):
+    """Last sequence and days crossed by shifts logged after ``after``.
+
+    None when the log no longer reaches back that far, a bulk load logged a
+    reset, or the days are too many to refresh one by one.
+    """
+    days = set()
+    while True:
+        changes = read_changes(db.connection(), after)
+        if changes and changes[0].seq > after + 1 and after == occupancy.seq:
+            return None
+        for change in changes:
+            if change.type == "reset":
+                # Bulk load: too many rows to log one by one
+                return None
+            if change.type.startswith("shift."):
+                data = json.loads(change.data)
+                start = datetime.fromisoformat(data["start_time"]) if data.get("start_time") else None
+                end = datetime.fromisoformat(data["end_time"]) if data.get("end_time") else None
+                if start is not None and end is not None and end > start:
+                    occupancy.longest = max(occupancy.longest, end - start)
+                    days.update(range(start.toordinal(), end.toordinal() + 1))
+        if len(days) > OCCUPANCY_MAX_REFRESH_DAYS:
+            return None
+        if changes:
+            after = changes[-1].seq
+        if len(changes) < READ_BATCH:
+            return after, days
+
+def sync_occupancy(db: Session):
+    """Bring the occupancy bitmaps up to date with the shifts table"""
+    versions = table_versions(db, ["shifts"])
+    if versions == occupancy.version:
+        return
+    with _occupancy_lock:
+        if versions == occupancy.version:
+            return
+        logged = None
+        if occupancy.version is not None and versions[0] == occupancy.version[0]:
+            logged = _logged_days(db, occupancy.seq)
+        if logged is None:
+            _rebuild_occupancy(db, versions)
+            return
+
+        seq, days = logged
+        if days:
+            # One range per run of consecutive days, so writes to far apart
+            # dates do not pull in everything between them
+            ranges = []
+            for day in sorted(days):
+                if ranges and ranges[-1][1] == day:
+                    ranges[-1][1] = day + 1
+                else:
+                    ranges.append([day, day + 1])
+            rows = db.execute(_active_assigned().where(or_(*[
+                and_(
+                    Shift.start_time >= datetime.fromordinal(first) - occupancy.longest,
+                    Shift.start_time < datetime.fromordinal(last),
+                    Shift.end_time > datetime.fromordinal(first),
+                )
+                for first, last in ranges
+            ]))).all()
+            occupancy.replace_days(days, rows)
+        occupancy.version, occupancy.seq = versions, seq
+
+def load_occupancy():
+    """Rebuild the occupancy bitmaps from the database in one streaming pass"""
+    db = SessionLocal()
+    try:
+        with _occupancy_lock:
+            _rebuild_occupancy(db, table_versions(db, ["shifts"]))
+    finally:
+        db.close()
+
+def worker_is_busy(db: Session, worker_id: int, start: datetime, end: datetime):
+    """Whether the worker has an active shift overlapping the window"""
+    sync_occupancy(db)
+    busy = occupancy.conflicts(worker_id, start, end)
+    if busy is None:
+        # Both sides only partly cover a shared 15-minute slot
+        busy = db.execute(
+            busy_worker_ids(start, end).where(Shift.worker_id == worker_id).limit(1)
+        ).first() is not None
+    return busy
+
+def busy_workers(db: Session, start: datetime, end: datetime):
+    """Ids of workers with an active shift overlapping the window"""
+    sync_occupancy(db)
+    busy, unsure = occupancy.busy_workers(start, end)
+    if unsure:
+        busy |= {row[0] for row in db.execute(
+            busy_worker_ids(start, end).where(Shift.worker_id.in_(unsure))
+        )}
+    return busy
+
+@app.on_event("startup")
+def startup_load_occupancy():
+    load_occupancy()
+    start_materializer()
+
 # API Endpoints
+def shifts_query(status=None, flag=None, worker_id=None, start_date=None, end_date=None,
+                 sort="id", after_id=None, after_start_time=None, limit=None):
+    """The ``GET /shifts`` query; every filter combination has an index to seek on"""
+    query = select(Shift.__table__)
+    if status:
+        query = query.where(Shift.status == status)
+    if flag:
+        query = query.where(Shift.flag == flag)
+    if worker_id:
+        query = query.where(Shift.worker_id == worker_id)
+    if start_date:
+        query = query.where(Shift.start_time >= start_date)
+    if end_date:
+        # Shifts end after they start, so the start_time bound is implied;
+        # it gives an end_date-only filter an index range to seek on
+        query = query.where(Shift.end_time <= end_date, Shift.start_time < end_date)
+
+    # Keyset pagination: stable order, and each page seeks straight to the
+    # cursor in the index instead of skipping an OFFSET
+    if sort == "start_time" or after_start_time is not None:
+        if after_start_time is not None:
+            query = query.where(tuple_(Shift.start_time, Shift.id) > (after_start_time, after_id or 0))
+        query = query.order_by(Shift.start_time, Shift.id)
+    else:
+        if after_id is not None:
+            query = query.where(Shift.id > after_id)
+        # With only a date range, "+ 0" keeps SQLite from walking the whole
+        # table in id order to skip rows outside it; it seeks on start_time
+        # and sorts the matches instead
+        dates_only = (start_date or end_date) and not (status or flag or worker_id)
+        query = query.order_by(Shift.id + 0 if dates_only else Shift.id)
+    if limit:
+        query = query.limit(limit)
+    return query
+
 @app.get("/shifts", response_model=List[ShiftResponse])
 def get_shifts(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     status: Optional[ShiftStatus] = None,
     flag: Optional[ShiftFlag] = None,
     worker_id: Optional[int] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    sort: str = Query("id", pattern="^(id|start_time)$"),
+    after_id: Optional[int] = None,
+    after_start_time: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$")
 ):
-    query = db.query(Shift)
-    
-    if status:
-        query = query.filter(Shift.status == status)
-    if flag:
-        query = query.filter(Shift.flag == flag)
-    if worker_id:
-        query = query.filter(Shift.worker_id == worker_id)
-    if start_date:
-        query = query.filter(Shift.start_time >= start_date)
-    if end_date:
-        query = query.filter(Shift.end_time <= end_date)
-    
-    return query.all()
+    etag = make_etag(table_versions(db, ["shifts"]), sorted(request.query_params.multi_items()))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    query = shifts_query(status, flag, worker_id, start_date, end_date, sort, after_id, after_start_time, limit)
+
+    if format == "ndjson":
+        return ndjson_response(query, headers={"ETag": etag})
+
+    rows = db.execute(query).all()
+    if rows and (sort == "start_time" or after_start_time is not None):
+        next_page_link(request, response, rows, limit, after_id=rows[-1].id, after_start_time=rows[-1].start_time.isoformat())
+    elif rows:
+        next_page_link(request, response, rows, limit, after_id=rows[-1].id)
+    return rows
 
 @app.post("/shifts", response_model=ShiftResponse)
 def create_shift(shift: ShiftCreate, db: Session = Depends(get_db)):
@@ -149,47 +694,195 @@ def create_shift(shift: ShiftCreate, db: Session = Depends(get_db)):
     worker = db.query(Worker).filter(Worker.id == shift.worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
-    
-    db_shift = Shift(
-        start_time=shift.start_time,
-        end_time=shift.end_time,
-        worker_id=shift.worker_id,
-        flag=shift.flag,
-        notes=shift.notes,
-        status=ShiftStatus.ACTIVE
+    if shift.end_time <= shift.start_time:
+        raise HTTPException(status_code=422, detail="end_time must be after start_time")
+    if worker_is_busy(db, shift.worker_id, shift.start_time, shift.end_time):
+        raise HTTPException(status_code=409, detail="Worker already has a shift at that time")
+
+    # INSERT ... SELECT ... WHERE NOT EXISTS: the worker is checked again by
+    # the statement itself, so concurrent requests cannot both book the slot
+    shifts = Shift.__table__
+    now = datetime.utcnow()
+    values = {
+        "start_time": shift.start_time,
+        "end_time": shift.end_time,
+        "worker_id": shift.worker_id,
+        "flag": shift.flag,
+        "notes": shift.notes,
+        "status": ShiftStatus.ACTIVE,
+        "version": 1,
+        "created_at": now,
+        "updated_at": now,
+    }
+    source = select(*[literal(value, shifts.c[key].type).label(key) for key, value in values.items()]).where(
+        ~busy_worker_ids(shift.start_time, shift.end_time).where(Shift.worker_id == shift.worker_id).exists()
     )
-    db.add(db_shift)
+    row = db.execute(insert(shifts).from_select(list(values), source).returning(*shifts.c)).first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Worker already has a shift at that time")
+    log_changes(db, [("shift.created", row._mapping)])
+    bump_versions(db.connection(), ["shifts"])
     db.commit()
-    db.refresh(db_shift)
-    return db_shift
+    sync_occupancy(db)
+    return row
+
+def existing_ids(db: Session, column, ids):
+    """The subset of ``ids`` present in ``column``, in one query"""
+    ids = set(ids)
+    if not ids:
+        return set()
+    return {row[0] for row in db.execute(select(column).where(column.in_(ids)))}
+
+@app.post("/shifts/bulk", response_model=BulkShiftResult)
+def create_shifts_bulk(request: BulkShiftCreate, db: Session = Depends(get_db)):
+    """Create many shifts in one transaction; invalid items are reported, not fatal"""
+    workers = existing_ids(db, Worker.id, (shift.worker_id for shift in request.shifts))
+    rows, indexes, errors = [], [], []
+    for index, shift in enumerate(request.shifts):
+        if shift.worker_id not in workers:
+            errors.append(BulkItemError(index=index, detail="Worker not found"))
+        elif shift.end_time <= shift.start_time:
+            errors.append(BulkItemError(index=index, detail="end_time must be after start_time"))
+        else:
+            rows.append({
+                "start_time": shift.start_time,
+                "end_time": shift.end_time,
+                "worker_id": shift.worker_id,
+                "flag": shift.flag,
+                "notes": shift.notes,
+                "status": ShiftStatus.ACTIVE,
+            })
+            indexes.append(index)
+
+    result = []
+    if rows:
+        # Overlaps with existing shifts in one anti-join, then within the
+        # batch; what is left cannot clash, so it goes in as one executemany
+        windows = {index: (row["worker_id"], row["start_time"], row["end_time"], None) for index, row in zip(indexes, rows)}
+        busy = busy_items(db, windows)
+        busy |= batch_overlaps({index: window for index, window in windows.items() if index not in busy})
+        errors.extend(BulkItemError(index=index, detail="Worker already has a shift at that time") for index in busy)
+        errors.sort(key=lambda error: error.index)
+        now = datetime.utcnow()
+        rows = [dict(row, version=1, created_at=now, updated_at=now)
+                for index, row in zip(indexes, rows) if index not in busy]
+    if rows:
+        shifts = Shift.__table__
+        result = sorted(db.connection().execute(insert(shifts).returning(*shifts.c), rows), key=lambda row: row.id)
+        # Backstop for a shift booked since the check
+        created = [row.id for row in result]
+        clashes = db.execute(select(shifts.c.id).where(
+            shifts.c.id.in_(created), ~worker_free(shifts.c.worker_id)
+        ).limit(1)).first()
+        if clashes is not None:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Shifts changed while creating; retry")
+        # Core statements bypass the ORM flush hooks for ETags and the feed
+        log_changes(db, [("shift.created", row._mapping) for row in result])
+        bump_versions(db.connection(), ["shifts"])
+        db.commit()
+    return BulkShiftResult(created=[row.id for row in result], errors=errors)
+
+@app.post("/shifts/assign/bulk", response_model=BulkAssignResult)
+def assign_shifts_bulk(request: BulkShiftAssign, db: Session = Depends(get_db)):
+    """Assign many shifts to workers in one transaction"""
+    items = request.assignments
+    workers = existing_ids(db, Worker.id, (item.worker_id for item in items))
+    shifts = Shift.__table__
+    targets = {row.id: row for row in db.execute(
+        select(shifts.c.id, shifts.c.start_time, shifts.c.end_time, shifts.c.status, shifts.c.version)
+        .where(shifts.c.id.in_({item.shift_id for item in items}))
+    )} if items else {}
+    rows, windows, errors, seen = {}, {}, [], set()
+    now = datetime.utcnow()
+    for index, item in enumerate(items):
+        target = targets.get(item.shift_id)
+        if item.worker_id not in workers:
+            errors.append(BulkItemError(index=index, detail="Worker not found"))
+        elif target is None:
+            errors.append(BulkItemError(index=index, detail="Shift not found"))
+        elif item.version is not None and item.version != target.version:
+            errors.append(BulkItemError(index=index, detail="Shift was changed by someone else; reload and retry"))
+        elif item.shift_id in seen:
+            errors.append(BulkItemError(index=index, detail="Shift appears earlier in the batch"))
+        else:
+            seen.add(item.shift_id)
+            rows[index] = {"b_shift_id": item.shift_id, "b_worker_id": item.worker_id,
+                           "b_version": target.version, "b_updated_at": now}
+            if target.status == ShiftStatus.ACTIVE:
+                windows[index] = (item.worker_id, target.start_time, target.end_time, item.shift_id)
+
+    # As in create_shifts_bulk; a worker's current shifts count even when
+    # the batch moves them to someone else, so swaps are refused
+    busy = busy_items(db, windows)
+    busy |= batch_overlaps({index: window for index, window in windows.items() if index not in busy})
+    errors.extend(BulkItemError(index=index, detail="Worker already has a shift at that time") for index in busy)
+    errors.sort(key=lambda error: error.index)
+    rows = [row for index, row in rows.items() if index not in busy]
+
+    assigned = []
+    if rows:
+        # The guard of assign_shift_to_worker, as a backstop: a row count
+        # short of the batch means a shift changed since it was read
+        statement = (
+            update(shifts)
+            .where(
+                shifts.c.id == bindparam("b_shift_id"),
+                shifts.c.version == bindparam("b_version"),
+                or_(Shift.status != ShiftStatus.ACTIVE, worker_free(bindparam("b_worker_id"))),
+            )
+            .values(worker_id=bindparam("b_worker_id"), version=shifts.c.version + 1,
+                    updated_at=bindparam("b_updated_at"))
+        )
+        if db.connection().execute(statement, rows).rowcount != len(rows):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Shifts changed while assigning; retry")
+        assigned = [row["b_shift_id"] for row in rows]
+        log_shift_changes(db, "shift.assigned", assigned)
+        bump_versions(db.connection(), ["shifts"])
+        db.commit()
+    return BulkAssignResult(assigned=assigned, errors=errors)
 
 @app.put("/shifts/{shift_id}", response_model=ShiftResponse)
 def update_shift(shift_id: int, shift_update: ShiftUpdate, db: Session = Depends(get_db)):
-    db_shift = db.query(Shift).filter(Shift.id == shift_id).first()
-    if not db_shift:
-        raise HTTPException(status_code=404, detail="Shift not found")
-    
-    for key, value in shift_update.dict(exclude_unset=True).items():
-        setattr(db_shift, key, value)
-    
-    db.commit()
-    db.refresh(db_shift)
-    return db_shift
+    values = shift_update.dict(exclude_unset=True, exclude={"version"})
+    conditions = []
+    if values.get("status") == ShiftStatus.ACTIVE:
+        # Reactivating must not double-book the assigned worker
+        conditions.append(or_(Shift.worker_id.is_(None), worker_free(Shift.worker_id)))
+    return conditional_update(db, shift_id, shift_update.version, values, conditions, "shift.updated")
 
 @app.get("/workers", response_model=List[WorkerResponse])
 def get_workers(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     is_standby: Optional[bool] = None,
-    is_available: Optional[bool] = None
+    is_available: Optional[bool] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$")
 ):
-    query = db.query(Worker)
+    query = select(Worker.__table__)
     
     if is_standby is not None:
-        query = query.filter(Worker.is_standby == is_standby)
+        query = query.where(Worker.is_standby == is_standby)
     if is_available is not None:
-        query = query.filter(Worker.status == is_available)
-    
-    return query.all()
+        query = query.where(Worker.status == is_available)
+    if after_id is not None:
+        query = query.where(Worker.id > after_id)
+    query = query.order_by(Worker.id)
+    if limit:
+        query = query.limit(limit)
+
+    if format == "ndjson":
+        return ndjson_response(query)
+
+    rows = db.execute(query).all()
+    if rows:
+        next_page_link(request, response, rows, limit, after_id=rows[-1].id)
+    return rows
 
 @app.post("/workers", response_model=WorkerResponse)
 def create_worker(worker: WorkerCreate, db: Session = Depends(get_db)):
@@ -203,20 +896,142 @@ def create_worker(worker: WorkerCreate, db: Session = Depends(get_db)):
 def assign_shift_to_worker(
     worker_id: int,
     shift_id: int,
+    version: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
     
-    shift = db.query(Shift).filter(Shift.id == shift_id).first()
+    shift = db.execute(select(Shift.__table__).where(Shift.id == shift_id)).first()
     if not shift:
         raise HTTPException(status_code=404, detail="Shift not found")
-    
-    shift.worker_id = worker_id
+    # Fast rejection from the occupancy bitmaps; the UPDATE checks again
+    if (shift.status == ShiftStatus.ACTIVE and shift.worker_id != worker_id
+            and worker_is_busy(db, worker_id, shift.start_time, shift.end_time)):
+        raise HTTPException(status_code=409, detail="Worker already has a shift at that time")
+
+    conditions = [or_(Shift.status != ShiftStatus.ACTIVE, worker_free(worker_id))]
+    return conditional_update(db, shift_id, version, {"worker_id": worker_id}, conditions, "shift.assigned")
+
+def busy_worker_ids(shift_start: datetime, shift_end: datetime):
+    """Workers with an active shift overlapping the window, as a subquery"""
+    return select(Shift.worker_id).where(
+        Shift.status == ShiftStatus.ACTIVE,
+        Shift.start_time < shift_end,
+        Shift.end_time > shift_start,
+        Shift.worker_id.isnot(None),
+    )
+
+def worker_free(worker_id, start_time=None, end_time=None, shift_id=None):
+    """Condition for a statement on ``shifts``: ``worker_id`` has no other
+    active shift overlapping the row being written, or the window from
+    ``start_time`` to ``end_time`` when given (for inserts; ``shift_id``
+    then names a shift that does not count)"""
+    shifts = Shift.__table__
+    other = shifts.alias("other")
+    conditions = [other.c.worker_id == worker_id, other.c.status == ShiftStatus.ACTIVE]
+    if start_time is None:
+        conditions.append(other.c.id != shifts.c.id)
+        start_time, end_time = shifts.c.start_time, shifts.c.end_time
+    elif shift_id is not None:
+        conditions.append(other.c.id.is_not(shift_id))
+    # SELECT * keeps SQLite on ix_shifts_worker_start_end: the covering
+    # status index would scan every active shift before the window
+    return ~exists().where(*conditions, other.c.start_time < end_time, other.c.end_time > start_time)
+
+# Windows checked by busy_items; temporary, so each connection has its own
+batch_windows = Table(
+    "batch_windows", MetaData(),
+    Column("item", Integer, primary_key=True),
+    Column("worker_id", Integer),
+    Column("start_time", DateTime),
+    Column("end_time", DateTime),
+    Column("shift_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+def busy_items(db: Session, windows):
+    """Items whose worker has another active shift overlapping the window.
+
+    ``windows`` maps each item to ``(worker_id, start_time, end_time,
+    shift_id)``, where ``shift_id`` is the shift being assigned (which does
+    not count) or None. The occupancy bitmaps settle most items; the rest
+    are checked in one anti-join against ``shifts``.
+    """
+    sync_occupancy(db)
+    busy, unsure = set(), {}
+    for item, window in windows.items():
+        conflict = occupancy.conflicts(*window[:3])
+        if conflict is None or (conflict and window[3] is not None):
+            # The bitmaps cannot tell the assigned shift from the others
+            unsure[item] = window
+        elif conflict:
+            busy.add(item)
+    if unsure:
+        connection = db.connection()
+        batch_windows.create(connection, checkfirst=True)
+        connection.execute(batch_windows.delete())
+        keys = ("worker_id", "start_time", "end_time", "shift_id")
+        connection.execute(insert(batch_windows), [
+            dict(zip(keys, window), item=item) for item, window in unsure.items()
+        ])
+        busy.update(connection.execute(select(batch_windows.c.item).where(~worker_free(
+            batch_windows.c.worker_id, batch_windows.c.start_time, batch_windows.c.end_time, batch_windows.c.shift_id
+        ))).scalars())
+    return busy
+
+def batch_overlaps(windows):
+    """Items of ``windows`` (as for busy_items) that overlap another item of
+    the same worker; the one starting first is kept, then the first listed"""
+    by_worker = {}
+    for item, (worker_id, start_time, end_time, _) in windows.items():
+        by_worker.setdefault(worker_id, []).append((start_time, item, end_time))
+    clashes = set()
+    for worker_windows in by_worker.values():
+        worker_windows.sort()
+        booked_until = None
+        for start_time, item, end_time in worker_windows:
+            if booked_until is not None and start_time < booked_until:
+                clashes.add(item)
+            else:
+                booked_until = end_time
+    return clashes
+
+def conditional_update(db: Session, shift_id: int, version: Optional[int], values, conditions, kind: str):
+    """Apply ``values`` in one UPDATE guarded by the version and ``conditions``.
+
+    ``version`` is the one the client read, or None to use the current one.
+    Nothing is locked between reading and writing: a lost race or a failed
+    condition comes back as 409 without having changed anything.
+    """
+    shifts = Shift.__table__
+    if version is None:
+        version = db.execute(select(shifts.c.version).where(shifts.c.id == shift_id)).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Shift not found")
+
+    result = db.execute(
+        update(shifts)
+        .where(shifts.c.id == shift_id, shifts.c.version == version, *conditions)
+        .values(**values, version=shifts.c.version + 1, updated_at=datetime.utcnow())
+        .returning(*shifts.c)
+    )
+    row = result.first()
+    if row is None:
+        db.rollback()
+        current = db.execute(select(shifts.c.version).where(shifts.c.id == shift_id)).scalar()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Shift not found")
+        if current != version:
+            raise HTTPException(status_code=409, detail="Shift was changed by someone else; reload and retry")
+        raise HTTPException(status_code=409, detail="Worker already has a shift at that time")
+
+    log_changes(db, [(kind, row._mapping)])
+    bump_versions(db.connection(), ["shifts"])
     db.commit()
-    db.refresh(shift)
-    return shift
+    sync_occupancy(db)
+    return row
 
 @app.get("/shifts/available-workers", response_model=List[WorkerResponse])
 def get_available_workers(
@@ -224,24 +1039,249 @@ def get_available_workers(
     shift_end: datetime,
     db: Session = Depends(get_db)
 ):
-    # Get workers who are available during the shift time
-    available_workers = db.query(Worker).filter(
-        Worker.status == True  # Available workers
-    ).all()
-    
-    # Filter out workers who have conflicting shifts
-    conflicting_worker_ids = db.query(Shift.worker_id).filter(
-        Shift.start_time < shift_end,
-        Shift.end_time > shift_start,
-        Shift.status == ShiftStatus.ACTIVE
-    ).distinct().all()
-    
-    conflicting_ids = [row[0] for row in conflicting_worker_ids]
-    
-    return [
-        worker for worker in available_workers
-        if worker.id not in conflicting_ids
+    # Busy workers come from the occupancy bitmaps; plain rows rather than
+    # ORM objects, since the result can be most of the table
+    busy = busy_workers(db, shift_start, shift_end)
+    rows = db.execute(select(Worker.__table__).where(Worker.status == True).order_by(Worker.id)).all()
+    return [row for row in rows if row.id not in busy]
+
+@app.post("/shifts/available-workers", response_model=List[WindowAvailability])
+def get_available_workers_for_windows(request: AvailabilityRequest, db: Session = Depends(get_db)):
+    """Available worker ids for each of many candidate windows in one call"""
+    worker_ids = [row[0] for row in db.query(Worker.id).filter(Worker.status == True).order_by(Worker.id)]
+    results = []
+    for window in request.windows:
+        if window.end <= window.start:
+            raise HTTPException(status_code=422, detail="Window end must be after its start")
+        busy = busy_workers(db, window.start, window.end)
+        results.append(WindowAvailability(
+            start=window.start,
+            end=window.end,
+            worker_ids=[worker_id for worker_id in worker_ids if worker_id not in busy],
+        ))
+    return results
+
+@app.post("/templates", response_model=TemplateResponse)
+def create_template(template: TemplateCreate, db: Session = Depends(get_db)):
+    """Create a weekly template and expand it over the rolling horizon"""
+    if any(weekday not in range(7) for weekday in template.weekdays):
+        raise HTTPException(status_code=422, detail="Weekdays run from 0 (Monday) to 6 (Sunday)")
+    if template.end_date is not None and template.end_date < template.start_date:
+        raise HTTPException(status_code=422, detail="end_date must not be before start_date")
+    if template.worker_id is not None and not db.query(Worker.id).filter(Worker.id == template.worker_id).first():
+        raise HTTPException(status_code=404, detail="Worker not found")
+
+    fields = template.dict(exclude={"weekdays"})
+    db_template = ShiftTemplate(weekday_mask=weekday_mask(template.weekdays), **fields)
+    db.add(db_template)
+    db.commit()
+    materialize_templates(db, date.today() + timedelta(days=TEMPLATE_HORIZON_DAYS), [db_template.id])
+    db.refresh(db_template)
+    return db_template
+
+@app.get("/templates", response_model=List[TemplateResponse])
+def get_templates(db: Session = Depends(get_db)):
+    return db.query(ShiftTemplate).order_by(ShiftTemplate.id).all()
+
+@app.get("/templates/occurrences", response_model=List[Occurrence])
+def get_template_occurrences(
+    start_date: date,
+    end_date: date,
+    template_id: Optional[int] = None,
+    worker_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Occurrences between two dates, computed from templates and exceptions.
+
+    Works for any range, including beyond the materialized horizon, without
+    reading or writing the shifts table.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=422, detail="end_date must not be before start_date")
+    if (end_date - start_date).days >= MAX_OCCURRENCE_DAYS:
+        raise HTTPException(status_code=422, detail=f"Range is limited to {MAX_OCCURRENCE_DAYS} days")
+
+    query = db.query(ShiftTemplate).filter(
+        ShiftTemplate.start_date <= end_date,
+        or_(ShiftTemplate.end_date.is_(None), ShiftTemplate.end_date >= start_date),
+    )
+    if template_id is not None:
+        query = query.filter(ShiftTemplate.id == template_id)
+    templates = query.all()
+    exceptions = template_exceptions(db, [template.id for template in templates], start_date, end_date)
+
+    occurrences = [
+        occurrence
+        for template in templates
+        for occurrence in expand(template, start_date, end_date, exceptions.get(template.id, {}))
+        if worker_id is None or occurrence["worker_id"] == worker_id
     ]
+    occurrences.sort(key=lambda occurrence: (occurrence["start_time"], occurrence["template_id"]))
+    return occurrences
+
+@app.post("/templates/materialize")
+def materialize(until: Optional[date] = None, db: Session = Depends(get_db)):
+    """Expand every template up to ``until`` (default: the rolling horizon)"""
+    until = until or date.today() + timedelta(days=TEMPLATE_HORIZON_DAYS)
+    created, unassigned = materialize_templates(db, until)
+    return {"until": until, "created": created, "unassigned": unassigned}
+
+@app.post("/templates/{template_id}/exceptions", response_model=TemplateExceptionResponse)
+def set_template_exception(template_id: int, exception: TemplateExceptionCreate, db: Session = Depends(get_db)):
+    """Skip one occurrence or give it another worker, replacing any earlier exception"""
+    template = db.query(ShiftTemplate).filter(ShiftTemplate.id == template_id).first()
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    if exception.date.weekday() not in template.weekdays:
+        raise HTTPException(status_code=422, detail="Template does not run on that date")
+    if exception.worker_id is not None and not db.query(Worker.id).filter(Worker.id == exception.worker_id).first():
+        raise HTTPException(status_code=404, detail="Worker not found")
+
+    db_exception = db.query(ShiftTemplateException).filter(
+        ShiftTemplateException.template_id == template_id,
+        ShiftTemplateException.date == exception.date,
+    ).first()
+    was_skipped = db_exception is not None and db_exception.skip
+    if db_exception is None:
+        db_exception = ShiftTemplateException(template_id=template_id)
+        db.add(db_exception)
+    for key, value in exception.dict().items():
+        setattr(db_exception, key, value)
+
+    # An occurrence that is already a shift gets the change applied directly,
+    # through the versioned UPDATE; a conflict rolls the exception back with it
+    shift = db.query(Shift).filter(Shift.template_id == template_id, Shift.occurrence_date == exception.date).first()
+    if shift is None:
+        db.commit()
+    elif exception.skip:
+        conditional_update(db, shift.id, shift.version, {"status": ShiftStatus.CANCELLED}, [], "shift.updated")
+    else:
+        # Guarded so the worker cannot be double-booked
+        worker_id = exception.worker_id or template.worker_id
+        values = {"worker_id": worker_id}
+        conditions = []
+        if was_skipped:
+            values["status"] = ShiftStatus.ACTIVE
+        if worker_id is not None:
+            free = worker_free(worker_id)
+            conditions.append(free if was_skipped else or_(Shift.status != ShiftStatus.ACTIVE, free))
+        conditional_update(db, shift.id, shift.version, values, conditions, "shift.assigned")
+    db.refresh(db_exception)
+    return db_exception
+
+# Placement order for auto-assignment; other flags come after these
+FLAG_PRIORITY = {ShiftFlag.URGENT: 0, ShiftFlag.HIGH_PRIORITY: 1}
+
+@app.post("/shifts/auto-assign", response_model=AutoAssignResult)
+def auto_assign_shifts(request: AutoAssignRequest, db: Session = Depends(get_db)):
+    """Match open shifts to free workers in one batch.
+
+    Open shifts are active ones without a worker and, with
+    ``include_cancelled``, cancelled ones, which are reactivated when
+    assigned. Only available workers are used, standby workers only when no
+    one else is free. ``dry_run`` (the default) returns the plan unsaved.
+    """
+    shifts = Shift.__table__
+    is_open = Shift.worker_id.is_(None) & (Shift.status == ShiftStatus.ACTIVE)
+    if request.include_cancelled:
+        is_open = is_open | (Shift.status == ShiftStatus.CANCELLED)
+    query = select(shifts.c.id, shifts.c.start_time, shifts.c.end_time, shifts.c.flag).where(is_open)
+    if request.shift_ids is not None:
+        query = query.where(Shift.id.in_(request.shift_ids))
+    if request.start:
+        query = query.where(Shift.end_time > request.start)
+    if request.end:
+        query = query.where(Shift.start_time < request.end)
+    candidates = [
+        (row.id, row.start_time, row.end_time, FLAG_PRIORITY.get(row.flag, len(FLAG_PRIORITY)))
+        for row in db.execute(query)
+    ]
+    if not candidates:
+        return AutoAssignResult(dry_run=request.dry_run, assignments=[], unassigned=[])
+
+    workers = db.execute(
+        select(Worker.id, Worker.is_standby).where(Worker.status == True).order_by(Worker.id)
+    ).all()
+    busy = db.execute(
+        select(Shift.worker_id, Shift.start_time, Shift.end_time).where(
+            Shift.status == ShiftStatus.ACTIVE,
+            Shift.start_time < max(candidate[2] for candidate in candidates),
+            Shift.end_time > min(candidate[1] for candidate in candidates),
+            Shift.worker_id.isnot(None),
+        )
+    ).all()
+    plan = match(candidates, [tuple(row) for row in workers], [tuple(row) for row in busy], request.use_standby)
+
+    if plan and not request.dry_run:
+        rows = [{"b_shift_id": shift_id, "b_worker_id": worker_id, "b_updated_at": datetime.utcnow()}
+                for shift_id, worker_id in plan.items()]
+        # Only shifts still open are taken, by workers still free; anything
+        # else changed underneath us
+        result = db.connection().execute(
+            update(shifts)
+            .where(shifts.c.id == bindparam("b_shift_id"), is_open, worker_free(bindparam("b_worker_id")))
+            .values(worker_id=bindparam("b_worker_id"), status=ShiftStatus.ACTIVE,
+                    version=shifts.c.version + 1, updated_at=bindparam("b_updated_at")),
+            rows
+        )
+        if result.rowcount != len(rows):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Shifts changed while matching; retry")
+        log_shift_changes(db, "shift.assigned", plan)
+        bump_versions(db.connection(), ["shifts"])
+        db.commit()
+
+    return AutoAssignResult(
+        dry_run=request.dry_run,
+        assignments=[ShiftAssignment(shift_id=shift_id, worker_id=worker_id) for shift_id, worker_id in plan.items()],
+        unassigned=sorted(candidate[0] for candidate in candidates if candidate[0] not in plan),
+    )
+
+@app.get("/changes/stream")
+async def stream_changes(request: Request, after: Optional[int] = None):
+    """Shift and worker changes as Server-Sent Events.
+
+    Each event's id is its sequence number. Pass ``after`` (or the
+    Last-Event-ID header EventSource sends when it reconnects) to resume;
+    a ``reset`` event means the gap is gone and lists should be reloaded.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if after is None and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    async def events():
+        async for change in feed.changes(after):
+            if change is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {change.seq}\nevent: {change.type}\ndata: {change.data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/changes/ws")
+async def websocket_changes(websocket: WebSocket, after: Optional[int] = None):
+    """The same feed over a WebSocket, one JSON message per change"""
+    await websocket.accept()
+
+    async def forward():
+        async for change in feed.changes(after):
+            if change is None:
+                await websocket.send_text('{"type": "keepalive"}')
+            else:
+                await websocket.send_text(f'{{"seq": {change.seq}, "type": "{change.type}", "data": {change.data}}}')
+
+    async def until_closed():
+        while True:
+            await websocket.receive_text()
+
+    # Whichever ends first (client gone, or fell too far behind) ends both
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(until_closed())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if tasks[0] in done and tasks[0].exception() is None:
+        await websocket.close()
 
 def populate_test_data():
     """Populate some test data for testing"""
@@ -288,8 +1328,8 @@ def populate_test_data():
 if __name__ == "__main__":
     import uvicorn
     
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
+    # Create all tables and indexes
+    create_schema(Base.metadata, engine)
     
     # Populate test data
     populate_test_data()
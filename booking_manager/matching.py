@@ -0,0 +1,91 @@
+"""Batch matching of open shifts to free workers.
+
+Shifts are placed in priority order, then by start time, each on the
+least-loaded available worker with no overlapping shift. Busy intervals are
+kept in arrays sorted by start, so the workers blocked for a window come
+from two binary searches and one vector compare instead of a scan of every
+worker's shifts; intervals assigned during the batch go into day buckets.
+"""
+from datetime import datetime
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+
+# Added to a standby worker's load so they are chosen only when no regular
+# worker is free
+STANDBY_PENALTY = 1e15
+
+
+def _seconds(value):
+    return int((value - EPOCH).total_seconds())
+
+
+class IntervalIndex:
+    """Busy intervals of worker positions, queried by overlapping window."""
+
+    def __init__(self, owners, starts, ends):
+        order = np.argsort(starts, kind="stable")
+        self.owners = owners[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.longest = int((ends - starts).max()) if len(starts) else 0
+        self.added = {}
+
+    def add(self, owner, start, end):
+        for day in range(start // DAY, (end - 1) // DAY + 1):
+            self.added.setdefault(day, []).append((owner, start, end))
+
+    def overlapping(self, start, end):
+        """Positions of workers with an interval overlapping ``start``-``end``"""
+        # Only intervals starting after start - longest can still be running
+        lo = np.searchsorted(self.starts, start - self.longest, "right")
+        hi = np.searchsorted(self.starts, end, "left")
+        owners = self.owners[lo:hi][self.ends[lo:hi] > start].tolist()
+        for day in range(start // DAY, (end - 1) // DAY + 1):
+            owners.extend(owner for owner, s, e in self.added.get(day, ()) if s < end and e > start)
+        return owners
+
+
+def match(shifts, workers, busy, use_standby=True):
+    """Assign shifts to workers without overlaps.
+
+    ``shifts`` are ``(id, start, end, priority)`` tuples, lowest priority
+    placed first; ``workers`` are ``(id, is_standby)`` for available workers
+    and ``busy`` are ``(worker_id, start, end)`` of their active shifts.
+    Returns a dict of shift id to worker id, leaving out shifts no worker
+    can take.
+    """
+    worker_ids = np.array([worker_id for worker_id, _ in workers], dtype=np.int64)
+    if not len(worker_ids):
+        return {}
+    position = {worker_id: i for i, worker_id in enumerate(worker_ids.tolist())}
+    standby = np.array([is_standby for _, is_standby in workers], dtype=bool)
+    penalty = np.where(standby, STANDBY_PENALTY if use_standby else np.inf, 0.0)
+
+    busy = [(position[worker_id], _seconds(start), _seconds(end))
+            for worker_id, start, end in busy if worker_id in position]
+    owners = np.array([row[0] for row in busy], dtype=np.int64)
+    starts = np.array([row[1] for row in busy], dtype=np.int64)
+    ends = np.array([row[2] for row in busy], dtype=np.int64)
+    index = IntervalIndex(owners, starts, ends)
+
+    # Seconds already booked, so work spreads across workers
+    load = np.zeros(len(worker_ids))
+    np.add.at(load, owners, (ends - starts).astype(float))
+
+    assignments = {}
+    for shift_id, start, end, _ in sorted(shifts, key=lambda shift: (shift[3], shift[1], shift[0])):
+        start, end = _seconds(start), _seconds(end)
+        if end <= start:
+            continue
+        rank = load + penalty
+        rank[index.overlapping(start, end)] = np.inf
+        best = int(rank.argmin())
+        if rank[best] == np.inf:
+            continue
+        assignments[shift_id] = int(worker_ids[best])
+        load[best] += end - start
+        index.add(best, start, end)
+    return assignments
@@ -0,0 +1,88 @@
+"""Per-worker, per-day occupancy bitmaps in 15-minute slots.
+
+Each worker's day is two 96-bit integers: the slots any active shift
+touches and the slots a shift covers completely. A window conflicts for
+certain when it touches a fully covered slot or fully covers a touched one,
+and is free for certain when it touches no touched slot. Only shifts that
+share a partly covered slot are left for the caller to check exactly.
+"""
+from datetime import datetime, timedelta
+
+SLOT = 15 * 60
+DAY = 86400
+
+
+def _slots(first, last):
+    """Bitmask of slots ``first`` to ``last`` inclusive"""
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _day_masks(start, end):
+    """``(day ordinal, touched, full)`` for each day the window crosses"""
+    day = start.date()
+    while True:
+        midnight = datetime.combine(day, datetime.min.time())
+        lo = max(0, int((start - midnight).total_seconds()))
+        hi = min(DAY, int((end - midnight).total_seconds()))
+        if hi <= 0:
+            break
+        if hi > lo:
+            touched = _slots(lo // SLOT, (hi - 1) // SLOT)
+            full = _slots(-(-lo // SLOT), hi // SLOT - 1)
+            yield day.toordinal(), touched, full
+        day += timedelta(days=1)
+
+
+class Occupancy:
+    """Occupancy bitmaps of assigned active shifts, keyed by day then worker.
+
+    ``version`` and ``seq`` (the last change log entry applied) record how
+    current the bitmaps are; the service keeps them in step with the shifts
+    table.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.longest = timedelta(0)
+        self.version = None
+        self.seq = 0
+
+    def add(self, worker_id, start, end):
+        self.longest = max(self.longest, end - start)
+        for day, touched, full in _day_masks(start, end):
+            workers = self.days.setdefault(day, {})
+            old_touched, old_full = workers.get(worker_id, (0, 0))
+            workers[worker_id] = (old_touched | touched, old_full | full)
+
+    def replace_days(self, days, rows):
+        """Rebuild ``days`` (ordinals) from every active shift crossing them"""
+        fresh = Occupancy()
+        for worker_id, start, end in rows:
+            fresh.add(worker_id, start, end)
+        for day in days:
+            self.days[day] = fresh.days.get(day, {})
+        self.longest = max(self.longest, fresh.longest)
+
+    def conflicts(self, worker_id, start, end):
+        """True or False when the bitmaps decide it, None when they cannot"""
+        unsure = False
+        for day, touched, full in _day_masks(start, end):
+            busy_touched, busy_full = self.days.get(day, {}).get(worker_id, (0, 0))
+            if touched & busy_full or full & busy_touched:
+                return True
+            if touched & busy_touched:
+                unsure = True
+        return None if unsure else False
+
+    def busy_workers(self, start, end):
+        """Workers certainly busy in the window, and those the bitmaps cannot decide"""
+        busy, unsure = set(), set()
+        for day, touched, full in _day_masks(start, end):
+            for worker_id, (busy_touched, busy_full) in self.days.get(day, {}).items():
+                if touched & busy_full or full & busy_touched:
+                    busy.add(worker_id)
+                elif touched & busy_touched:
+                    unsure.add(worker_id)
+        return busy, unsure - busy
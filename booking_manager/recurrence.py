@@ -0,0 +1,49 @@
+"""Weekly recurrence for shift templates.
+
+A template names the weekdays it runs on as a bitmask (bit 0 is Monday), a
+time of day and a duration. Expansion walks each weekday in steps of a week
+rather than testing every day of the range.
+"""
+from datetime import datetime, timedelta
+
+
+def weekday_mask(weekdays):
+    return sum(1 << weekday for weekday in set(weekdays))
+
+
+def mask_weekdays(mask):
+    return [weekday for weekday in range(7) if mask & (1 << weekday)]
+
+
+def occurrence_dates(mask, start, end):
+    """Dates from ``start`` to ``end`` inclusive that fall on a masked weekday."""
+    dates = []
+    for weekday in mask_weekdays(mask):
+        first = start + timedelta(days=(weekday - start.weekday()) % 7)
+        dates.extend(first + timedelta(weeks=week) for week in range((end - first).days // 7 + 1))
+    return sorted(dates)
+
+
+def expand(template, start, end, exceptions):
+    """Concrete shifts of ``template`` between the ``start`` and ``end`` dates.
+
+    ``exceptions`` maps an occurrence date to its exception: skipped dates
+    are left out and a replacement worker overrides the template's.
+    """
+    start = max(start, template.start_date)
+    if template.end_date is not None:
+        end = min(end, template.end_date)
+    for day in occurrence_dates(template.weekday_mask, start, end):
+        exception = exceptions.get(day)
+        if exception is not None and exception.skip:
+            continue
+        begins = datetime.combine(day, template.start_time)
+        yield {
+            "template_id": template.id,
+            "occurrence_date": day,
+            "start_time": begins,
+            "end_time": begins + timedelta(minutes=template.duration_minutes),
+            "worker_id": exception.worker_id if exception is not None and exception.worker_id else template.worker_id,
+            "flag": template.flag,
+            "notes": template.notes,
+        }
@@ -0,0 +1,631 @@
+import asyncio
+import json
+import os
+import sys
+import itertools
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the service at a scratch database before it is imported
+DATA_DIR = tempfile.mkdtemp()
+os.environ["BOOKING_DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'bookings.db')}"
+
+from booking_manager import datagen
+from booking_manager import main as booking
+from common import feed as change_log
+from common.database import create_schema
+from sqlalchemy import create_engine, inspect
+
+BASE = datetime(2030, 1, 7, 8, 0)
+
+
+class BookingTestCase(unittest.TestCase):
+    def setUp(self):
+        booking.Base.metadata.drop_all(bind=booking.engine)
+        create_schema(booking.Base.metadata, booking.engine)
+        booking.load_occupancy()
+        self.client = TestClient(booking.app)
+
+    def add_worker(self, name, status=True, is_standby=False):
+        response = self.client.post("/workers", json={"name": name, "status": status, "is_standby": is_standby})
+        return response.json()["id"]
+
+    def add_shift(self, worker_id, start, hours=2, **extra):
+        payload = {
+            "worker_id": worker_id,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=hours)).isoformat(),
+            **extra,
+        }
+        return self.client.post("/shifts", json=payload).json()["id"]
+
+
+class TestAvailableWorkers(BookingTestCase):
+    def test_excludes_overlapping_active_shifts(self):
+        busy = self.add_worker("Busy")
+        free = self.add_worker("Free")
+        cancelled = self.add_worker("Cancelled shift")
+        self.add_worker("Unavailable", status=False)
+        self.add_shift(busy, BASE)
+        shift_id = self.add_shift(cancelled, BASE)
+        self.client.put(f"/shifts/{shift_id}", json={"status": "cancelled"})
+
+        response = self.client.get("/shifts/available-workers", params={
+            "shift_start": (BASE + timedelta(hours=1)).isoformat(),
+            "shift_end": (BASE + timedelta(hours=3)).isoformat(),
+        })
+        self.assertEqual([worker["id"] for worker in response.json()], [free, cancelled])
+
+    def test_many_windows_in_one_call(self):
+        morning = self.add_worker("Morning")
+        evening = self.add_worker("Evening")
+        self.add_shift(morning, BASE)
+        self.add_shift(evening, BASE + timedelta(hours=10))
+
+        response = self.client.post("/shifts/available-workers", json={"windows": [
+            {"start": BASE.isoformat(), "end": (BASE + timedelta(hours=1)).isoformat()},
+            {"start": (BASE + timedelta(hours=2)).isoformat(), "end": (BASE + timedelta(hours=4)).isoformat()},
+            {"start": (BASE + timedelta(hours=11)).isoformat(), "end": (BASE + timedelta(hours=12)).isoformat()},
+        ]})
+        self.assertEqual([window["worker_ids"] for window in response.json()], [[evening], [morning, evening], [morning]])
+
+    def test_overlap_lookup_uses_index(self):
+        query = booking.busy_worker_ids(BASE, BASE + timedelta(hours=1))
+        sql = str(query.compile(booking.engine, compile_kwargs={"literal_binds": True}))
+        with booking.engine.connect() as connection:
+            plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+        self.assertIn("COVERING INDEX ix_shifts_status_start_end", plan)
+
+
+class TestOccupancy(BookingTestCase):
+    def test_rejects_double_booking(self):
+        worker = self.add_worker("Booked")
+        other = self.add_worker("Other")
+        self.add_shift(worker, BASE, hours=4)
+        response = self.client.post("/shifts", json={
+            "worker_id": worker,
+            "start_time": (BASE + timedelta(hours=3)).isoformat(),
+            "end_time": (BASE + timedelta(hours=5)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 409)
+        self.add_shift(worker, BASE + timedelta(hours=4))
+        response = self.client.post("/shifts", json={
+            "worker_id": other, "start_time": BASE.isoformat(), "end_time": BASE.isoformat(),
+        })
+        self.assertEqual(response.status_code, 422)
+
+        shift_id = self.add_shift(other, BASE + timedelta(hours=1))
+        response = self.client.post(f"/workers/{worker}/assign-shift", params={"shift_id": shift_id})
+        self.assertEqual(response.status_code, 409)
+
+    def test_partial_slots_fall_back_to_exact_check(self):
+        worker = self.add_worker("Minutes")
+        self.add_shift(worker, BASE + timedelta(minutes=5), hours=1)
+        self.assertIsNone(booking.occupancy.conflicts(worker, BASE + timedelta(minutes=65), BASE + timedelta(hours=2)))
+        self.add_shift(worker, BASE + timedelta(minutes=65))
+        self.assertEqual(len(self.client.get("/shifts").json()), 2)
+
+    def test_cancellation_frees_the_slot(self):
+        worker = self.add_worker("Cancelled")
+        shift_id = self.add_shift(worker, BASE)
+        self.client.put(f"/shifts/{shift_id}", json={"status": "cancelled"})
+        self.assertFalse(booking.occupancy.conflicts(worker, BASE, BASE + timedelta(hours=1)))
+        self.add_shift(worker, BASE)
+
+    def test_catches_up_with_writes_from_other_processes(self):
+        worker = self.add_worker("Elsewhere")
+        self.add_shift(worker, BASE)
+        # Written behind this process's back, as another gateway worker would
+        with booking.engine.begin() as connection:
+            cancelled = connection.execute(booking.update(booking.Shift.__table__).values(
+                status="CANCELLED", updated_at=datetime.utcnow()).returning(*booking.Shift.__table__.c)).all()
+            created = connection.execute(booking.insert(booking.Shift.__table__).values(
+                worker_id=worker, start_time=BASE + timedelta(days=1), end_time=BASE + timedelta(days=1, hours=2),
+                status="ACTIVE", flag="NORMAL", updated_at=datetime.utcnow()).returning(*booking.Shift.__table__.c)).all()
+            change_log.record_changes(connection, [("shift.updated", row._mapping) for row in cancelled + created])
+            booking.bump_versions(connection, ["shifts"])
+
+        free = self.client.get("/shifts/available-workers", params={
+            "shift_start": BASE.isoformat(), "shift_end": (BASE + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual([row["id"] for row in free.json()], [worker])
+        busy = self.client.get("/shifts/available-workers", params={
+            "shift_start": (BASE + timedelta(days=1)).isoformat(),
+            "shift_end": (BASE + timedelta(days=1, hours=1)).isoformat(),
+        })
+        self.assertEqual(busy.json(), [])
+
+
+class TestOptimisticConcurrency(BookingTestCase):
+    def test_stale_version_is_rejected(self):
+        worker = self.add_worker("Versioned")
+        shift = self.client.post("/shifts", json={
+            "worker_id": worker, "start_time": BASE.isoformat(),
+            "end_time": (BASE + timedelta(hours=2)).isoformat(),
+        }).json()
+        self.assertEqual(shift["version"], 1)
+
+        first = self.client.put(f"/shifts/{shift['id']}", json={"notes": "first", "version": 1})
+        self.assertEqual(first.json()["version"], 2)
+        stale = self.client.put(f"/shifts/{shift['id']}", json={"notes": "second", "version": 1})
+        self.assertEqual(stale.status_code, 409)
+        stale = self.client.post(f"/workers/{worker}/assign-shift", params={"shift_id": shift["id"], "version": 1})
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(self.client.get("/shifts").json()[0]["notes"], "first")
+        self.assertEqual(self.client.put(f"/shifts/{shift['id']}", json={"flag": "urgent"}).json()["version"], 3)
+
+    def test_statement_rechecks_overlap(self):
+        worker = self.add_worker("Raced")
+        other = self.add_worker("Other")
+        shift_id = self.add_shift(other, BASE)
+        # Booked behind this process's back, so the bitmaps do not know
+        with booking.engine.begin() as connection:
+            connection.execute(booking.insert(booking.Shift.__table__).values(
+                worker_id=worker, start_time=BASE, end_time=BASE + timedelta(hours=1),
+                status="ACTIVE", flag="NORMAL", updated_at=datetime.utcnow()))
+        self.assertFalse(booking.occupancy.conflicts(worker, BASE, BASE + timedelta(hours=2)))
+
+        response = self.client.post(f"/workers/{worker}/assign-shift", params={"shift_id": shift_id})
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post("/shifts", json={
+            "worker_id": worker, "start_time": BASE.isoformat(),
+            "end_time": (BASE + timedelta(hours=2)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 409)
+
+    def test_concurrent_assignments_book_once(self):
+        worker = self.add_worker("Contested")
+        owners = [self.add_worker(f"Owner {i}") for i in range(8)]
+        shift_ids = [self.add_shift(owner, BASE + timedelta(minutes=15 * i)) for i, owner in enumerate(owners)]
+        barrier = threading.Barrier(len(shift_ids))
+
+        def assign(shift_id):
+            client = TestClient(booking.app)
+            barrier.wait()
+            return client.post(f"/workers/{worker}/assign-shift", params={"shift_id": shift_id}).status_code
+
+        with ThreadPoolExecutor(len(shift_ids)) as pool:
+            codes = sorted(pool.map(assign, shift_ids))
+        self.assertEqual(codes, [200] + [409] * (len(shift_ids) - 1))
+        assigned = [row for row in self.client.get("/shifts").json() if row["worker_id"] == worker]
+        self.assertEqual(len(assigned), 1)
+
+
+
+class TestShiftPagination(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        # Created out of start order, with two shifts sharing a start time
+        offsets = [5, 1, 3, 1, 4]
+        self.ids = [self.add_shift(self.add_worker(f"Paged {i}"), BASE + timedelta(hours=offset))
+                    for i, offset in enumerate(offsets)]
+        self.by_start = [shift_id for _, shift_id in sorted(zip(offsets, self.ids))]
+
+    def collect(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(shift["id"] for shift in response.json())
+            url = response.links.get("next", {}).get("url")
+        return seen
+
+    def test_pages_by_id(self):
+        self.assertEqual(self.collect("/shifts?limit=2"), self.ids)
+
+    def test_pages_by_start_time_with_ties(self):
+        self.assertEqual(self.collect("/shifts?sort=start_time&limit=2"), self.by_start)
+
+    def test_keyset_seek_uses_index(self):
+        query = booking.select(booking.Shift.id).where(
+            booking.tuple_(booking.Shift.start_time, booking.Shift.id) > (BASE, 3)
+        ).order_by(booking.Shift.start_time, booking.Shift.id)
+        sql = str(query.compile(booking.engine, compile_kwargs={"literal_binds": True}))
+        with booking.engine.connect() as connection:
+            plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+        self.assertIn("ix_shifts_start_time", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_filters_seek_on_an_index(self):
+        filters = {
+            "status": booking.ShiftStatus.ACTIVE, "flag": booking.ShiftFlag.URGENT, "worker_id": 3,
+            "start_date": BASE, "end_date": BASE + timedelta(days=1),
+        }
+        with booking.engine.connect() as connection:
+            for size in range(1, len(filters) + 1):
+                for names in itertools.combinations(filters, size):
+                    for sort in ("id", "start_time"):
+                        query = booking.shifts_query(sort=sort, limit=100, **{name: filters[name] for name in names})
+                        sql = str(query.compile(booking.engine, compile_kwargs={"literal_binds": True}))
+                        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+                        with self.subTest(filters=names, sort=sort):
+                            self.assertFalse([step for step in plan if step.startswith("SCAN")], plan)
+
+    def test_ndjson_stream_matches_json(self):
+        streamed = self.client.get("/shifts?format=ndjson&sort=start_time")
+        self.assertEqual(streamed.headers["content-type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in streamed.text.splitlines()]
+        self.assertEqual([row["id"] for row in rows], self.by_start)
+        self.assertEqual(rows, self.client.get("/shifts?sort=start_time").json())
+
+    def test_workers_pages_and_stream(self):
+        for i in range(4):
+            self.add_worker(f"Extra {i}")
+        first = self.client.get("/workers?limit=5")
+        self.assertEqual(len(first.json()), 5)
+        rest = self.client.get(first.links["next"]["url"]).json()
+        streamed = [json.loads(line)["id"] for line in self.client.get("/workers?format=ndjson").text.splitlines()]
+        self.assertEqual([worker["id"] for worker in first.json() + rest], streamed)
+
+
+class TestBulkShifts(BookingTestCase):
+    def test_bulk_create_reports_item_errors(self):
+        worker = self.add_worker("Bulk")
+        before = self.client.get("/shifts").headers["etag"]
+        shifts = [
+            {"worker_id": worker, "start_time": (BASE + timedelta(hours=i)).isoformat(),
+             "end_time": (BASE + timedelta(hours=i + 1)).isoformat(), "flag": "urgent"}
+            for i in range(3)
+        ]
+        shifts.insert(1, dict(shifts[0], worker_id=9999))
+        shifts.append(dict(shifts[0], end_time=BASE.isoformat()))
+
+        result = self.client.post("/shifts/bulk", json={"shifts": shifts}).json()
+        self.assertEqual(len(result["created"]), 3)
+        self.assertEqual([(error["index"], error["detail"]) for error in result["errors"]],
+                         [(1, "Worker not found"), (4, "end_time must be after start_time")])
+
+        listed = self.client.get("/shifts")
+        self.assertNotEqual(listed.headers["etag"], before)
+        self.assertEqual([shift["id"] for shift in listed.json()], result["created"])
+        self.assertEqual({shift["flag"] for shift in listed.json()}, {"urgent"})
+
+    def test_bulk_assign(self):
+        first = self.add_worker("First")
+        second = self.add_worker("Second")
+        shift_ids = [self.add_shift(first, BASE + timedelta(hours=i), hours=1) for i in range(3)]
+
+        result = self.client.post("/shifts/assign/bulk", json={"assignments": [
+            {"shift_id": shift_ids[0], "worker_id": second},
+            {"shift_id": shift_ids[1], "worker_id": 9999},
+            {"shift_id": 9999, "worker_id": second},
+            {"shift_id": shift_ids[2], "worker_id": second},
+        ]}).json()
+        self.assertEqual(result["assigned"], [shift_ids[0], shift_ids[2]])
+        self.assertEqual([error["index"] for error in result["errors"]], [1, 2])
+        owners = {shift["id"]: shift["worker_id"] for shift in self.client.get("/shifts").json()}
+        self.assertEqual(owners, {shift_ids[0]: second, shift_ids[1]: first, shift_ids[2]: second})
+
+    def test_bulk_create_rejects_overlaps(self):
+        worker = self.add_worker("Busy")
+        existing = self.add_shift(worker, BASE, hours=2)
+        shifts = [
+            {"worker_id": worker, "start_time": (BASE + timedelta(hours=start)).isoformat(),
+             "end_time": (BASE + timedelta(hours=start + 2)).isoformat()}
+            for start in (1, 4, 5, 6)
+        ]
+        result = self.client.post("/shifts/bulk", json={"shifts": shifts}).json()
+        self.assertEqual(len(result["created"]), 2)
+        self.assertEqual([(error["index"], error["detail"]) for error in result["errors"]],
+                         [(0, "Worker already has a shift at that time"), (2, "Worker already has a shift at that time")])
+        starts = [shift["start_time"] for shift in self.client.get("/shifts?sort=start_time").json()]
+        self.assertEqual(starts, [(BASE + timedelta(hours=hours)).isoformat() for hours in (0, 4, 6)])
+        self.assertNotIn(existing, result["created"])
+
+    def test_bulk_assign_rejects_overlaps_and_stale_versions(self):
+        busy = self.add_worker("Busy")
+        other = self.add_worker("Other")
+        self.add_shift(busy, BASE, hours=2)
+        overlapping = self.add_shift(other, BASE + timedelta(hours=1), hours=2)
+        third = self.add_worker("Third")
+        later = [self.add_shift(worker, BASE + timedelta(hours=4 + i), hours=2) for i, worker in enumerate((other, third))]
+
+        result = self.client.post("/shifts/assign/bulk", json={"assignments": [
+            {"shift_id": overlapping, "worker_id": busy},
+            {"shift_id": later[0], "worker_id": busy},
+            {"shift_id": later[1], "worker_id": busy},
+            {"shift_id": later[1], "worker_id": other, "version": 0},
+        ]}).json()
+        self.assertEqual(result["assigned"], [later[0]])
+        self.assertEqual([(error["index"], error["detail"]) for error in result["errors"]], [
+            (0, "Worker already has a shift at that time"),
+            (2, "Worker already has a shift at that time"),
+            (3, "Shift was changed by someone else; reload and retry"),
+        ])
+        owners = {shift["id"]: shift["worker_id"] for shift in self.client.get("/shifts").json()}
+        self.assertEqual((owners[overlapping], owners[later[0]], owners[later[1]]), (other, busy, third))
+
+
+class TestShiftTemplates(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.add_worker("Rota")
+        self.today = date.today()
+        # Monday, Wednesday and Friday at 09:00 for four hours
+        self.template = self.client.post("/templates", json={
+            "name": "Weekday mornings",
+            "weekdays": [0, 2, 4],
+            "start_time": "09:00:00",
+            "duration_minutes": 240,
+            "start_date": self.today.isoformat(),
+            "worker_id": self.worker,
+        }).json()
+
+    def template_shifts(self):
+        return [shift for shift in self.client.get("/shifts?sort=start_time").json() if shift["template_id"]]
+
+    def test_expands_over_horizon(self):
+        shifts = self.template_shifts()
+        horizon = self.today + timedelta(days=booking.TEMPLATE_HORIZON_DAYS)
+        expected = [self.today + timedelta(days=i) for i in range((horizon - self.today).days + 1)]
+        expected = [day.isoformat() for day in expected if day.weekday() in (0, 2, 4)]
+        self.assertEqual([shift["occurrence_date"] for shift in shifts], expected)
+        self.assertEqual(shifts[0]["start_time"], f"{expected[0]}T09:00:00")
+        self.assertEqual(shifts[0]["end_time"], f"{expected[0]}T13:00:00")
+        self.assertEqual(self.template["materialized_until"], horizon.isoformat())
+
+    def test_materialization_is_incremental(self):
+        before = len(self.template_shifts())
+        until = self.today + timedelta(days=booking.TEMPLATE_HORIZON_DAYS + 7)
+        self.assertEqual(self.client.post(f"/templates/materialize?until={until}").json()["created"], 3)
+        self.assertEqual(self.client.post(f"/templates/materialize?until={until}").json()["created"], 0)
+        # Forgetting the watermark still cannot duplicate occurrences
+        with booking.engine.begin() as connection:
+            connection.execute(booking.update(booking.ShiftTemplate.__table__).values(materialized_until=None))
+        self.client.post(f"/templates/materialize?until={until}")
+        self.assertEqual(len(self.template_shifts()), before + 3)
+
+    def test_materializing_opens_occurrences_that_would_double_book(self):
+        # Daily at 10:00 for the same worker, inside the 09:00-13:00 shifts
+        daily = self.client.post("/templates", json={
+            "name": "Daily cover",
+            "weekdays": list(range(7)),
+            "start_time": "10:00:00",
+            "duration_minutes": 120,
+            "start_date": self.today.isoformat(),
+            "worker_id": self.worker,
+        }).json()
+        workers = {
+            date.fromisoformat(shift["occurrence_date"]).weekday() in (0, 2, 4): shift["worker_id"]
+            for shift in self.template_shifts() if shift["template_id"] == daily["id"]
+        }
+        self.assertEqual(workers, {True: None, False: self.worker})
+
+        horizon = self.today + timedelta(days=booking.TEMPLATE_HORIZON_DAYS)
+        until = horizon + timedelta(days=7)
+        result = self.client.post(f"/templates/materialize?until={until}").json()
+        opened = [
+            shift["id"] for shift in self.template_shifts()
+            if shift["occurrence_date"] > horizon.isoformat() and shift["worker_id"] is None
+        ]
+        self.assertEqual(len(opened), 3)
+        self.assertEqual(result["unassigned"], sorted(opened))
+
+    def test_exceptions_apply_to_materialized_shifts(self):
+        other = self.add_worker("Cover")
+        first, second = [shift["occurrence_date"] for shift in self.template_shifts()[:2]]
+        url = f"/templates/{self.template['id']}/exceptions"
+        self.client.post(url, json={"date": first, "skip": True})
+        self.client.post(url, json={"date": second, "worker_id": other})
+
+        shifts = {shift["occurrence_date"]: shift for shift in self.template_shifts()}
+        self.assertEqual(shifts[first]["status"], "cancelled")
+        self.assertEqual(shifts[second]["worker_id"], other)
+        rejected = self.client.post(url, json={"date": (date.fromisoformat(first) + timedelta(days=1)).isoformat()})
+        self.assertEqual(rejected.status_code, 422)
+
+    def test_exception_cannot_double_book(self):
+        other = self.add_worker("Cover")
+        occurrence = self.template_shifts()[0]
+        self.add_shift(other, datetime.fromisoformat(occurrence["start_time"]) + timedelta(hours=1))
+        url = f"/templates/{self.template['id']}/exceptions"
+
+        response = self.client.post(url, json={"date": occurrence["occurrence_date"], "worker_id": other})
+        self.assertEqual(response.status_code, 409)
+        shifts = {shift["occurrence_date"]: shift for shift in self.template_shifts()}
+        self.assertEqual(shifts[occurrence["occurrence_date"]]["worker_id"], self.worker)
+        occurrences = self.client.get("/templates/occurrences", params={
+            "start_date": occurrence["occurrence_date"], "end_date": occurrence["occurrence_date"],
+        }).json()
+        self.assertEqual([item["worker_id"] for item in occurrences], [self.worker])
+
+    def test_occurrences_beyond_horizon_are_computed(self):
+        start = self.today + timedelta(days=100)
+        start += timedelta(days=-start.weekday())  # a Monday
+        self.client.post(f"/templates/{self.template['id']}/exceptions", json={"date": start.isoformat(), "skip": True})
+        before = len(self.template_shifts())
+
+        response = self.client.get("/templates/occurrences", params={
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=13)).isoformat(),
+        })
+        self.assertEqual([occurrence["occurrence_date"] for occurrence in response.json()],
+                         [(start + timedelta(days=offset)).isoformat() for offset in (2, 4, 7, 9, 11)])
+        self.assertEqual(len(self.template_shifts()), before)
+        too_long = self.client.get("/templates/occurrences", params={
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=400)).isoformat(),
+        })
+        self.assertEqual(too_long.status_code, 422)
+
+
+class TestAutoAssign(BookingTestCase):
+    def add_open_shift(self, start, hours=2, flag="NORMAL"):
+        with booking.engine.begin() as connection:
+            return connection.execute(booking.insert(booking.Shift.__table__).values(
+                start_time=start, end_time=start + timedelta(hours=hours), status="ACTIVE", flag=flag,
+            )).inserted_primary_key[0]
+
+    def auto_assign(self, **options):
+        return self.client.post("/shifts/auto-assign", json=options).json()
+
+    def test_priority_shifts_are_filled_first(self):
+        worker = self.add_worker("Only")
+        normal = self.add_open_shift(BASE)
+        urgent = self.add_open_shift(BASE + timedelta(hours=1), flag="URGENT")
+        result = self.auto_assign()
+        self.assertEqual(result["assignments"], [{"shift_id": urgent, "worker_id": worker}])
+        self.assertEqual(result["unassigned"], [normal])
+
+    def test_respects_availability_and_active_shifts(self):
+        busy = self.add_worker("Busy")
+        self.add_worker("Unavailable", status=False)
+        standby = self.add_worker("Standby", is_standby=True)
+        regular = self.add_worker("Regular")
+        self.add_shift(busy, BASE)
+        first = self.add_open_shift(BASE)
+        second = self.add_open_shift(BASE + timedelta(minutes=30))
+        third = self.add_open_shift(BASE + timedelta(hours=1))
+
+        plan = {item["shift_id"]: item["worker_id"] for item in self.auto_assign()["assignments"]}
+        self.assertEqual(plan, {first: regular, second: standby})
+        self.assertEqual(self.auto_assign(use_standby=False)["unassigned"], [second, third])
+
+    def test_commit_reassigns_cancelled_shifts(self):
+        leaver = self.add_worker("Leaver", status=False)
+        cover = self.add_worker("Cover")
+        shift_id = self.add_shift(leaver, BASE)
+        self.client.put(f"/shifts/{shift_id}", json={"status": "cancelled"})
+
+        dry = self.auto_assign(shift_ids=[shift_id])
+        self.assertEqual(len(dry["assignments"]), 1)
+        self.assertEqual(self.client.get("/shifts").json()[0]["status"], "cancelled")
+
+        self.auto_assign(shift_ids=[shift_id], dry_run=False)
+        shift = self.client.get("/shifts").json()[0]
+        self.assertEqual((shift["status"], shift["worker_id"]), ("active", cover))
+        self.assertEqual(self.auto_assign(shift_ids=[shift_id])["assignments"], [])
+
+    def test_matches_without_overlaps(self):
+        workers = [self.add_worker(f"Worker {i}") for i in range(3)]
+        shifts = [self.add_open_shift(BASE + timedelta(hours=i), hours=3) for i in range(8)]
+        result = self.auto_assign(dry_run=False)
+        self.assertEqual(len(result["assignments"]) + len(result["unassigned"]), len(shifts))
+        by_worker = {}
+        for shift in self.client.get("/shifts", params={"sort": "start_time"}).json():
+            if shift["worker_id"] is not None:
+                by_worker.setdefault(shift["worker_id"], []).append(shift)
+        self.assertLessEqual(set(by_worker), set(workers))
+        for booked in by_worker.values():
+            for earlier, later in zip(booked, booked[1:]):
+                self.assertLessEqual(earlier["end_time"], later["start_time"])
+
+
+class TestChangeFeed(BookingTestCase):
+    def write_changes(self):
+        worker = self.add_worker("Feed")
+        other = self.add_worker("Other")
+        shift_id = self.add_shift(worker, BASE)
+        self.client.post(f"/workers/{other}/assign-shift", params={"shift_id": shift_id})
+        self.client.put(f"/shifts/{shift_id}", json={"notes": "moved"})
+        return shift_id
+
+    def sse(self, count, **headers):
+        """The first ``count`` events of the SSE stream, parsed"""
+        request = Request({"type": "http", "headers": [(k.encode(), v.encode()) for k, v in headers.items()]})
+
+        async def consume():
+            events = []
+            response = await booking.stream_changes(request)
+            async for chunk in response.body_iterator:
+                fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+                events.append(fields)
+                if len(events) == count:
+                    break
+            await response.body_iterator.aclose()
+            return events
+        return asyncio.run(consume())
+
+    def test_websocket_pushes_changes_in_order(self):
+        start = booking.feed._latest()
+        with self.client.websocket_connect(f"/changes/ws?after={start}") as websocket:
+            shift_id = self.write_changes()
+            messages = [websocket.receive_json() for _ in range(5)]
+        self.assertEqual([message["type"] for message in messages],
+                         ["worker.created", "worker.created", "shift.created", "shift.assigned", "shift.updated"])
+        self.assertEqual([message["seq"] for message in messages], list(range(start + 1, start + 6)))
+        self.assertEqual(messages[-1]["data"]["id"], shift_id)
+        self.assertEqual(messages[-1]["data"]["notes"], "moved")
+
+    def test_sse_resumes_from_last_event_id(self):
+        start = booking.feed._latest()
+        self.write_changes()
+        events = self.sse(2, **{"last-event-id": str(start + 3)})
+        self.assertEqual([(event["id"], event["event"]) for event in events],
+                         [(str(start + 4), "shift.assigned"), (str(start + 5), "shift.updated")])
+        self.assertEqual(json.loads(events[1]["data"])["notes"], "moved")
+
+    def test_bulk_writes_are_logged(self):
+        start = booking.feed._latest()
+        worker = self.add_worker("Bulk feed")
+        shifts = [{"worker_id": worker, "start_time": (BASE + timedelta(hours=i)).isoformat(),
+                   "end_time": (BASE + timedelta(hours=i + 1)).isoformat()} for i in range(3)]
+        created = self.client.post("/shifts/bulk", json={"shifts": shifts}).json()["created"]
+        events = [json.loads(event["data"]) for event in self.sse(4, **{"last-event-id": str(start)})]
+        self.assertEqual([event["id"] for event in events[1:]], created)
+
+    def test_pruned_position_asks_for_reset(self):
+        self.add_worker("Old")
+        start = booking.feed._latest()
+        retention = change_log.LOG_RETENTION
+        change_log.LOG_RETENTION = 1
+        try:
+            self.write_changes()
+        finally:
+            change_log.LOG_RETENTION = retention
+        self.assertEqual(self.sse(1, **{"last-event-id": str(start)})[0]["event"], "reset")
+
+
+class TestDataGenerator(BookingTestCase):
+    def test_generates_non_overlapping_shifts(self):
+        result = datagen.generate(booking, 40, 600, days=20, start=BASE.date(), batch_size=100)
+        self.assertEqual((result["workers"], result["shifts"]), (40, 600))
+        with booking.engine.connect() as connection:
+            self.assertEqual(connection.execute(booking.text("SELECT count(*) FROM shifts")).scalar(), 600)
+            overlaps = connection.execute(booking.text(
+                "SELECT count(*) FROM shifts a JOIN shifts b ON b.worker_id = a.worker_id AND b.id > a.id "
+                "AND b.start_time < a.end_time AND b.end_time > a.start_time"
+            )).scalar()
+        self.assertEqual(overlaps, 0)
+
+    def test_bulk_load_resets_occupancy(self):
+        self.add_worker("Before")
+        self.assertEqual(booking.occupancy.days, {})
+        datagen.generate(booking, 10, 50, days=5, start=BASE.date())
+        db = booking.SessionLocal()
+        try:
+            booking.sync_occupancy(db)
+        finally:
+            db.close()
+        self.assertTrue(booking.occupancy.days)
+
+
+class TestCreateSchema(unittest.TestCase):
+    def test_adds_missing_columns_to_existing_tables(self):
+        engine = create_engine(f"sqlite:///{os.path.join(DATA_DIR, 'legacy.db')}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql("CREATE TABLE shifts (id INTEGER PRIMARY KEY, start_time DATETIME, notes VARCHAR)")
+            connection.exec_driver_sql("INSERT INTO shifts (start_time, notes) VALUES ('2030-01-07 08:00:00', 'kept')")
+        create_schema(booking.Base.metadata, engine)
+
+        columns = {column["name"] for column in inspect(engine).get_columns("shifts")}
+        self.assertTrue({"template_id", "occurrence_date", "worker_id", "version"} <= columns)
+        indexes = {index["name"] for index in inspect(engine).get_indexes("shifts")}
+        self.assertTrue({
+            "ux_shifts_template_occurrence", "ix_shifts_worker_start_end",
+            "ix_shifts_status_start_end", "ix_shifts_flag_status_start",
+        } <= indexes)
+        with engine.connect() as connection:
+            row = connection.exec_driver_sql("SELECT notes, version FROM shifts").first()
+        self.assertEqual(tuple(row), ("kept", 1))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
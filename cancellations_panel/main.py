@@ -1,20 +1,30 @@
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, status, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum, Text
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship, Session
 from pydantic import BaseModel
 from enum import Enum as PyEnum
+import os
+import sys
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import track_changes, table_versions, make_etag, etag_matches
+from common.database import get_engine
 
 app = FastAPI(title="Cancellations Panel API")
 
-# Database configuration
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cancellations.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# Database configuration (CANCELLATIONS_DATABASE_URL overrides the default file)
+engine = get_engine("cancellations", "cancellations.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Keep per-table change counters for ETags
+track_changes(SessionLocal)
+
 class ShiftStatus(str, PyEnum):
     ACTIVE = "active"
     COMPLETED = "completed"
@@ -282,11 +292,11 @@ class ShiftResponse(BaseModel):
 
 # Worker endpoints
 @app.get("/workers", response_model=List[WorkerResponse])
-async def get_workers(db: Session = Depends(get_db)):
+def get_workers(db: Session = Depends(get_db)):
     return db.query(Worker).all()
 
 @app.post("/workers", response_model=WorkerResponse)
-async def create_worker(worker: WorkerCreate, db: Session = Depends(get_db)):
+def create_worker(worker: WorkerCreate, db: Session = Depends(get_db)):
     db_worker = Worker(**worker.model_dump())
     db.add(db_worker)
     db.commit()
@@ -295,11 +305,11 @@ async def create_worker(worker: WorkerCreate, db: Session = Depends(get_db)):
 
 # Shift endpoints
 @app.get("/shifts", response_model=List[ShiftResponse])
-async def get_shifts(db: Session = Depends(get_db)):
+def get_shifts(db: Session = Depends(get_db)):
     return db.query(Shift).all()
 
 @app.post("/shifts", response_model=ShiftResponse)
-async def create_shift(shift: ShiftCreate, db: Session = Depends(get_db)):
+def create_shift(shift: ShiftCreate, db: Session = Depends(get_db)):
     db_shift = Shift(**shift.model_dump())
     db.add(db_shift)
     db.commit()
@@ -307,13 +317,20 @@ async def create_shift(shift: ShiftCreate, db: Session = Depends(get_db)):
     return db_shift
 
 @app.get("/cancellations", response_model=List[CancellationResponse])
-async def get_cancellations(
+def get_cancellations(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     status: Optional[CancellationStatus] = None,
     worker_id: Optional[int] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
 ):
+    etag = make_etag(table_versions(db, ["cancellations"]), sorted(request.query_params.multi_items()))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     query = db.query(Cancellation)
     
     if status:
@@ -328,7 +345,7 @@ async def get_cancellations(
     return query.all()
 
 @app.post("/cancellations", response_model=CancellationResponse)
-async def create_cancellation(
+def create_cancellation(
     cancellation: CancellationCreate,
     db: Session = Depends(get_db)
 ):
@@ -351,7 +368,7 @@ async def create_cancellation(
     return db_cancellation
 
 @app.put("/cancellations/{cancellation_id}/blacklist", response_model=CancellationResponse)
-async def blacklist_worker(
+def blacklist_worker(
     cancellation_id: int,
     db: Session = Depends(get_db)
 ):
@@ -374,7 +391,7 @@ async def blacklist_worker(
     return cancellation
 
 @app.post("/rebooking-suggestions", response_model=QuickRebookingSuggestionResponse)
-async def create_rebooking_suggestion(
+def create_rebooking_suggestion(
     suggestion: QuickRebookingSuggestionCreate,
     db: Session = Depends(get_db)
 ):
@@ -389,7 +406,7 @@ async def create_rebooking_suggestion(
     return db_suggestion
 
 @app.get("/rebooking-suggestions", response_model=List[QuickRebookingSuggestionResponse])
-async def get_rebooking_suggestions(
+def get_rebooking_suggestions(
     db: Session = Depends(get_db),
     original_shift_id: Optional[int] = None,
     accepted: Optional[bool] = None
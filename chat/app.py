@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, HTTPException, Depends, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Literal
@@ -7,8 +7,15 @@ from enum import Enum
 import json
 import csv
 import io
+import os
+import sys
 from uuid import uuid4
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import make_etag, etag_matches
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Conversation Log CRM API",
@@ -73,6 +80,15 @@ class ConversationFilter(BaseModel):
 # In-memory storage (replace with database in production)
 conversations_db: List[ConversationLog] = []
 
+# Change counter for ETags; the epoch changes on every restart because the
+# store is in memory
+conversations_epoch = uuid4().hex
+conversations_version = 0
+
+def bump_conversations_version():
+    global conversations_version
+    conversations_version += 1
+
 # Sample data for demonstration
 sample_conversations = [
     ConversationLog(
@@ -145,6 +161,8 @@ async def root():
 
 @app.get("/conversations", response_model=List[ConversationLog])
 async def get_conversations(
+    request: Request,
+    response: Response,
     type: Optional[ConversationType] = Query(None, description="Filter by conversation type"),
     status: Optional[ConversationStatus] = Query(None, description="Filter by status"),
     worker_name: Optional[str] = Query(None, description="Filter by worker name"),
@@ -156,6 +174,11 @@ async def get_conversations(
     offset: int = Query(0, ge=0, description="Offset for pagination")
 ):
     """Get filtered conversation logs with pagination"""
+    etag = make_etag((conversations_epoch, conversations_version), sorted(request.query_params.multi_items()))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     filters = ConversationFilter(
         type=type,
         status=status,
@@ -186,6 +209,7 @@ async def create_conversation(conversation: ConversationCreate):
     """Create a new conversation log"""
     new_conversation = ConversationLog(**conversation.dict())
     conversations_db.append(new_conversation)
+    bump_conversations_version()
     return new_conversation
 
 @app.put("/conversations/{conversation_id}", response_model=ConversationLog)
@@ -204,6 +228,7 @@ async def update_conversation(conversation_id: str, updates: ConversationUpdate)
     if updates.status == ConversationStatus.RESOLVED and not conversation.resolved_at:
         conversation.resolved_at = datetime.now()
     
+    bump_conversations_version()
     return conversation
 
 @app.delete("/conversations/{conversation_id}")
@@ -211,10 +236,13 @@ async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
     global conversations_db
     conversations_db = [c for c in conversations_db if c.id != conversation_id]
+    bump_conversations_version()
     return {"message": "Conversation deleted successfully"}
 
+# Exports and stats walk every conversation; as plain ``def`` endpoints they
+# run in the threadpool instead of holding the event loop.
 @app.get("/conversations/export/csv")
-async def export_conversations_csv(
+def export_conversations_csv(
     type: Optional[ConversationType] = Query(None),
     status: Optional[ConversationStatus] = Query(None),
     worker_name: Optional[str] = Query(None),
@@ -273,7 +301,7 @@ async def export_conversations_csv(
     )
 
 @app.get("/conversations/export/json")
-async def export_conversations_json(
+def export_conversations_json(
     type: Optional[ConversationType] = Query(None),
     status: Optional[ConversationStatus] = Query(None),
     worker_name: Optional[str] = Query(None),
@@ -309,7 +337,7 @@ async def export_conversations_json(
     )
 
 @app.get("/stats/summary")
-async def get_conversation_stats():
+def get_conversation_stats():
     """Get summary statistics of conversations"""
     total_conversations = len(conversations_db)
     
@@ -1,11 +1,16 @@
-from sqlalchemy import create_engine
+import os
+import sys
+
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
-# Database URL - adjust according to your database
-DATABASE_URL = "sqlite:///./chat.db"  # or your actual database URL
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.database import get_engine
 
-engine = create_engine(DATABASE_URL)
+# Database file in the project root; CHAT_DATABASE_URL overrides it
+engine = get_engine("chat", "chat.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -14,4 +19,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
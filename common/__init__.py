@@ -0,0 +1 @@
+# Make common a package
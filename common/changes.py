@@ -0,0 +1,92 @@
+"""Per-table change counters, and ETags built from them.
+
+Every write bumps its tables' counters in the same transaction, so a list
+endpoint can build its ETag from the counters and the request parameters
+before running any query: a matching If-None-Match answers 304 without
+touching the table.
+"""
+import hashlib
+import uuid
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.exc import OperationalError
+
+# One row per tracked table plus an "__epoch__" row that is random per
+# database file, so recreating the file never reissues an old ETag.
+CREATE_VERSIONS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS table_versions "
+    "(table_name VARCHAR PRIMARY KEY, version INTEGER NOT NULL)"
+)
+
+
+def _ensure_table(connection):
+    # Runs inside the writing transaction; both statements are no-ops once
+    # the table exists, so a rolled-back write never leaves it half made.
+    connection.execute(text(CREATE_VERSIONS_TABLE))
+    connection.execute(
+        text("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('__epoch__', :epoch)"),
+        {"epoch": uuid.uuid4().int & 0x7FFFFFFF},
+    )
+
+
+def bump_versions(connection, tables):
+    """Increment the change counter of each table inside the caller's transaction.
+
+    Needed after bulk Core statements, which bypass the ORM flush hook.
+    """
+    _ensure_table(connection)
+    for table in tables:
+        connection.execute(
+            text(
+                "INSERT INTO table_versions (table_name, version) VALUES (:table, 1) "
+                "ON CONFLICT(table_name) DO UPDATE SET version = version + 1"
+            ),
+            {"table": table},
+        )
+
+
+def _after_flush(session, flush_context):
+    tables = {
+        obj.__table__.name
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    tables.discard("table_versions")
+    if tables:
+        bump_versions(session.connection(), sorted(tables))
+
+
+def track_changes(session_factory):
+    """Bump table change counters whenever a session flushes ORM changes."""
+    event.listen(session_factory, "after_flush", _after_flush)
+
+
+def table_versions(session, tables):
+    """Current change counters for ``tables`` (plus the database epoch)."""
+    names = ["__epoch__"] + list(tables)
+    try:
+        rows = session.execute(
+            text("SELECT table_name, version FROM table_versions WHERE table_name IN :names").bindparams(
+                bindparam("names", expanding=True)
+            ),
+            {"names": names},
+        ).all()
+    except OperationalError:
+        # No write has been tracked in this database yet
+        rows = []
+    versions = dict(rows)
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def make_etag(versions, *parts):
+    """Strong ETag from table versions and the request parameters."""
+    digest = hashlib.sha1(repr((versions,) + parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value matches ``etag``."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,125 @@
+"""Engines and schema setup shared by the service databases.
+
+Sessions are synchronous, so FastAPI endpoints that use one are plain
+``def``: FastAPI runs them, and their ``get_db`` dependency, in its
+threadpool, and a slow query never blocks the event loop.
+"""
+import os
+import sqlite3
+import threading
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateColumn
+
+# Relative database files resolve here, whatever the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+# Connections each process keeps open per database file, plus up to
+# MAX_OVERFLOW more opened per checkout under load and closed on return.
+# Each connection maps and caches its own pages (see PRAGMAS), so the
+# overflow is bounded: past it a checkout waits for a connection to come
+# back. The gateway's admission limits bound concurrent sessions per mount;
+# -1 lifts the bound.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 16))
+
+# Applied to every new connection. WAL lets readers run alongside the one
+# writer, and NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("cache_size", -16000),  # negative means KiB, so 16 MB
+    ("mmap_size", 128 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def database_url(service, filename):
+    """``<SERVICE>_DATABASE_URL`` if set, else ``filename`` under the project root."""
+    override = os.getenv(f"{service.upper()}_DATABASE_URL")
+    if override:
+        return override
+    return f"sqlite:///{os.path.join(PROJECT_ROOT, filename)}"
+
+
+def _sqlite_connector(path):
+    def connect():
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        for name, value in PRAGMAS:
+            connection.execute(f"PRAGMA {name}={value}")
+        return connection
+    return connect
+
+
+def engine_options(url):
+    """Keyword arguments for ``create_engine`` (or Flask's SQLALCHEMY_ENGINE_OPTIONS).
+
+    File-backed SQLite gets the tuned connector and a bounded pool; other
+    databases and in-memory SQLite keep SQLAlchemy's defaults.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "creator": _sqlite_connector(url.database),
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+    }
+
+
+def get_engine(service, filename):
+    """The process-wide engine for a service database, created on first use.
+
+    Modules that point at the same file share one engine and one pool.
+    """
+    url = database_url(service, filename)
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = _engines[url] = create_engine(url, **engine_options(url))
+    return engine
+
+
+def create_schema(metadata, engine):
+    """Create missing tables, then columns and indexes added to existing tables.
+
+    ``create_all`` never alters a table that already exists, so databases
+    created before a column or index was declared would otherwise never get
+    it. New columns on existing tables must be nullable or have a
+    ``server_default``, which fills in the existing rows.
+    """
+    metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    definition = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN {definition}')
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def configure_flask(app, service, filename):
+    """Point a Flask-SQLAlchemy app at its database with the same tuning."""
+    url = database_url(service, filename)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+
+
+def _dispose_after_fork():
+    # Pooled connections must not be shared with a forked gunicorn worker
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+from collections import deque, namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import Column, Integer, String, Table, Text, event, text
+from sqlalchemy.exc import OperationalError
+
+# Writers append events inside their own transaction, so sequence numbers
+# are shared by every process and follow commit order. Each process reads
+# new rows once, keeps the latest in a replay buffer and fans them out to
+# its subscribers; clients never poll the database themselves.
+
+# Rows kept for clients resuming from further back than the replay buffer
+LOG_RETENTION = int(os.getenv("CHANGE_LOG_RETENTION", 100000))
+
+# Rows read per query when catching up
+READ_BATCH = 1000
+
+Change = namedtuple("Change", "seq type data")
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def log_table(metadata):
+    """Declare the change log on a service's metadata, so ``create_schema``
+    creates it once with the service's own tables."""
+    return Table(
+        "change_log", metadata,
+        Column("seq", Integer, primary_key=True),
+        Column("type", String, nullable=False),
+        Column("data", Text, nullable=False),
+    )
+
+
+def record_changes(connection, changes):
+    """Append ``(type, data)`` events to the log inside the caller's transaction.
+
+    ``data`` is any JSON-serializable mapping; the oldest rows beyond
+    LOG_RETENTION are dropped in the same transaction.
+    """
+    if not changes:
+        return
+    connection.execute(
+        text("INSERT INTO change_log (type, data) VALUES (:type, :data)"),
+        [{"type": kind, "data": json.dumps(dict(data), default=_json_default)} for kind, data in changes],
+    )
+    connection.execute(
+        text("DELETE FROM change_log WHERE seq <= (SELECT max(seq) FROM change_log) - :keep"),
+        {"keep": LOG_RETENTION},
+    )
+
+
+def log_changes(session, changes):
+    """``record_changes`` for bulk Core statements, which bypass the flush hook."""
+    if changes:
+        record_changes(session.connection(), changes)
+        session.info["change_log_pending"] = True
+
+
+def read_changes(connection, after, limit=READ_BATCH):
+    """Up to ``limit`` changes after sequence ``after``, oldest first."""
+    try:
+        rows = connection.execute(
+            text("SELECT seq, type, data FROM change_log WHERE seq > :after ORDER BY seq LIMIT :limit"),
+            {"after": after, "limit": limit},
+        ).all()
+    except OperationalError:
+        # Nothing has been logged in this database yet
+        return []
+    return [Change(*row) for row in rows]
+
+
+def latest_seq(connection):
+    try:
+        return connection.execute(text("SELECT coalesce(max(seq), 0) FROM change_log")).scalar()
+    except OperationalError:
+        return 0
+
+
+def track_events(session_factory, describe, on_commit=None):
+    """Log an event for every flushed object ``describe`` maps to ``(type, data)``.
+
+    ``describe(obj, created)`` returns None for objects that are not
+    tracked. ``on_commit`` runs after a commit that logged anything.
+    """
+    def after_flush(session, flush_context):
+        changes = [describe(obj, True) for obj in session.new]
+        changes += [describe(obj, False) for obj in session.dirty if session.is_modified(obj)]
+        log_changes(session, [change for change in changes if change is not None])
+
+    def after_commit(session):
+        if session.info.pop("change_log_pending", False) and on_commit is not None:
+            on_commit()
+
+    def after_rollback(session):
+        session.info.pop("change_log_pending", None)
+
+    event.listen(session_factory, "after_flush", after_flush)
+    event.listen(session_factory, "after_commit", after_commit)
+    event.listen(session_factory, "after_soft_rollback", lambda session, previous: after_rollback(session))
+
+
+class _Subscriber:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(queue_size)
+        self.lagged = False
+
+
+class ChangeFeed:
+    """Per-process reader of the change log with a bounded replay buffer.
+
+    One task per process reads new rows (woken by ``notify`` after local
+    commits, or every ``poll_interval`` for other processes' writes) while
+    anyone is subscribed. A subscriber whose queue fills up is dropped and
+    resumes from its last sequence number on reconnect.
+    """
+
+    def __init__(self, engine, replay_size=1000, queue_size=1000, poll_interval=0.5, heartbeat=15):
+        self.engine = engine
+        self.replay = deque(maxlen=replay_size)
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.last_seq = None
+        self.subscribers = set()
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    def notify(self):
+        """Wake the reader; safe to call from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def _read(self, after, limit=READ_BATCH):
+        with self.engine.connect() as connection:
+            return read_changes(connection, after, limit)
+
+    def _latest(self):
+        with self.engine.connect() as connection:
+            return latest_seq(connection)
+
+    def _start(self, loop):
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # A fresh reader starts from the log's current end
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self.last_seq = None
+            self.replay.clear()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.last_seq is None:
+                continue
+            changes = await loop.run_in_executor(None, self._read, self.last_seq)
+            while changes:
+                self._publish(changes)
+                if len(changes) < READ_BATCH:
+                    break
+                changes = await loop.run_in_executor(None, self._read, self.last_seq)
+
+    def _publish(self, changes):
+        for change in changes:
+            self.last_seq = change.seq
+            self.replay.append(change)
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.queue.put_nowait(change)
+                except asyncio.QueueFull:
+                    subscriber.lagged = True
+                    self.subscribers.discard(subscriber)
+
+    async def _backlog(self, after):
+        """Changes after ``after`` up to the live position, or a reset marker"""
+        if self.replay and self.replay[0].seq <= after + 1:
+            for change in list(self.replay):
+                if change.seq > after:
+                    yield change
+            return
+        loop = asyncio.get_running_loop()
+        first = True
+        while after < self.last_seq:
+            changes = await loop.run_in_executor(None, self._read, after)
+            if not changes:
+                return
+            if first and changes[0].seq > after + 1:
+                # Pruned from the log: the client has to reload its state
+                yield Change(self.last_seq, "reset", "{}")
+                return
+            first = False
+            for change in changes:
+                yield change
+            after = changes[-1].seq
+
+    async def changes(self, after=None):
+        """Changes after sequence ``after`` (only new ones when None), then live.
+
+        Yields None as a heartbeat while idle, and a ``reset`` change when
+        ``after`` is no longer in the log. Ends if the subscriber falls too
+        far behind; resuming from the last sequence seen loses nothing.
+        """
+        loop = asyncio.get_running_loop()
+        subscriber = _Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        self._start(loop)
+        try:
+            if self.last_seq is None:
+                self.last_seq = await loop.run_in_executor(None, self._latest)
+            seen = self.last_seq
+            if after is not None and after > self.last_seq:
+                yield Change(self.last_seq, "reset", "{}")
+            elif after is not None:
+                seen = after
+                async for change in self._backlog(after):
+                    seen = change.seq
+                    yield change
+            while not (subscriber.lagged and subscriber.queue.empty()):
+                if subscriber.queue.empty():
+                    try:
+                        change = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+                else:
+                    change = subscriber.queue.get_nowait()
+                if change.seq > seen:
+                    seen = change.seq
+                    yield change
+        finally:
+            self.subscribers.discard(subscriber)
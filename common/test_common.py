@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import track_changes, table_versions, make_etag, etag_matches
+from common.database import PROJECT_ROOT, database_url, get_engine
+from common.feed import ChangeFeed, log_table, track_events
+
+Base = declarative_base()
+
+class Item(Base):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+log_table(Base.metadata)
+
+
+class TestChangeTracking(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        track_changes(self.SessionLocal)
+
+    def test_versions_bump_on_write_only(self):
+        db = self.SessionLocal()
+        before = table_versions(db, ["items"])
+        self.assertEqual(before, (0, 0))
+
+        db.add(Item(name="first"))
+        db.commit()
+        after_insert = table_versions(db, ["items"])
+        self.assertEqual(after_insert[1], 1)
+        self.assertNotEqual(after_insert[0], 0)
+
+        db.query(Item).all()
+        self.assertEqual(table_versions(db, ["items"]), after_insert)
+
+        item = db.query(Item).first()
+        item.name = "renamed"
+        db.commit()
+        self.assertEqual(table_versions(db, ["items"])[1], 2)
+        db.close()
+
+    def test_rolled_back_write_keeps_version(self):
+        db = self.SessionLocal()
+        db.add(Item(name="first"))
+        db.commit()
+        version = table_versions(db, ["items"])
+
+        db.add(Item(name="second"))
+        db.flush()
+        db.rollback()
+        self.assertEqual(table_versions(db, ["items"]), version)
+        db.close()
+
+    def test_etag_matching(self):
+        etag = make_etag((1, 2), [("status", "active")])
+        self.assertNotEqual(etag, make_etag((1, 3), [("status", "active")]))
+        self.assertNotEqual(etag, make_etag((1, 2), [("status", "cancelled")]))
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", W/{etag}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches(None, etag))
+        self.assertFalse(etag_matches('"other"', etag))
+
+
+class TestChangeFeed(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(directory, 'feed.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.feed = ChangeFeed(self.engine, replay_size=2, heartbeat=0.05)
+        track_events(
+            self.SessionLocal,
+            lambda obj, created: ("item.created" if created else "item.updated", {"id": obj.id, "name": obj.name}),
+            on_commit=self.feed.notify,
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def write(self, *names):
+        db = self.SessionLocal()
+        for name in names:
+            db.add(Item(name=name))
+            db.commit()
+        db.close()
+
+    def collect(self, after, count, write=()):
+        async def run():
+            changes = []
+            async for change in self.feed.changes(after):
+                if change is None:
+                    # Idle: the live part starts now
+                    await asyncio.get_running_loop().run_in_executor(None, self.write, *write)
+                    continue
+                changes.append(change)
+                if len(changes) == count:
+                    return changes
+        return asyncio.run(run())
+
+    def test_resume_from_log_then_live(self):
+        self.write("a", "b", "c")
+        changes = self.collect(1, 3, write=["d"])
+        self.assertEqual([change.seq for change in changes], [2, 3, 4])
+        self.assertEqual([change.data for change in changes], [
+            '{"id": 2, "name": "b"}', '{"id": 3, "name": "c"}', '{"id": 4, "name": "d"}',
+        ])
+
+    def test_rolled_back_write_logs_nothing(self):
+        db = self.SessionLocal()
+        db.add(Item(name="discarded"))
+        db.flush()
+        db.rollback()
+        db.close()
+        self.write("kept")
+        self.assertEqual(self.collect(0, 1)[0].data, '{"id": 1, "name": "kept"}')
+
+
+class TestDatabase(unittest.TestCase):
+    def test_url_resolution_and_override(self):
+        self.assertEqual(database_url("booking", "bookings.db"), f"sqlite:///{os.path.join(PROJECT_ROOT, 'bookings.db')}")
+        with mock.patch.dict(os.environ, {"BOOKING_DATABASE_URL": "sqlite:///elsewhere.db"}):
+            self.assertEqual(database_url("booking", "bookings.db"), "sqlite:///elsewhere.db")
+
+    def test_engine_is_shared_and_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tuned.db")
+            engine = get_engine("tuned", path)
+            self.assertIs(get_engine("tuned", path), engine)
+            with engine.connect() as connection:
+                self.assertEqual(connection.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+                self.assertEqual(connection.exec_driver_sql("PRAGMA synchronous").scalar(), 1)
+                self.assertEqual(connection.exec_driver_sql("PRAGMA busy_timeout").scalar(), 5000)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
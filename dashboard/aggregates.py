@@ -0,0 +1,90 @@
+"""Overview numbers for the dashboard from one pass over ``bookings``.
+
+A single ``GROUP BY status, reason, agent_id`` with conditional sums
+returns one small row per combination; status counts, revenue, response
+times, today's cancellations, cancellation reasons and per-agent booking
+counts are all folded from those rows in Python. Agents and reasons are
+short categorical lists, so the group count stays far below the row count.
+The service runs it over the open hour only and reads the rest from the
+rollups (see ``dashboard.rollups``); ``BookingSummary.load`` runs it over
+every row.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import and_, case, func, select
+
+CANCELLED = "cancelled"
+CONFIRMED = "confirmed"
+
+
+def summary_query(bookings, today):
+    """The single aggregate statement over the ``bookings`` table"""
+    start = datetime.combine(today, time.min)
+    created_today = and_(bookings.c.created_at >= start, bookings.c.created_at < start + timedelta(days=1))
+    return select(
+        bookings.c.status,
+        bookings.c.reason,
+        bookings.c.agent_id,
+        func.count(),
+        func.sum(bookings.c.response_time),
+        func.count(bookings.c.response_time),
+        func.sum(bookings.c.amount),
+        func.sum(case((created_today, 1), else_=0)),
+    ).group_by(bookings.c.status, bookings.c.reason, bookings.c.agent_id)
+
+
+class BookingSummary:
+    """Status counts, revenue, response times, cancellations and agent counts."""
+
+    def __init__(self, rows):
+        self.status_counts = Counter()
+        self.reasons = Counter()
+        self.agent_counts = Counter()
+        self.revenue = 0.0
+        self.today_cancellations = 0
+        self.response_sum, self.response_count = 0.0, 0
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        """Fold in one ``summary_query`` row; negative counts take bookings out"""
+        status, reason, agent_id, count, response_total, responses, amount, today = row
+        self.status_counts[status] += count
+        self.agent_counts[agent_id] += count
+        self.response_sum += response_total or 0
+        self.response_count += responses
+        if status == CONFIRMED:
+            self.revenue += amount or 0
+        elif status == CANCELLED:
+            self.today_cancellations += today
+            if reason is not None:
+                self.reasons[reason] += count
+        # Drop emptied groups, so they leave the agent count and reason list
+        for counter, key in ((self.agent_counts, agent_id), (self.reasons, reason)):
+            if key in counter and counter[key] <= 0:
+                del counter[key]
+
+    @property
+    def total(self):
+        return sum(self.status_counts.values())
+
+    @property
+    def avg_response_time(self):
+        return self.response_sum / self.response_count if self.response_count else 0
+
+    @classmethod
+    def load(cls, db, bookings, today):
+        return cls(db.execute(summary_query(bookings, today)))
+
+    def count(self, status):
+        return self.status_counts.get(status, 0)
+
+    @property
+    def total_agents(self):
+        # NULL agents are not counted, as with COUNT(DISTINCT agent_id)
+        return sum(1 for agent_id in self.agent_counts if agent_id is not None)
+
+    def top_agents(self, limit=5):
+        """``(agent_id, booking_count)`` of the busiest agents, most bookings first"""
+        return sorted(self.agent_counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
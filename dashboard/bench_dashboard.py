@@ -0,0 +1,281 @@
+"""Benchmarks for the dashboard service.
+
+Seeds a scratch database with bulk inserts and backfills the rollups, then
+compares the original overview (one query per status and one per
+statistic) with a single aggregate pass over the raw rows and with the
+rollups, counting the SQL statements each issues, times custom reports
+over the whole range and the repeat-canceller ranking, and measures how long booking writes take to reach
+hundreds of live dashboard screens. Run from the project root:
+
+    python -m dashboard.bench_dashboard --bookings 2000000 --customers 50000 --screens 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import bump_versions
+from dashboard.cancellers import CancellerWindow, cancellations_query, repeat_cancellers_query
+from dashboard.report_engine import build_report
+from dashboard.rollups import hour_start
+
+STATUSES = ("confirmed", "cancelled", "standby", "pending", "completed")
+REASONS = (None, "sick", "schedule conflict", "no show", "customer_request", "weather")
+
+
+def seed(dashboard, bookings, agents=200, customers=50000, days=365, batch_size=100000, seed_value=7):
+    """Fill bookings with bulk Core inserts in one transaction."""
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    with dashboard.engine.begin() as connection:
+        for offset in range(0, bookings, batch_size):
+            rows = []
+            for _ in range(min(batch_size, bookings - offset)):
+                status = rng.choice(STATUSES)
+                rows.append({
+                    "status": status,
+                    "created_at": now - timedelta(minutes=rng.randrange(days * 1440)),
+                    "response_time": rng.uniform(1, 120),
+                    "agent_id": f"agent{rng.randrange(agents)}",
+                    "customer_id": f"customer{rng.randrange(customers)}",
+                    "service_type": rng.choice(("cleaning", "catering", "security")),
+                    "amount": rng.uniform(20, 500),
+                    "reason": rng.choice(REASONS) if status == "cancelled" else None,
+                })
+            connection.execute(dashboard.Booking.__table__.insert(), rows)
+        bump_versions(connection, ["bookings"])
+
+
+def legacy_overview(dashboard, db):
+    """The original overview queries, kept here as the baseline."""
+    Booking, BookingStatus = dashboard.Booking, dashboard.BookingStatus
+    today = datetime.utcnow().date()
+    result = {"total": db.query(func.count(Booking.id)).scalar() or 0}
+    for status in BookingStatus:
+        result[status.value] = db.query(func.count(Booking.id)).filter(Booking.status == status).scalar() or 0
+    result["avg_response_time"] = db.query(func.avg(Booking.response_time)).scalar() or 0
+    result["revenue"] = db.query(func.sum(Booking.amount)).filter(
+        Booking.status == BookingStatus.confirmed).scalar() or 0
+    result["today"] = db.query(func.count(Booking.id)).filter(
+        Booking.status == BookingStatus.cancelled, func.date(Booking.created_at) == today).scalar() or 0
+    result["reasons"] = dict(db.query(Booking.reason, func.count(Booking.id)).filter(
+        Booking.status == BookingStatus.cancelled, Booking.reason.isnot(None)).group_by(Booking.reason).all())
+    result["total_workers"] = db.query(func.count(func.distinct(Booking.agent_id))).scalar() or 0
+    result["top_performers"] = db.query(Booking.agent_id, func.count(Booking.id)).group_by(
+        Booking.agent_id).order_by(func.count(Booking.id).desc()).limit(5).all()
+    return result
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, *args):
+        self.count += 1
+
+
+def timed(counter, fn, repeat):
+    latencies = []
+    counter.count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return {
+        "queries": counter.count // repeat,
+        "best_ms": round(min(latencies) * 1000, 1),
+        "mean_ms": round(sum(latencies) / repeat * 1000, 1),
+    }
+
+
+def backfill(dashboard):
+    started = time.perf_counter()
+    with dashboard.engine.begin() as connection:
+        dashboard.rollups.rebuild(connection, hour_start(datetime.utcnow()))
+        rows = {
+            table.name: connection.execute(select(func.count()).select_from(table)).scalar()
+            for table in (dashboard.rollups.hourly, dashboard.rollups.daily)
+        }
+    return {"seconds": round(time.perf_counter() - started, 2), **rows}
+
+
+def overview(dashboard, repeat):
+    counter = QueryCounter(dashboard.engine)
+    client = TestClient(dashboard.app)
+    db = dashboard.SessionLocal()
+    today = datetime.utcnow().date()
+    try:
+        return {
+            "legacy": timed(counter, lambda: legacy_overview(dashboard, db), repeat),
+            "single_pass": timed(counter, lambda: dashboard.BookingSummary.load(
+                db, dashboard.Booking.__table__, today), repeat),
+            "rollups": timed(counter, lambda: dashboard.BookingSummary(
+                db.execute(dashboard.rollups.summary_query(today))), repeat),
+            "endpoint": timed(counter, lambda: client.get("/dashboard/overview").raise_for_status(), repeat),
+            "series_hourly": timed(counter, lambda: client.get(
+                "/dashboard/metrics/bookings/series").raise_for_status(), repeat),
+            "series_daily": timed(counter, lambda: client.get(
+                "/dashboard/metrics/bookings/series", params={"grain": "day"}).raise_for_status(), repeat),
+        }
+    finally:
+        db.close()
+
+
+def reports(dashboard, days=365):
+    """Each grouping over every metric, computed directly (not as a job)"""
+    end = datetime.utcnow().date()
+    results = {}
+    with dashboard.engine.connect() as connection:
+        for group_by in ("day", "week", "month"):
+            started = time.perf_counter()
+            report = build_report(
+                connection, dashboard.Booking.__table__, dashboard.AgentActivity.__table__,
+                end - timedelta(days=days), end, ["bookings", "cancellations", "workers", "chat", "revenue"], group_by,
+            )
+            seconds = time.perf_counter() - started
+            results[group_by] = {
+                "seconds": round(seconds, 2),
+                "rows_per_second": round(report["totals"]["bookings"] / seconds),
+                "periods": len(report["periods"]),
+            }
+    return results
+
+
+def repeat_cancellers(dashboard, repeat):
+    """The ranking off the partial index, and the live view's in-memory window"""
+    counter = QueryCounter(dashboard.engine)
+    bookings = dashboard.Booking.__table__
+    now = datetime.utcnow()
+    since = now - dashboard.REPEAT_CANCEL_WINDOW
+    db = dashboard.SessionLocal()
+    try:
+        windows = []
+        results = {
+            "query": timed(counter, lambda: db.execute(repeat_cancellers_query(
+                bookings, since, dashboard.REPEAT_CANCEL_MIN, dashboard.REPEAT_CANCEL_LIMIT)).all(), repeat),
+            "window_load": timed(counter, lambda: windows.append(CancellerWindow(
+                db.execute(cancellations_query(bookings, since)), dashboard.REPEAT_CANCEL_WINDOW,
+                dashboard.REPEAT_CANCEL_MIN, dashboard.REPEAT_CANCEL_LIMIT)), repeat),
+        }
+        window = windows[-1]
+        results["window_ranked"] = timed(counter, lambda: window.ranked(now), repeat)
+        results["cancellations_in_window"] = sum(len(times) for times in window.times.values())
+        results["customers_over_threshold"] = len(window.candidates)
+        return results
+    finally:
+        db.close()
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def live(dashboard, screens, writes=100, pause=0.05):
+    """Commit-to-screen latency of live overview deltas.
+
+    ``screens`` subscribers follow the live view while bookings are written
+    through the ORM one commit at a time; each write is timed until every
+    screen has a delta sent after it committed.
+    """
+    counter = QueryCounter(dashboard.engine)
+
+    def write(rng):
+        db = dashboard.SessionLocal()
+        try:
+            db.add(dashboard.Booking(
+                status=rng.choice(STATUSES), agent_id=f"agent{rng.randrange(200)}",
+                customer_id=f"customer{rng.randrange(50000)}", service_type="hotel",
+                amount=round(rng.uniform(20, 2000), 2), response_time=round(rng.uniform(5, 300), 1),
+            ))
+            db.commit()
+        finally:
+            db.close()
+        return time.perf_counter()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        view = dashboard.live
+        received = [(0, 0.0)] * screens
+
+        async def screen(index, ready):
+            async for message in view.updates():
+                if message is not None:
+                    received[index] = (message[0], time.perf_counter())
+                    ready.set()
+
+        started = time.perf_counter()
+        readiness = [asyncio.Event() for _ in range(screens)]
+        tasks = [asyncio.create_task(screen(index, ready)) for index, ready in enumerate(readiness)]
+        await asyncio.gather(*(ready.wait() for ready in readiness))
+        connect_seconds = time.perf_counter() - started
+
+        rng = random.Random(11)
+        latencies = []
+        counter.count = 0
+        for _ in range(writes):
+            version = view.version
+            committed = await loop.run_in_executor(None, write, rng)
+            while min(seen for seen, _ in received) <= version:
+                await asyncio.sleep(0.001)
+            latencies.extend(at - committed for _, at in received)
+            await asyncio.sleep(pause)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return connect_seconds, latencies
+
+    connect_seconds, latencies = asyncio.run(run())
+    return {
+        "screens": screens,
+        "writes": writes,
+        "connect_seconds": round(connect_seconds, 2),
+        "queries_per_write": round(counter.count / writes, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=2000000)
+    parser.add_argument("--customers", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--screens", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DASHBOARD_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'dashboard.db')}"
+        from dashboard import main as dashboard
+
+        started = time.perf_counter()
+        seed(dashboard, args.bookings, customers=args.customers)
+        results = {
+            "bookings": args.bookings,
+            "seed_seconds": round(time.perf_counter() - started, 2),
+            "backfill": backfill(dashboard),
+            "overview": overview(dashboard, args.repeat),
+            "reports": reports(dashboard),
+            "repeat_cancellers": repeat_cancellers(dashboard, args.repeat),
+            "live": live(dashboard, args.screens),
+        }
+        dashboard.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Repeat cancellers: customers with several cancellations in a sliding window.
+
+A customer qualifies with at least ``min_count`` cancelled bookings
+created in the last ``window``; the most cancellations rank first, then
+the most recent. Bookings record no cancellation time, so a cancelled
+booking counts at its ``created_at``.
+
+The query reads only the window's cancellations off
+``ix_bookings_cancellations``, a partial index of cancelled bookings on
+(created_at, customer_id, status) that covers it, so its cost follows the
+cancellations in the window, not the length of the history.
+``CancellerWindow`` keeps the same ranking current in memory for the live
+dashboard.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+CANCELLED = "cancelled"
+
+WINDOW = timedelta(days=30)
+MIN_CANCELLATIONS = 3
+LIMIT = 10
+
+
+def repeat_cancellers_query(bookings, since, min_count=MIN_CANCELLATIONS, limit=LIMIT):
+    """``(customer_id, cancellations, last_cancelled_at)`` rows, ranked"""
+    count = func.count().label("cancellations")
+    last = func.max(bookings.c.created_at).label("last_cancelled_at")
+    return (
+        select(bookings.c.customer_id, count, last)
+        .where(
+            bookings.c.status == CANCELLED,
+            bookings.c.created_at >= since,
+            bookings.c.customer_id.isnot(None),
+        )
+        .group_by(bookings.c.customer_id)
+        .having(func.count() >= min_count)
+        .order_by(count.desc(), last.desc(), bookings.c.customer_id)
+        .limit(limit)
+    )
+
+
+def cancellations_query(bookings, since):
+    """``(customer_id, created_at)`` of every cancellation in the window"""
+    return select(bookings.c.customer_id, bookings.c.created_at).where(
+        bookings.c.status == CANCELLED,
+        bookings.c.created_at >= since,
+        bookings.c.customer_id.isnot(None),
+    )
+
+
+def as_dicts(rows):
+    return [
+        {"customer_id": customer_id, "cancellations": count, "last_cancelled_at": last}
+        for customer_id, count, last in rows
+    ]
+
+
+class CancellerWindow:
+    """Cancellation times per customer, ranked on demand like the query.
+
+    Loaded from ``cancellations_query`` rows and kept current with ``add``
+    and ``remove``. Times that slide out of the window are dropped when
+    ``ranked`` looks at the customer; only customers with enough
+    cancellations to rank are looked at, so ranking costs no more than the
+    ranking itself. ``next_expiry`` says when time alone will change the
+    ranking.
+    """
+
+    def __init__(self, rows=(), window=WINDOW, min_count=MIN_CANCELLATIONS, limit=LIMIT):
+        self.window = window
+        self.min_count = min_count
+        self.limit = limit
+        self.times = defaultdict(list)
+        self.candidates = set()
+        for customer_id, created_at in rows:
+            self.add(customer_id, created_at)
+
+    def add(self, customer_id, created_at):
+        times = self.times[customer_id]
+        insort(times, created_at)
+        if len(times) >= self.min_count:
+            self.candidates.add(customer_id)
+
+    def remove(self, customer_id, created_at):
+        times = self.times.get(customer_id)
+        if not times:
+            return
+        index = bisect_left(times, created_at)
+        if index < len(times) and times[index] == created_at:
+            del times[index]
+        self._settle(customer_id, times)
+
+    def _settle(self, customer_id, times):
+        if len(times) < self.min_count:
+            self.candidates.discard(customer_id)
+        if not times:
+            del self.times[customer_id]
+
+    def next_expiry(self):
+        """When the oldest ranked time leaves the window, or None"""
+        if not self.candidates:
+            return None
+        return min(self.times[customer_id][0] for customer_id in self.candidates) + self.window
+
+    def ranked(self, now):
+        """``(customer_id, cancellations, last_cancelled_at)`` as of ``now``"""
+        since = now - self.window
+        ranking = []
+        for customer_id in sorted(self.candidates):
+            times = self.times[customer_id]
+            del times[:bisect_left(times, since)]
+            self._settle(customer_id, times)
+            if len(times) >= self.min_count:
+                ranking.append((customer_id, len(times), times[-1]))
+        # Stable: ties keep the customer order, as in the query
+        ranking.sort(key=lambda row: (row[1], row[2]), reverse=True)
+        return ranking[:self.limit]
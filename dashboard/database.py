@@ -1,15 +1,17 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from typing import Generator
 import os
+import sys
 
 # Get the absolute path to the project root
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
 
-# Create database in project root
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(PROJECT_ROOT, 'dashboard.db')}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+from common.database import get_engine
+
+# Create database in project root (DASHBOARD_DATABASE_URL overrides it)
+engine = get_engine("dashboard", "dashboard.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
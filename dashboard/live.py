@@ -0,0 +1,177 @@
+"""Live dashboard state pushed to connected screens as a snapshot, then deltas.
+
+Each process keeps one copy of the state. It is loaded once and then kept
+current by folding in write events from the change feed, with a full
+reload every ``resync`` seconds and whenever the feed asks for one. At
+most every ``interval`` seconds the rendered state is diffed against what
+screens last saw, and only the changed fields go out, serialized once for
+every screen. Screens never query the database themselves.
+
+Each screen has a bounded queue. One that falls behind has its backlog
+replaced by a fresh snapshot instead of growing the queue.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Queue marker: send the current snapshot in place of the dropped backlog
+_SNAPSHOT = object()
+
+
+def diff(old, new):
+    """Fields of ``new`` that differ from ``old``, recursing into dicts.
+
+    Keys missing from ``new`` map to None; lists are compared whole.
+    """
+    changes = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(before, dict) and isinstance(value, dict):
+            nested = diff(before, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or before != value:
+            changes[key] = value
+    return changes
+
+
+class _Screen:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(queue_size)
+
+
+class LiveView:
+    """One process's live state and the screens subscribed to it.
+
+    ``load()`` runs in a thread and returns ``(state, seq)``, the state as of
+    change-log sequence ``seq``. ``apply(state, change)`` folds one change
+    into the state and returns False when a reload is needed instead.
+    ``render(state)`` returns the JSON-ready dict that screens receive.
+    ``expired(state)``, if given, is asked on every tick whether time alone
+    has changed what ``render`` returns.
+    """
+
+    def __init__(self, feed, load, apply, render, queue_size=64, interval=0.25, resync=300, heartbeat=15,
+                 expired=None):
+        self.feed = feed
+        self.load = load
+        self.apply = apply
+        self.render = render
+        self.expired = expired
+        self.queue_size = queue_size
+        self.interval = interval
+        self.resync = resync
+        self.heartbeat = heartbeat
+        self.screens = set()
+        self.version = 0
+        self.snapshot = None
+        self._state = None
+        self._dirty = False
+        self._snapshot_text = None
+        self._loop = None
+        self._ready = None
+        self._task = None
+
+    def _start(self, loop):
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._ready = asyncio.Event()
+            self.snapshot = None
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        ticker = loop.create_task(self._tick())
+        try:
+            while self.screens:
+                try:
+                    await self._follow(loop)
+                except Exception:
+                    # Screens keep their last state; try again shortly
+                    logger.exception("Live dashboard update failed")
+                    await asyncio.sleep(self.interval * 4)
+        finally:
+            ticker.cancel()
+
+    async def _follow(self, loop):
+        """Load the state, then fold in changes until a reload is due"""
+        self._state, seq = await loop.run_in_executor(None, self.load)
+        self._dirty = True
+        self._flush()
+        self._ready.set()
+        deadline = loop.time() + self.resync
+        async with contextlib.aclosing(self.feed.changes(seq)) as changes:
+            async for change in changes:
+                if not self.screens or loop.time() >= deadline:
+                    return
+                if change is None:
+                    continue
+                if not self.apply(self._state, change):
+                    return
+                self._dirty = True
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.expired is not None and self._state is not None and self.expired(self._state):
+                self._dirty = True
+            self._flush()
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        rendered = self.render(self._state)
+        changes = diff(self.snapshot, rendered) if self.snapshot is not None else None
+        if changes == {}:
+            return
+        self.snapshot = rendered
+        self._snapshot_text = None
+        if changes is None:
+            return
+        self.version += 1
+        message = (self.version, "delta", json.dumps(changes))
+        for screen in self.screens:
+            try:
+                screen.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not screen.queue.empty():
+                    screen.queue.get_nowait()
+                screen.queue.put_nowait(_SNAPSHOT)
+
+    def _snapshot_message(self):
+        if self._snapshot_text is None:
+            self._snapshot_text = json.dumps(self.snapshot)
+        return self.version, "snapshot", self._snapshot_text
+
+    async def updates(self):
+        """``(version, kind, data)`` messages: a snapshot, then deltas.
+
+        ``data`` is JSON text. A delta holds only the fields that changed;
+        None removes a field. Yields None as a heartbeat while idle.
+        """
+        loop = asyncio.get_running_loop()
+        screen = _Screen(self.queue_size)
+        self.screens.add(screen)
+        self._start(loop)
+        try:
+            await self._ready.wait()
+            version, kind, data = self._snapshot_message()
+            yield version, kind, data
+            while True:
+                try:
+                    message = await asyncio.wait_for(screen.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if message is _SNAPSHOT:
+                    version, kind, data = self._snapshot_message()
+                    yield version, kind, data
+                elif message[0] > version:
+                    version = message[0]
+                    yield message
+        finally:
+            self.screens.discard(screen)
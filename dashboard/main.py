@@ -1,25 +1,36 @@
 from ast import Str
 import sys
 import os
-from fastapi import FastAPI, HTTPException, status, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, status, Depends, Response, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Optional, Dict, Any
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, func, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Float, func, Boolean, JSON, Index, and_, inspect, or_, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from enum import Enum
 from sqlalchemy.exc import SQLAlchemyError
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Initialize database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./dashboard.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+from common.changes import table_versions, track_changes
+from common.database import create_schema, get_engine
+from common.feed import ChangeFeed, latest_seq, log_changes, log_table, track_events
+from dashboard.aggregates import BookingSummary
+from dashboard.cancellers import CancellerWindow, as_dicts, cancellations_query, repeat_cancellers_query
+from dashboard.live import LiveView
+from dashboard.report_engine import build_report, count_rows, report_key, validate_filters
+from dashboard.rollups import Rollups
+
+# Initialize database (DASHBOARD_DATABASE_URL overrides the default file)
+engine = get_engine("dashboard", "dashboard.db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+track_changes(SessionLocal)
 Base = declarative_base()
 
 # Create FastAPI app
@@ -45,6 +56,19 @@ class Booking(Base):
     amount = Column(Float)
     reason = Column(String, nullable=True)
 
+    __table_args__ = (
+        # Finds the rows past the rollup watermark (the open hour)
+        Index("ix_bookings_created_at", "created_at"),
+        # Covers the repeat-canceller ranking. Partial, so it holds only
+        # cancellations and the overview aggregate keeps ix_bookings_created_at
+        Index("ix_bookings_cancellations", "created_at", "customer_id", "status",
+              sqlite_where=text("status = 'cancelled'")),
+    )
+
+# Hourly and daily totals, kept in step with ORM writes to bookings
+rollups = Rollups(Base.metadata, Booking.__table__)
+rollups.track(SessionLocal, Booking)
+
 class AgentActivity(Base):
     __tablename__ = "agent_activity"
     id = Column(Integer, primary_key=True, index=True)
@@ -62,6 +86,37 @@ class Alert(Base):
     severity = Column(Integer)  # 1-5, 5 being most severe
     resolved = Column(Boolean, default=False)
 
+# Change feed: booking and alert writes are logged as they commit and
+# folded into the live dashboard state by one reader per process
+log_table(Base.metadata)
+feed = ChangeFeed(
+    engine,
+    replay_size=int(os.getenv("CHANGE_FEED_REPLAY", 1000)),
+    queue_size=int(os.getenv("CHANGE_FEED_QUEUE", 1000)),
+)
+
+def describe_change(obj, created):
+    if isinstance(obj, Booking):
+        kind = "booking.created" if created else "booking.updated"
+    elif isinstance(obj, Alert):
+        kind = "alert.created" if created else "alert.updated"
+    else:
+        return None
+    data = {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+    if isinstance(obj, Booking) and not created:
+        # Old values of the changed columns, to take the booking out of the totals
+        attrs = inspect(obj).attrs
+        data["previous"] = {key: attrs[key].history.deleted[0] for key in list(data) if attrs[key].history.deleted}
+    return kind, data
+
+track_events(SessionLocal, describe_change, on_commit=feed.notify)
+
+class ReportStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
 # Add custom report model
 class CustomReportModel(Base):
     __tablename__ = "custom_reports"
@@ -70,10 +125,17 @@ class CustomReportModel(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     metrics = Column(String)  # JSON string of metrics
     filters = Column(String)  # JSON string of filters
-    data = Column(String)  # JSON string of report data
+    data = Column(String)  # JSON string of report data, one list per metric
+    status = Column(String, nullable=False, default=ReportStatus.pending.value, server_default=ReportStatus.done.value)
+    error = Column(String)
+    completed_at = Column(DateTime)
+    # Digest of the parameters and the bookings/activity change counters the
+    # data was computed from, to reuse the report while both still match
+    params_key = Column(String, index=True)
+    source_version = Column(String)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create tables, and indexes added since an existing file was created
+create_schema(Base.metadata, engine)
 
 def get_db():
     db = SessionLocal()
@@ -129,12 +191,34 @@ class DashboardOverview(BaseModel):
     chat_stats: ChatStats
     alerts: List[AlertResponse]
 
+class SeriesGrain(str, Enum):
+    hour = "hour"
+    day = "day"
+
+class BookingSeriesPoint(BaseModel):
+    bucket: datetime
+    total: int
+    amount: float
+    avg_response_time: float
+
+class ReportMetric(str, Enum):
+    bookings = "bookings"
+    cancellations = "cancellations"
+    workers = "workers"
+    chat = "chat"
+    revenue = "revenue"
+
+class ReportGrouping(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
 class CustomReportParams(BaseModel):
-    start_date: str
-    end_date: str
-    metrics: List[str]  # Available metrics: bookings, cancellations, workers, chat, revenue
-    group_by: str  # day, week, month
-    filters: Optional[Dict[str, Any]] = None
+    start_date: date
+    end_date: date
+    metrics: List[ReportMetric]
+    group_by: ReportGrouping
+    filters: Optional[Dict[str, Any]] = None  # status, service_type, agent_id, customer_id, reason
 
 class CustomReportResponse(BaseModel):
     id: int
@@ -143,53 +227,70 @@ class CustomReportResponse(BaseModel):
     metrics: List[str]
     filters: Dict[str, Any]
     data: Dict[str, Any]
+    status: ReportStatus = ReportStatus.done
+    error: Optional[str] = None
+
+def get_booking_summary(db: Session = Depends(get_db)):
+    """Booking totals from the daily rollups plus the open hour's raw rows;
+    FastAPI caches it per request, so every section of a response reads the
+    same numbers"""
+    try:
+        rollups.fold(engine)
+        return BookingSummary(db.execute(rollups.summary_query(datetime.utcnow().date())))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+# Customers with REPEAT_CANCEL_MIN cancellations in the window are listed
+REPEAT_CANCEL_WINDOW = timedelta(days=int(os.getenv("DASHBOARD_REPEAT_CANCEL_DAYS", 30)))
+REPEAT_CANCEL_MIN = int(os.getenv("DASHBOARD_REPEAT_CANCEL_MIN", 3))
+REPEAT_CANCEL_LIMIT = int(os.getenv("DASHBOARD_REPEAT_CANCEL_LIMIT", 10))
+
+def get_repeat_cancellers(db: Session = Depends(get_db)):
+    """Ranked ``(customer_id, cancellations, last_cancelled_at)`` rows"""
+    try:
+        return db.execute(repeat_cancellers_query(
+            Booking.__table__, datetime.utcnow() - REPEAT_CANCEL_WINDOW, REPEAT_CANCEL_MIN, REPEAT_CANCEL_LIMIT
+        )).all()
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+def booking_stats(summary: BookingSummary):
+    return BookingStats(
+        total=summary.total,
+        confirmed=summary.count(BookingStatus.confirmed),
+        cancelled=summary.count(BookingStatus.cancelled),
+        standby=summary.count(BookingStatus.standby),
+        pending=summary.count(BookingStatus.pending),
+        completed=summary.count(BookingStatus.completed),
+        avg_response_time=summary.avg_response_time,
+        revenue=summary.revenue
+    )
+
+def cancellation_stats(summary: BookingSummary, repeat_cancellers):
+    return CancellationStats(
+        total=summary.count(BookingStatus.cancelled),
+        today=summary.today_cancellations,
+        reasons=dict(summary.reasons),
+        repeat_cancellers=as_dicts(repeat_cancellers)
+    )
+
+def worker_stats(summary: BookingSummary):
+    return WorkerStats(
+        total_workers=summary.total_agents,
+        available=0,  # TODO: Implement availability logic
+        standby=0,  # TODO: Implement standby logic
+        busy=0,  # TODO: Implement busy status logic
+        top_performers=[
+            {'agent_id': agent_id, 'booking_count': booking_count}
+            for agent_id, booking_count in summary.top_agents()
+        ]
+    )
 
 @app.get("/dashboard/overview", response_model=DashboardOverview)
-async def get_dashboard_overview(db: Session = Depends(get_db)):
+def get_dashboard_overview(db: Session = Depends(get_db), summary: BookingSummary = Depends(get_booking_summary),
+                           repeat_cancellers=Depends(get_repeat_cancellers)):
     """Get comprehensive dashboard overview with all metrics"""
     try:
-        # Get today's date
-        today = datetime.utcnow().date()
-        
-        # Query booking stats
-        total_bookings = db.query(func.count(Booking.id)).scalar() or 0
-        confirmed_bookings = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.confirmed).scalar() or 0
-        cancelled_bookings = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.cancelled).scalar() or 0
-        standby_bookings = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.standby).scalar() or 0
-        pending_bookings = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.pending).scalar() or 0
-        completed_bookings = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.completed).scalar() or 0
-        avg_response_time = db.query(func.avg(Booking.response_time)).scalar() or 0
-        total_revenue = db.query(func.sum(Booking.amount)).filter(Booking.status == BookingStatus.confirmed).scalar() or 0
-        
-        # Query cancellation stats
-        today_cancellations = db.query(func.count(Booking.id)).filter(
-            Booking.status == BookingStatus.cancelled,
-            func.date(Booking.created_at) == today
-        ).scalar() or 0
-        
-        # Get cancellation reasons
-        reasons_query = db.query(Booking.reason, func.count(Booking.id)).\
-            filter(Booking.status == BookingStatus.cancelled, Booking.reason.isnot(None)).\
-            group_by(Booking.reason).all()
-        reasons = {reason: count for reason, count in reasons_query}
-        
-        # Query worker stats
-        total_workers = db.query(func.count(func.distinct(Booking.agent_id))).scalar() or 0
-        
-        # Get top performers
-        top_performers_query = db.query(
-            Booking.agent_id,
-            func.count(Booking.id).label('booking_count')
-        ).group_by(Booking.agent_id).order_by(func.count(Booking.id).desc()).limit(5).all()
-        
-        top_performers = [
-            {
-                'agent_id': agent_id,
-                'booking_count': booking_count
-            }
-            for agent_id, booking_count in top_performers_query
-        ]
-        
         # Query alerts
         active_alerts_query = db.query(Alert).filter(Alert.resolved == False).all()
         active_alerts = [
@@ -206,29 +307,9 @@ async def get_dashboard_overview(db: Session = Depends(get_db)):
         
         return DashboardOverview(
             timestamp=datetime.utcnow(),
-            booking_stats=BookingStats(
-                total=total_bookings,
-                confirmed=confirmed_bookings,
-                cancelled=cancelled_bookings,
-                standby=standby_bookings,
-                pending=pending_bookings,
-                completed=completed_bookings,
-                avg_response_time=avg_response_time,
-                revenue=total_revenue
-            ),
-            cancellation_stats=CancellationStats(
-                total=cancelled_bookings,
-                today=today_cancellations,
-                reasons=reasons,
-                repeat_cancellers=[]  # TODO: Implement repeat canceller logic
-            ),
-            worker_stats=WorkerStats(
-                total_workers=total_workers,
-                available=0,  # TODO: Implement availability logic
-                standby=0,  # TODO: Implement standby logic
-                busy=0,  # TODO: Implement busy status logic
-                top_performers=top_performers
-            ),
+            booking_stats=booking_stats(summary),
+            cancellation_stats=cancellation_stats(summary, repeat_cancellers),
+            worker_stats=worker_stats(summary),
             chat_stats=ChatStats(
                 total_messages=0,  # TODO: Implement chat integration
                 unread_messages=0,  # TODO: Implement chat integration
@@ -249,59 +330,118 @@ async def get_dashboard_overview(db: Session = Depends(get_db)):
             detail=f"Error fetching dashboard overview: {str(e)}"
         )
 
-@app.post("/dashboard/reports", response_model=CustomReportResponse)
-async def create_custom_report(params: CustomReportParams, db: Session = Depends(get_db)):
-    """Create a custom report with specified metrics and filters"""
+# Reports over more bookings than this run in the background
+REPORT_INLINE_ROWS = int(os.getenv("DASHBOARD_REPORT_INLINE_ROWS", 100000))
+# A pending or running job older than this is presumed lost with its worker
+REPORT_JOB_TIMEOUT = timedelta(minutes=int(os.getenv("DASHBOARD_REPORT_JOB_TIMEOUT_MINUTES", 15)))
+report_jobs = ThreadPoolExecutor(max_workers=int(os.getenv("DASHBOARD_REPORT_WORKERS", 2)),
+                                 thread_name_prefix="dashboard-report")
+
+def report_response(report: CustomReportModel):
+    return CustomReportResponse(
+        id=report.id,
+        title=report.title,
+        created_at=report.created_at,
+        metrics=json.loads(report.metrics),
+        filters=json.loads(report.filters),
+        data=json.loads(report.data),
+        status=report.status,
+        error=report.error
+    )
+
+def run_report(report_id: int, params: CustomReportParams):
+    """Compute a stored report's data and mark it done (or failed)"""
+    db = SessionLocal()
     try:
-        # Create new report
-        new_report = CustomReportModel(
-            title=f"Custom Report - {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
-            metrics=json.dumps(params.metrics),
-            filters=json.dumps(params.filters or {}),
-            data=json.dumps({})  # TODO: Generate actual report data
-        )
-        
-        db.add(new_report)
+        report = db.get(CustomReportModel, report_id)
+        report.status = ReportStatus.running.value
         db.commit()
-        db.refresh(new_report)
-        
-        return CustomReportResponse(
-            id=new_report.id,
-            title=new_report.title,
-            created_at=new_report.created_at,
-            metrics=json.loads(new_report.metrics),
-            filters=json.loads(new_report.filters),
-            data=json.loads(new_report.data)
-        )
+        try:
+            data = build_report(
+                db.connection(), Booking.__table__, AgentActivity.__table__,
+                params.start_date, params.end_date, [metric.value for metric in params.metrics],
+                params.group_by.value, params.filters
+            )
+            db.rollback()  # end the read transaction before writing the result
+            report.data = json.dumps(data, separators=(",", ":"))
+            report.status = ReportStatus.done.value
+        except Exception as e:
+            db.rollback()
+            report.status, report.error = ReportStatus.failed.value, str(e)
+        report.completed_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+@app.post("/dashboard/reports", response_model=CustomReportResponse)
+def create_custom_report(params: CustomReportParams, response: Response, db: Session = Depends(get_db)):
+    """Create a custom report with specified metrics and filters.
+
+    Reports over up to REPORT_INLINE_ROWS bookings are computed before
+    responding; larger ones answer 202 with a pending report to poll at
+    GET /dashboard/reports/{id}. An identical request reuses the report
+    still being computed, or the finished one while bookings and agent
+    activity are unchanged.
+    """
+    filters = params.filters or {}
+    if params.end_date < params.start_date:
+        raise HTTPException(status_code=422, detail="end_date must not be before start_date")
+    try:
+        validate_filters(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    metrics = [metric.value for metric in params.metrics]
+    key = report_key(params.start_date, params.end_date, metrics, params.group_by.value, filters)
+    try:
+        # Read before computing, so writes made meanwhile invalidate the
+        # result; the epoch is dropped as reports live in the same file
+        version = json.dumps(table_versions(db, ["bookings", "agent_activity"])[1:])
+        report = db.query(CustomReportModel).filter(
+            CustomReportModel.params_key == key,
+            or_(
+                and_(CustomReportModel.status == ReportStatus.done.value,
+                     CustomReportModel.source_version == version),
+                and_(CustomReportModel.status.in_([ReportStatus.pending.value, ReportStatus.running.value]),
+                     CustomReportModel.created_at > datetime.utcnow() - REPORT_JOB_TIMEOUT),
+            )
+        ).order_by(CustomReportModel.id.desc()).first()
+        if report is None:
+            report = CustomReportModel(
+                title=f"Custom Report - {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
+                metrics=json.dumps(metrics),
+                filters=json.dumps(filters),
+                data=json.dumps({}),
+                params_key=key,
+                source_version=version
+            )
+            db.add(report)
+            db.commit()
+            if count_rows(db.connection(), Booking.__table__, params.start_date, params.end_date) <= REPORT_INLINE_ROWS:
+                db.rollback()
+                run_report(report.id, params)
+            else:
+                report_jobs.submit(run_report, report.id, params)
+            db.expire_all()
+        if report.status in (ReportStatus.pending.value, ReportStatus.running.value):
+            response.status_code = status.HTTP_202_ACCEPTED
+        return report_response(report)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating report: {str(e)}")
 
 @app.get("/dashboard/reports/{report_id}", response_model=CustomReportResponse)
-async def get_custom_report(report_id: int, db: Session = Depends(get_db)):
-    """Get a specific custom report"""
+def get_custom_report(report_id: int, db: Session = Depends(get_db)):
+    """Get a specific custom report; data is filled in once status is done"""
     try:
         report = db.query(CustomReportModel).filter(CustomReportModel.id == report_id).first()
-        if not report:
-            raise HTTPException(status_code=404, detail="Report not found")
-        
-        return CustomReportResponse(
-            id=report.id,
-            title=report.title,
-            created_at=report.created_at,
-            metrics=json.loads(report.metrics),
-            filters=json.loads(report.filters),
-            data=json.loads(report.data)
-        )
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching report: {str(e)}")
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report_response(report)
 
 @app.get("/dashboard/alerts", response_model=List[AlertResponse])
-async def get_alerts(db: Session = Depends(get_db)):
+def get_alerts(db: Session = Depends(get_db)):
     """Get all active alerts"""
     try:
         alerts = db.query(Alert).filter(Alert.resolved == False).order_by(
@@ -323,7 +463,7 @@ async def get_alerts(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/dashboard/alerts/{alert_id}/resolve")
-async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
+def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
     """Resolve an alert"""
     try:
         alert = db.query(Alert).filter(Alert.id == alert_id).first()
@@ -338,86 +478,56 @@ async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/dashboard/metrics/bookings", response_model=BookingStats)
-async def get_booking_metrics(db: Session = Depends(get_db)):
+def get_booking_metrics(summary: BookingSummary = Depends(get_booking_summary)):
     """Get detailed booking metrics"""
+    return booking_stats(summary)
+
+@app.get("/dashboard/metrics/bookings/series", response_model=List[BookingSeriesPoint])
+def get_booking_series(
+    grain: SeriesGrain = SeriesGrain.hour,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[BookingStatus] = None,
+    service_type: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Bookings per hour or day, from the bucket holding start to the one
+    holding end (by default the last 24 hours or 30 days up to now); only the
+    open hour is read from raw rows"""
+    now = datetime.utcnow()
+    end = end or now
+    start = start or end - (timedelta(hours=23) if grain == SeriesGrain.hour else timedelta(days=29))
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
     try:
-        total = db.query(func.count(Booking.id)).scalar() or 0
-        confirmed = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.confirmed).scalar() or 0
-        cancelled = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.cancelled).scalar() or 0
-        standby = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.standby).scalar() or 0
-        pending = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.pending).scalar() or 0
-        completed = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.completed).scalar() or 0
-        avg_response_time = db.query(func.avg(Booking.response_time)).scalar() or 0
-        revenue = db.query(func.sum(Booking.amount)).filter(Booking.status == BookingStatus.confirmed).scalar() or 0
-        
-        return BookingStats(
-            total=total,
-            confirmed=confirmed,
-            cancelled=cancelled,
-            standby=standby,
-            pending=pending,
-            completed=completed,
-            avg_response_time=avg_response_time,
-            revenue=revenue
-        )
+        rollups.fold(engine, now)
+        rows = db.execute(rollups.series_query(
+            grain.value, start, end,
+            status=status.value if status else None, service_type=service_type, agent_id=agent_id,
+        ))
+        return [
+            BookingSeriesPoint(
+                bucket=datetime.fromisoformat(bucket),
+                total=count,
+                amount=amount,
+                avg_response_time=response_sum / response_count if response_count else 0,
+            )
+            for bucket, count, amount, response_sum, response_count in rows
+        ]
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/dashboard/metrics/cancellations", response_model=CancellationStats)
-async def get_cancellation_metrics(db: Session = Depends(get_db)):
+def get_cancellation_metrics(summary: BookingSummary = Depends(get_booking_summary),
+                             repeat_cancellers=Depends(get_repeat_cancellers)):
     """Get detailed cancellation metrics"""
-    try:
-        total = db.query(func.count(Booking.id)).filter(Booking.status == BookingStatus.cancelled).scalar() or 0
-        today = datetime.utcnow().date()
-        today_cancellations = db.query(func.count(Booking.id)).filter(
-            Booking.status == BookingStatus.cancelled,
-            func.date(Booking.created_at) == today
-        ).scalar() or 0
-        
-        # Get reasons distribution
-        reasons_query = db.query(Booking.reason, func.count(Booking.id)).\
-            filter(Booking.status == BookingStatus.cancelled, Booking.reason.isnot(None)).\
-            group_by(Booking.reason).all()
-        reasons = {reason: count for reason, count in reasons_query}
-        
-        return CancellationStats(
-            total=total,
-            today=today_cancellations,
-            reasons=reasons,
-            repeat_cancellers=[]  # TODO: Implement repeat canceller logic
-        )
-    except SQLAlchemyError as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return cancellation_stats(summary, repeat_cancellers)
 
 @app.get("/dashboard/metrics/workers", response_model=WorkerStats)
-async def get_worker_metrics(db: Session = Depends(get_db)):
+def get_worker_metrics(summary: BookingSummary = Depends(get_booking_summary)):
     """Get detailed worker metrics"""
-    try:
-        total_workers = db.query(func.count(func.distinct(Booking.agent_id))).scalar() or 0
-        
-        # Get top performers
-        top_performers_query = db.query(
-            Booking.agent_id,
-            func.count(Booking.id).label('booking_count')
-        ).group_by(Booking.agent_id).order_by(func.count(Booking.id).desc()).limit(5).all()
-        
-        top_performers = [
-            {
-                'agent_id': agent_id,
-                'booking_count': booking_count
-            }
-            for agent_id, booking_count in top_performers_query
-        ]
-        
-        return WorkerStats(
-            total_workers=total_workers,
-            available=0,  # TODO: Implement availability logic
-            standby=0,
-            busy=0,
-            top_performers=top_performers
-        )
-    except SQLAlchemyError as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return worker_stats(summary)
 
 @app.get("/dashboard/metrics/chat", response_model=ChatStats)
 async def get_chat_metrics():
@@ -431,6 +541,147 @@ async def get_chat_metrics():
         top_agents=[]
     )
 
+class LiveOverviewState:
+    """Booking totals, repeat cancellers and active alerts, kept current from
+    the change feed"""
+
+    def __init__(self, summary: BookingSummary, cancellers: CancellerWindow,
+                 alerts: Dict[int, Dict[str, Any]], today: date):
+        self.summary = summary
+        self.cancellers = cancellers
+        self.alerts = alerts
+        self.today = today
+
+def alert_payload(values: Dict[str, Any]) -> Dict[str, Any]:
+    return AlertResponse(**{field: values[field] for field in AlertResponse.model_fields}).model_dump(mode="json")
+
+def load_live_overview():
+    rollups.fold(engine)
+    db = SessionLocal()
+    try:
+        today = datetime.utcnow().date()
+        # pysqlite runs each SELECT in its own snapshot unless a transaction
+        # is open: one read transaction keeps the sequence and totals in step
+        db.connection().exec_driver_sql("BEGIN")
+        seq = latest_seq(db.connection())
+        summary = BookingSummary(db.execute(rollups.summary_query(today)))
+        cancellers = CancellerWindow(
+            db.execute(cancellations_query(Booking.__table__, datetime.utcnow() - REPEAT_CANCEL_WINDOW)),
+            REPEAT_CANCEL_WINDOW, REPEAT_CANCEL_MIN, REPEAT_CANCEL_LIMIT,
+        )
+        alerts = {
+            alert.id: alert_payload(vars(alert))
+            for alert in db.query(Alert).filter(Alert.resolved == False)
+        }
+        return LiveOverviewState(summary, cancellers, alerts, today), seq
+    finally:
+        db.close()
+
+def booking_row(values: Dict[str, Any], today: date, sign: int):
+    """A booking change event as a signed ``summary_query`` row"""
+    created_at = values.get("created_at")
+    response_time = values.get("response_time")
+    created_today = created_at is not None and datetime.fromisoformat(created_at).date() == today
+    return (
+        values.get("status"), values.get("reason"), values.get("agent_id"), sign,
+        sign * (response_time or 0), sign * (response_time is not None),
+        sign * (values.get("amount") or 0), sign * created_today,
+    )
+
+def add_live_booking(state: LiveOverviewState, values: Dict[str, Any], sign: int):
+    state.summary.add(booking_row(values, state.today, sign))
+    if values.get("status") == BookingStatus.cancelled and values.get("customer_id") is not None:
+        created_at = datetime.fromisoformat(values["created_at"])
+        if sign > 0:
+            state.cancellers.add(values["customer_id"], created_at)
+        else:
+            state.cancellers.remove(values["customer_id"], created_at)
+
+def apply_live_change(state: LiveOverviewState, change) -> bool:
+    # Reload on a reset, and at midnight for today's cancellations
+    if change.type in ("reset", "dashboard.reset") or datetime.utcnow().date() != state.today:
+        return False
+    data = json.loads(change.data)
+    if change.type == "booking.created":
+        add_live_booking(state, data, 1)
+    elif change.type == "booking.updated":
+        previous = data.pop("previous", {})
+        add_live_booking(state, {**data, **previous}, -1)
+        add_live_booking(state, data, 1)
+    elif change.type in ("alert.created", "alert.updated"):
+        if data["resolved"]:
+            state.alerts.pop(data["id"], None)
+        else:
+            state.alerts[data["id"]] = alert_payload(data)
+    return True
+
+def render_live_overview(state: LiveOverviewState) -> Dict[str, Any]:
+    return {
+        "booking_stats": booking_stats(state.summary).model_dump(),
+        "cancellation_stats": cancellation_stats(
+            state.summary, state.cancellers.ranked(datetime.utcnow())).model_dump(mode="json"),
+        "worker_stats": worker_stats(state.summary).model_dump(),
+        # Keyed by id, so new and resolved alerts show up as single fields
+        "alerts": {str(alert_id): alert for alert_id, alert in state.alerts.items()},
+    }
+
+def live_overview_expired(state: LiveOverviewState) -> bool:
+    # A cancellation sliding out of the window re-ranks without any write
+    expiry = state.cancellers.next_expiry()
+    return expiry is not None and expiry <= datetime.utcnow()
+
+live = LiveView(
+    feed, load_live_overview, apply_live_change, render_live_overview,
+    expired=live_overview_expired,
+    queue_size=int(os.getenv("DASHBOARD_LIVE_QUEUE", 64)),
+    interval=float(os.getenv("DASHBOARD_LIVE_INTERVAL", 0.25)),
+)
+
+@app.get("/dashboard/live")
+async def stream_live_overview():
+    """Live overview as Server-Sent Events.
+
+    A ``snapshot`` event carries booking, cancellation and worker stats and
+    the active alerts keyed by id; each ``delta`` event then carries only
+    the fields that changed, with null for a removed one (a resolved
+    alert). Event ids are versions; a reconnect starts from a new snapshot.
+    """
+    async def events():
+        async for message in live.updates():
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                version, kind, data = message
+                yield f"id: {version}\nevent: {kind}\ndata: {data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/dashboard/live/ws")
+async def websocket_live_overview(websocket: WebSocket):
+    """The same updates over a WebSocket, one JSON message each"""
+    await websocket.accept()
+
+    async def forward():
+        async for message in live.updates():
+            if message is None:
+                await websocket.send_text('{"type": "keepalive"}')
+            else:
+                version, kind, data = message
+                await websocket.send_text(f'{{"type": "{kind}", "version": {version}, "data": {data}}}')
+
+    async def until_closed():
+        while True:
+            await websocket.receive_text()
+
+    # Whichever ends first (client gone, or the stream ended) ends both
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(until_closed())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if tasks[0] in done and tasks[0].exception() is None:
+        await websocket.close()
+
 def populate_test_data():
     """Populate database with test data"""
     db = SessionLocal()
@@ -439,6 +690,9 @@ def populate_test_data():
         db.query(Alert).delete()
         db.query(AgentActivity).delete()
         db.query(Booking).delete()
+        rollups.reset(db.connection())
+        # Bulk deletes bypass the feed hooks: live views reload instead
+        log_changes(db, [("dashboard.reset", {})])
         db.commit()
         
         # Create some test bookings
@@ -542,7 +796,7 @@ if __name__ == "__main__":
     import uvicorn
     
     # Create all tables
-    Base.metadata.create_all(bind=engine)
+    create_schema(Base.metadata, engine)
     
     # Populate test data
     populate_test_data()
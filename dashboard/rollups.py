@@ -0,0 +1,315 @@
+"""Hourly and daily rollups of the bookings table.
+
+Rollups hold counts, amount sums and response-time sums and counts per
+bucket and status, service type, agent and cancellation reason. They cover
+bookings created before a watermark, the start of the last closed hour;
+the first read after an hour closes folds that hour's raw rows in, and
+ORM writes to bookings behind the watermark (late or backdated rows,
+status changes, deletes) adjust the rollups in the same transaction.
+Readers combine the rollups with the raw rows of the current partial hour,
+so a poll never scans the full history.
+
+Run from the project root to rebuild every rollup from the raw rows:
+
+    python -m dashboard.rollups --backfill
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, String, Table, and_, case, event, func, inspect, literal_column, select, union_all,
+)
+from sqlalchemy.dialects.sqlite import insert
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.aggregates import summary_query
+
+# Dimension columns; NULL is stored as "" since key columns cannot be NULL
+DIMENSIONS = ("status", "reason", "agent_id", "service_type")
+MEASURES = ("count", "amount_sum", "response_sum", "response_count")
+
+BACKFILL_BATCH = timedelta(days=7)
+
+# Bucket keys, as SQLite's strftime() and datetime.strftime() both write them
+GRAINS = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d"}
+
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _dimension_columns():
+    return [Column(name, String, primary_key=True) for name in DIMENSIONS]
+
+
+def _measure_columns():
+    return [
+        Column("count", Integer, nullable=False),
+        Column("amount_sum", Float, nullable=False),
+        Column("response_sum", Float, nullable=False),
+        Column("response_count", Integer, nullable=False),
+    ]
+
+
+class Rollups:
+    """Hourly and daily rollup tables for ``bookings``, defined on ``metadata``."""
+
+    def __init__(self, metadata, bookings):
+        self.bookings = bookings
+        # Clustered by time, for series over a range of buckets
+        self.hourly = Table(
+            "booking_rollups_hourly", metadata,
+            Column("hour", String, primary_key=True), *_dimension_columns(), *_measure_columns(),
+            sqlite_with_rowid=False,
+        )
+        # Clustered by dimensions, so totals group in primary key order
+        self.daily = Table(
+            "booking_rollups_daily", metadata,
+            *_dimension_columns(), Column("day", String, primary_key=True), *_measure_columns(),
+            sqlite_with_rowid=False,
+        )
+        self.state = Table(
+            "booking_rollup_state", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("watermark", DateTime),
+        )
+        self.grains = {"hour": self.hourly, "day": self.daily}
+        # Last watermark this process saw; it only moves forward, so a stale
+        # value just means one more check on the next read
+        self._seen = None
+
+    def watermark(self, connection):
+        return connection.execute(select(self.state.c.watermark).where(self.state.c.id == 1)).scalar()
+
+    def _watermark_subquery(self):
+        return select(self.state.c.watermark).where(self.state.c.id == 1).scalar_subquery()
+
+    def _since_watermark(self):
+        """Raw rows the rollups do not cover yet (all of them before the first fold)"""
+        watermark = func.coalesce(self._watermark_subquery(), literal_column("''"))
+        return self.bookings.c.created_at >= watermark
+
+    def _set_watermark(self, connection, watermark):
+        statement = insert(self.state).values(id=1, watermark=watermark)
+        connection.execute(statement.on_conflict_do_update(index_elements=["id"], set_={"watermark": watermark}))
+
+    @staticmethod
+    def _merge(table, statement):
+        return statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={name: table.c[name] + statement.excluded[name] for name in MEASURES},
+        )
+
+    def _fold_rows(self, connection, where):
+        """Aggregate the raw rows matching ``where`` into both tables"""
+        bookings = self.bookings
+        keys = [func.coalesce(bookings.c[name], "").label(name) for name in DIMENSIONS]
+        measures = [
+            func.count().label("count"),
+            func.coalesce(func.sum(bookings.c.amount), 0.0).label("amount_sum"),
+            func.coalesce(func.sum(bookings.c.response_time), 0.0).label("response_sum"),
+            func.count(bookings.c.response_time).label("response_count"),
+        ]
+        for grain, table in self.grains.items():
+            bucket = func.strftime(GRAINS[grain], bookings.c.created_at).label(grain)
+            source = select(bucket, *keys, *measures).where(where).group_by(bucket, *keys)
+            statement = insert(table).from_select([grain, *DIMENSIONS, *MEASURES], source)
+            connection.execute(self._merge(table, statement))
+
+    def rebuild(self, connection, until, batch=BACKFILL_BATCH):
+        """Recompute every rollup from the bookings created before ``until``.
+
+        Reads the raw rows a time window of ``batch`` at a time through the
+        ``created_at`` index; windows hold whole days, so each is aggregated
+        by SQLite into buckets no other window touches, and memory stays flat
+        however large the table is. Runs in the caller's transaction.
+        """
+        for table in self.grains.values():
+            connection.execute(table.delete())
+        first = connection.execute(select(func.min(self.bookings.c.created_at))).scalar()
+        if first is not None:
+            window = datetime.combine(first.date(), datetime.min.time())
+            while window < until:
+                end = min(window + batch, until)
+                self._fold_rows(connection, and_(
+                    self.bookings.c.created_at >= window, self.bookings.c.created_at < end,
+                ))
+                window = end
+        self._set_watermark(connection, until)
+
+    def reset(self, connection):
+        """Drop every rollup, for writes that bypass the ORM (bulk deletes,
+        imports); readers fall back to the raw rows until the next fold
+        rebuilds them."""
+        for table in (*self.grains.values(), self.state):
+            connection.execute(table.delete())
+
+    def fold(self, engine, now=None):
+        """Fold the hours closed since the watermark into the rollups.
+
+        A no-op until the next hour closes. The watermark moves with a
+        conditional update in the folding transaction, so processes racing
+        to fold the same hour never count it twice.
+        """
+        until = hour_start(now or datetime.utcnow())
+        if self._seen is not None and self._seen >= until:
+            return
+        with engine.begin() as connection:
+            watermark = self.watermark(connection)
+            if watermark is None:
+                self.rebuild(connection, until)
+            elif watermark < until:
+                moved = connection.execute(
+                    self.state.update()
+                    .where(self.state.c.id == 1, self.state.c.watermark == watermark)
+                    .values(watermark=until)
+                ).rowcount
+                if moved:
+                    self._fold_rows(connection, and_(
+                        self.bookings.c.created_at >= watermark,
+                        self.bookings.c.created_at < until,
+                    ))
+        self._seen = until
+
+    def apply(self, connection, changes):
+        """Apply ``(values, sign)`` booking changes behind the watermark.
+
+        ``values`` maps booking columns to the row before (sign -1) or after
+        (sign +1) the change. Rows in the open hour are skipped; the fold
+        picks them up once the hour closes.
+        """
+        watermark = self.watermark(connection)
+        if watermark is None:
+            return
+        deltas = {grain: {} for grain in GRAINS}
+        for values, sign in changes:
+            created_at = values.get("created_at")
+            if created_at is None or created_at >= watermark:
+                continue
+            dimensions = tuple(values.get(name) or "" for name in DIMENSIONS)
+            response_time = values.get("response_time")
+            delta = (sign, sign * (values.get("amount") or 0.0), sign * (response_time or 0.0),
+                     sign if response_time is not None else 0)
+            for grain, buckets in deltas.items():
+                key = (created_at.strftime(GRAINS[grain]), dimensions)
+                buckets[key] = tuple(a + b for a, b in zip(buckets.get(key, (0, 0.0, 0.0, 0)), delta))
+        for grain, buckets in deltas.items():
+            if not buckets:
+                continue
+            table = self.grains[grain]
+            connection.execute(self._merge(table, insert(table)), [
+                {grain: bucket, **dict(zip(DIMENSIONS, dimensions)), **dict(zip(MEASURES, delta))}
+                for (bucket, dimensions), delta in buckets.items()
+            ])
+            connection.execute(table.delete().where(table.c["count"] <= 0))
+
+    def track(self, session_factory, model):
+        """Keep the rollups in step with ORM writes to ``model`` rows"""
+        columns = [column.key for column in self.bookings.columns]
+        # Record the old value of every change, loading it if the instance
+        # has expired, so updates can take the row out of its old groups
+        for name in columns:
+            event.listen(getattr(model, name), "set", lambda *args: None, active_history=True)
+
+        def current(obj):
+            return {name: getattr(obj, name) for name in columns}
+
+        def previous(obj):
+            attrs = inspect(obj).attrs
+            values = {}
+            for name in columns:
+                history = attrs[name].history
+                values[name] = history.deleted[0] if history.deleted else getattr(obj, name)
+            return values
+
+        def after_flush(session, flush_context):
+            changes = [(current(obj), 1) for obj in session.new if isinstance(obj, model)]
+            changes += [(previous(obj), -1) for obj in session.deleted if isinstance(obj, model)]
+            for obj in session.dirty:
+                if isinstance(obj, model) and session.is_modified(obj):
+                    changes += [(previous(obj), -1), (current(obj), 1)]
+            if changes:
+                self.apply(session.connection(), changes)
+
+        event.listen(session_factory, "after_flush", after_flush)
+
+    def summary_query(self, today):
+        """``summary_query`` over the daily rollups plus the raw rows past the
+        watermark, as one statement so both halves read the same snapshot"""
+        daily = self.daily
+        rolled = select(
+            func.nullif(daily.c.status, ""),
+            func.nullif(daily.c.reason, ""),
+            func.nullif(daily.c.agent_id, ""),
+            func.sum(daily.c["count"]),
+            func.sum(daily.c.response_sum),
+            func.sum(daily.c.response_count),
+            func.sum(daily.c.amount_sum),
+            func.sum(case((daily.c.day == today.strftime(GRAINS["day"]), daily.c["count"]), else_=0)),
+        ).group_by(daily.c.status, daily.c.reason, daily.c.agent_id)
+        return union_all(rolled, summary_query(self.bookings, today).where(self._since_watermark()))
+
+    def series_query(self, grain, start, end, **filters):
+        """Count, amount and response totals per ``grain`` bucket, from the
+        bucket holding ``start`` to the one holding ``end``, for bookings
+        matching the dimension ``filters``"""
+        table, pattern = self.grains[grain], GRAINS[grain]
+        bookings = self.bookings
+        raw_bucket = func.strftime(pattern, bookings.c.created_at)
+        rolled = select(
+            table.c[grain].label("bucket"),
+            table.c["count"], table.c.amount_sum, table.c.response_sum, table.c.response_count,
+        ).where(table.c[grain] >= start.strftime(pattern), table.c[grain] <= end.strftime(pattern))
+        raw = select(
+            raw_bucket.label("bucket"),
+            func.count(), func.coalesce(func.sum(bookings.c.amount), 0.0),
+            func.coalesce(func.sum(bookings.c.response_time), 0.0), func.count(bookings.c.response_time),
+        ).where(
+            self._since_watermark(), raw_bucket >= start.strftime(pattern), raw_bucket <= end.strftime(pattern)
+        ).group_by(raw_bucket)
+        for name, value in filters.items():
+            if value is not None:
+                rolled = rolled.where(table.c[name] == value)
+                raw = raw.where(bookings.c[name] == value)
+        rows = union_all(rolled, raw).subquery()
+        return select(
+            rows.c.bucket,
+            func.sum(rows.c["count"]),
+            func.sum(rows.c.amount_sum),
+            func.sum(rows.c.response_sum),
+            func.sum(rows.c.response_count),
+        ).group_by(rows.c.bucket).order_by(rows.c.bucket)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backfill", action="store_true", help="rebuild every rollup from the raw rows")
+    parser.add_argument("--batch-days", type=int, default=BACKFILL_BATCH.days, help="days of raw rows per batch")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do; pass --backfill")
+
+    from dashboard import main as dashboard
+
+    started = time.perf_counter()
+    until = hour_start(datetime.utcnow())
+    with dashboard.engine.begin() as connection:
+        dashboard.rollups.rebuild(connection, until, timedelta(days=args.batch_days))
+        hourly = connection.execute(select(func.count()).select_from(dashboard.rollups.hourly)).scalar()
+        daily = connection.execute(select(func.count()).select_from(dashboard.rollups.daily)).scalar()
+    print(json.dumps({
+        "watermark": until.isoformat(),
+        "hourly_rows": hourly,
+        "daily_rows": daily,
+        "seconds": round(time.perf_counter() - started, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
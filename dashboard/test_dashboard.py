@@ -1,11 +1,493 @@
+import asyncio
 import os
 import sys
 import json
 import requests
+import tempfile
 import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
 
 # Add current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the service at a scratch database before it is imported
+DATA_DIR = tempfile.mkdtemp()
+os.environ["DASHBOARD_DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'dashboard.db')}"
+
+from dashboard import main as dashboard
+from dashboard.bench_dashboard import legacy_overview
+from dashboard.cancellers import CancellerWindow, cancellations_query, repeat_cancellers_query
+from dashboard.live import LiveView, diff
+
+
+class TestOverviewAggregate(unittest.TestCase):
+    def setUp(self):
+        dashboard.Base.metadata.drop_all(bind=dashboard.engine)
+        dashboard.create_schema(dashboard.Base.metadata, dashboard.engine)
+        dashboard.rollups._seen = None
+        now = datetime.utcnow()
+        rows = [
+            ("confirmed", "agent1", None, 100.0, 10.0, now),
+            ("confirmed", "agent1", None, 50.0, None, now - timedelta(days=3)),
+            ("cancelled", "agent2", "sick", 80.0, 30.0, now),
+            ("cancelled", "agent2", "sick", 20.0, 20.0, now - timedelta(days=1)),
+            ("cancelled", "agent3", None, 10.0, 5.0, now),
+            ("pending", None, None, 5.0, 1.0, now),
+        ]
+        with dashboard.engine.begin() as connection:
+            connection.execute(dashboard.Booking.__table__.insert(), [
+                {"status": status, "agent_id": agent_id, "reason": reason, "amount": amount,
+                 "response_time": response_time, "created_at": created_at}
+                for status, agent_id, reason, amount, response_time, created_at in rows
+            ])
+        self.client = TestClient(dashboard.app)
+
+    def test_matches_separate_queries(self):
+        db = dashboard.SessionLocal()
+        try:
+            expected = legacy_overview(dashboard, db)
+        finally:
+            db.close()
+        stats = self.client.get("/dashboard/overview").json()
+        bookings, cancellations, workers = stats["booking_stats"], stats["cancellation_stats"], stats["worker_stats"]
+        for status in dashboard.BookingStatus:
+            self.assertEqual(bookings[status.value], expected[status.value])
+        self.assertEqual(bookings["total"], expected["total"])
+        self.assertAlmostEqual(bookings["avg_response_time"], expected["avg_response_time"])
+        self.assertAlmostEqual(bookings["revenue"], expected["revenue"])
+        self.assertEqual(cancellations["today"], expected["today"])
+        self.assertEqual(cancellations["reasons"], expected["reasons"])
+        self.assertEqual(workers["total_workers"], expected["total_workers"])
+        self.assertEqual(workers["top_performers"][0], {"agent_id": "agent1", "booking_count": 2})
+        self.assertEqual(self.client.get("/dashboard/metrics/bookings").json(), bookings)
+
+    def test_one_aggregate_query_per_request(self):
+        # The first read builds the rollups
+        self.client.get("/dashboard/overview").raise_for_status()
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(dashboard.engine, "before_cursor_execute", listener)
+        try:
+            self.client.get("/dashboard/overview").raise_for_status()
+        finally:
+            event.remove(dashboard.engine, "before_cursor_execute", listener)
+        reads = [sql for sql in statements if "FROM bookings" in sql]
+        # The booking aggregate, and the repeat-canceller ranking
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(len([sql for sql in reads if "GROUP BY bookings.customer_id" in sql]), 1)
+
+    def test_aggregate_reads_rollups_and_open_hour(self):
+        query = dashboard.rollups.summary_query(datetime.utcnow().date())
+        sql = str(query.compile(dashboard.engine, compile_kwargs={"literal_binds": True}))
+        with dashboard.engine.connect() as connection:
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        self.assertIn("SCAN booking_rollups_daily", plan)
+        self.assertIn("SEARCH bookings USING INDEX ix_bookings_created_at (created_at>?)", plan)
+        self.assertEqual(len([step for step in plan if "TEMP B-TREE" in step]), 1)
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        dashboard.Base.metadata.drop_all(bind=dashboard.engine)
+        dashboard.create_schema(dashboard.Base.metadata, dashboard.engine)
+        dashboard.rollups._seen = None
+        self.now = datetime.utcnow()
+        with dashboard.engine.begin() as connection:
+            connection.execute(dashboard.Booking.__table__.insert(), [
+                {"status": status, "agent_id": f"agent{i % 3}", "service_type": ("hotel", "car")[i % 2],
+                 "reason": "sick" if status == "cancelled" else None, "amount": 10.0 * i,
+                 "response_time": None if i % 4 == 0 else float(i),
+                 "created_at": self.now - timedelta(hours=i * 5)}
+                for i, status in enumerate(["confirmed", "cancelled", "pending", "completed"] * 5)
+            ])
+        dashboard.rollups.fold(dashboard.engine, self.now)
+        self.client = TestClient(dashboard.app)
+
+    def assertMatchesRawRows(self):
+        db = dashboard.SessionLocal()
+        try:
+            expected = legacy_overview(dashboard, db)
+        finally:
+            db.close()
+        stats = self.client.get("/dashboard/overview").json()
+        bookings, cancellations = stats["booking_stats"], stats["cancellation_stats"]
+        for status in dashboard.BookingStatus:
+            self.assertEqual(bookings[status.value], expected[status.value])
+        self.assertAlmostEqual(bookings["avg_response_time"], expected["avg_response_time"])
+        self.assertAlmostEqual(bookings["revenue"], expected["revenue"])
+        self.assertEqual(cancellations["today"], expected["today"])
+        self.assertEqual(cancellations["reasons"], expected["reasons"])
+        self.assertEqual(stats["worker_stats"]["total_workers"], expected["total_workers"])
+
+    def rollup_rows(self, table):
+        with dashboard.engine.connect() as connection:
+            return sorted(
+                tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                for row in connection.execute(table.select())
+            )
+
+    def test_writes_and_folds_stay_exact(self):
+        db = dashboard.SessionLocal()
+        try:
+            # Behind the watermark: a status change, a delete and a backdated row
+            old = db.query(dashboard.Booking).filter(dashboard.Booking.status == "pending").order_by(
+                dashboard.Booking.created_at).first()
+            old.status, old.reason = "cancelled", "weather"
+            db.delete(db.query(dashboard.Booking).filter(dashboard.Booking.status == "completed").order_by(
+                dashboard.Booking.created_at).first())
+            db.add(dashboard.Booking(status="confirmed", agent_id="agent9", amount=7.0,
+                                     created_at=self.now - timedelta(days=2)))
+            # In the open hour, left for the next fold
+            db.add(dashboard.Booking(status="cancelled", agent_id="agent1", reason="sick", response_time=3.0))
+            db.commit()
+            # Expired by the commit, so the old values are loaded on change
+            old.status, old.amount = "completed", 1.0
+            db.commit()
+        finally:
+            db.close()
+        self.assertMatchesRawRows()
+
+        dashboard.rollups.fold(dashboard.engine, self.now + timedelta(hours=1))
+        self.assertMatchesRawRows()
+        incremental = [self.rollup_rows(table) for table in (dashboard.rollups.hourly, dashboard.rollups.daily)]
+        with dashboard.engine.begin() as connection:
+            dashboard.rollups.rebuild(connection, dashboard.rollups.watermark(connection), timedelta(days=1))
+        rebuilt = [self.rollup_rows(table) for table in (dashboard.rollups.hourly, dashboard.rollups.daily)]
+        self.assertEqual(rebuilt, incremental)
+
+    def test_fold_is_idempotent(self):
+        later = self.now + timedelta(hours=2)
+        dashboard.rollups.fold(dashboard.engine, later)
+        before = self.rollup_rows(dashboard.rollups.daily)
+        dashboard.rollups._seen = None
+        dashboard.rollups.fold(dashboard.engine, later)
+        self.assertEqual(self.rollup_rows(dashboard.rollups.daily), before)
+        self.assertMatchesRawRows()
+
+    def test_series_counts_each_bucket(self):
+        db = dashboard.SessionLocal()
+        try:
+            db.add(dashboard.Booking(status="confirmed", agent_id="agent1", amount=1.0))
+            db.commit()
+        finally:
+            db.close()
+        response = self.client.get("/dashboard/metrics/bookings/series", params={
+            "grain": "hour", "start": (self.now - timedelta(hours=10)).isoformat(), "end": self.now.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        points = {point["bucket"]: point["total"] for point in response.json()}
+        hour = self.now.replace(minute=0, second=0, microsecond=0)
+        self.assertEqual(points, {
+            hour.isoformat(): 2,
+            (hour - timedelta(hours=5)).isoformat(): 1,
+            (hour - timedelta(hours=10)).isoformat(): 1,
+        })
+        daily = self.client.get("/dashboard/metrics/bookings/series", params={
+            "grain": "day", "status": "cancelled", "start": (self.now - timedelta(days=30)).isoformat(),
+        }).json()
+        self.assertEqual(sum(point["total"] for point in daily), 5)
+        self.assertEqual(self.client.get("/dashboard/metrics/bookings/series", params={
+            "start": self.now.isoformat(), "end": (self.now - timedelta(hours=1)).isoformat(),
+        }).status_code, 422)
+
+
+class TestCustomReports(unittest.TestCase):
+    def setUp(self):
+        dashboard.Base.metadata.drop_all(bind=dashboard.engine)
+        dashboard.create_schema(dashboard.Base.metadata, dashboard.engine)
+        dashboard.rollups._seen = None
+        # Monday 1 January to Sunday 4 February 2024
+        rows = [
+            ("confirmed", "agent1", "hotel", 100.0, datetime(2024, 1, 1, 9)),
+            ("confirmed", "agent2", "car", 50.0, datetime(2024, 1, 7, 23)),
+            ("cancelled", "agent1", "hotel", 80.0, datetime(2024, 1, 8, 0)),
+            ("confirmed", "agent1", "hotel", 20.0, datetime(2024, 1, 31, 12)),
+            ("pending", None, "car", 5.0, datetime(2024, 2, 1, 8)),
+            ("confirmed", "agent3", "hotel", 1.0, datetime(2024, 3, 1, 8)),
+        ]
+        with dashboard.engine.begin() as connection:
+            connection.execute(dashboard.Booking.__table__.insert(), [
+                {"status": status, "agent_id": agent_id, "service_type": service_type, "amount": amount,
+                 "created_at": created_at, "reason": "sick" if status == "cancelled" else None}
+                for status, agent_id, service_type, amount, created_at in rows
+            ])
+            connection.execute(dashboard.AgentActivity.__table__.insert(), [
+                {"agent_id": "agent1", "activity_type": "message", "timestamp": datetime(2024, 1, 2)},
+                {"agent_id": "agent2", "activity_type": "message", "timestamp": datetime(2024, 1, 9)},
+                {"agent_id": "agent2", "activity_type": "login", "timestamp": datetime(2024, 1, 9)},
+            ])
+        self.client = TestClient(dashboard.app)
+        self.params = {
+            "start_date": "2024-01-01", "end_date": "2024-02-04",
+            "metrics": ["bookings", "cancellations", "workers", "chat", "revenue"], "group_by": "week",
+        }
+
+    def wait_for(self, report_id):
+        for _ in range(100):
+            report = self.client.get(f"/dashboard/reports/{report_id}").json()
+            if report["status"] not in ("pending", "running"):
+                return report
+            time.sleep(0.05)
+        self.fail("report did not finish")
+
+    def test_groups_metrics_by_period(self):
+        response = self.client.post("/dashboard/reports", json=self.params)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["status"], "done")
+        self.assertEqual(report["data"], {
+            "group_by": "week",
+            "periods": ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22", "2024-01-29"],
+            "bookings": [2, 1, 0, 0, 2],
+            "cancellations": [0, 1, 0, 0, 0],
+            "workers": [2, 1, 0, 0, 1],
+            "chat": [1, 1, 0, 0, 0],
+            "revenue": [150.0, 0.0, 0.0, 0.0, 20.0],
+            "totals": {"bookings": 5, "cancellations": 1, "workers": 2, "chat": 2, "revenue": 170.0},
+        })
+
+        monthly = self.client.post("/dashboard/reports", json=dict(
+            self.params, group_by="month", metrics=["bookings", "chat", "revenue"],
+            filters={"service_type": "hotel", "agent_id": ["agent1", "agent3"]},
+        )).json()["data"]
+        self.assertEqual(monthly["periods"], ["2024-01-01", "2024-02-01"])
+        self.assertEqual(monthly["bookings"], [3, 0])
+        self.assertEqual(monthly["chat"], [1, 0])
+        self.assertEqual(monthly["revenue"], [120.0, 0.0])
+        self.assertNotIn("workers", monthly)
+
+    def test_large_reports_run_in_background(self):
+        inline = self.client.post("/dashboard/reports", json=self.params).json()
+        with mock.patch.object(dashboard, "REPORT_INLINE_ROWS", 0):
+            response = self.client.post("/dashboard/reports", json=dict(self.params, group_by="day"))
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(response.json()["status"], ("pending", "running", "done"))
+        report = self.wait_for(response.json()["id"])
+        self.assertEqual(report["status"], "done")
+        self.assertEqual(len(report["data"]["periods"]), 35)
+        self.assertEqual(report["data"]["totals"], inline["data"]["totals"])
+
+    def test_reuses_report_until_bookings_change(self):
+        first = self.client.post("/dashboard/reports", json=self.params).json()
+        reordered = dict(self.params, metrics=list(reversed(self.params["metrics"])))
+        self.assertEqual(self.client.post("/dashboard/reports", json=reordered).json()["id"], first["id"])
+
+        db = dashboard.SessionLocal()
+        try:
+            db.add(dashboard.Booking(status="confirmed", agent_id="agent1", amount=5.0,
+                                     created_at=datetime(2024, 1, 2)))
+            db.commit()
+        finally:
+            db.close()
+        fresh = self.client.post("/dashboard/reports", json=self.params).json()
+        self.assertNotEqual(fresh["id"], first["id"])
+        self.assertEqual(fresh["data"]["totals"]["bookings"], 6)
+
+    def test_rejects_bad_parameters(self):
+        for change in (
+            {"metrics": ["profit"]},
+            {"group_by": "year"},
+            {"end_date": "2023-12-31"},
+            {"filters": {"amount": "5"}},
+            {"filters": {"status": []}},
+        ):
+            with self.subTest(change=change):
+                self.assertEqual(self.client.post("/dashboard/reports", json={**self.params, **change}).status_code, 422)
+        self.assertEqual(self.client.get("/dashboard/reports/999").status_code, 404)
+
+class TestRepeatCancellers(unittest.TestCase):
+    def setUp(self):
+        dashboard.Base.metadata.drop_all(bind=dashboard.engine)
+        dashboard.create_schema(dashboard.Base.metadata, dashboard.engine)
+        dashboard.rollups._seen = None
+        self.now = datetime.utcnow()
+        days = {
+            "often": [1, 2, 3, 4],
+            "recent": [0, 5, 6],
+            "earlier": [7, 8, 9],
+            "lapsed": [2, 3, 40],
+            "once": [1],
+        }
+        rows = [
+            {"status": "cancelled", "customer_id": customer_id, "created_at": self.now - timedelta(days=day, hours=1)}
+            for customer_id, ago in days.items() for day in ago
+        ]
+        rows += [{"status": "confirmed", "customer_id": "often", "created_at": self.now - timedelta(days=day)}
+                 for day in range(5)]
+        rows.append({"status": "cancelled", "customer_id": None, "created_at": self.now})
+        with dashboard.engine.begin() as connection:
+            connection.execute(dashboard.Booking.__table__.insert(), rows)
+        self.client = TestClient(dashboard.app)
+
+    def test_ranks_customers_over_the_threshold(self):
+        ranked = self.client.get("/dashboard/metrics/cancellations").json()["repeat_cancellers"]
+        self.assertEqual([(row["customer_id"], row["cancellations"]) for row in ranked],
+                         [("often", 4), ("recent", 3), ("earlier", 3)])
+        self.assertEqual(datetime.fromisoformat(ranked[1]["last_cancelled_at"]), self.now - timedelta(hours=1))
+        self.assertEqual(self.client.get("/dashboard/overview").json()["cancellation_stats"]["repeat_cancellers"],
+                         ranked)
+
+    def test_reads_the_window_off_a_covering_index(self):
+        query = repeat_cancellers_query(dashboard.Booking.__table__, self.now - timedelta(days=30))
+        sql = str(query.compile(dashboard.engine, compile_kwargs={"literal_binds": True}))
+        with dashboard.engine.connect() as connection:
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        self.assertIn("SEARCH bookings USING COVERING INDEX ix_bookings_cancellations (created_at>?)",
+                      plan)
+
+    def test_window_matches_the_query_as_bookings_change(self):
+        bookings = dashboard.Booking.__table__
+        since = self.now - timedelta(days=30)
+        with dashboard.engine.connect() as connection:
+            window = CancellerWindow(connection.execute(cancellations_query(bookings, since)), limit=2)
+        window.add("lapsed", self.now)
+        window.remove("often", self.now - timedelta(days=4, hours=1))
+        window.remove("often", self.now - timedelta(days=3))
+        db = dashboard.SessionLocal()
+        try:
+            db.add(dashboard.Booking(status="cancelled", customer_id="lapsed", created_at=self.now))
+            db.query(dashboard.Booking).filter_by(
+                customer_id="often", created_at=self.now - timedelta(days=4, hours=1)).one().status = "confirmed"
+            db.commit()
+            expected = db.execute(repeat_cancellers_query(bookings, since, limit=2)).all()
+        finally:
+            db.close()
+        self.assertEqual(window.ranked(self.now), [tuple(row) for row in expected])
+        self.assertEqual([row[0] for row in expected], ["lapsed", "recent"])
+        # Days slide out of the window without any write
+        self.assertEqual([row[0] for row in window.ranked(self.now + timedelta(days=25))], ["lapsed", "often"])
+
+    def test_live_overview_re_ranks_when_a_cancellation_leaves_the_window(self):
+        state, _ = dashboard.load_live_overview()
+        expiry = self.now - timedelta(days=9, hours=1) + dashboard.REPEAT_CANCEL_WINDOW
+        self.assertEqual(state.cancellers.next_expiry(), expiry)
+        self.assertFalse(dashboard.live_overview_expired(state))
+        state.cancellers.window -= timedelta(days=22)
+        self.assertTrue(dashboard.live_overview_expired(state))
+        ranked = dashboard.render_live_overview(state)["cancellation_stats"]["repeat_cancellers"]
+        self.assertEqual([row["customer_id"] for row in ranked], ["often", "recent"])
+        self.assertFalse(dashboard.live_overview_expired(state))
+
+
+class TestLiveOverview(unittest.TestCase):
+    def setUp(self):
+        dashboard.Base.metadata.drop_all(bind=dashboard.engine)
+        dashboard.create_schema(dashboard.Base.metadata, dashboard.engine)
+        dashboard.rollups._seen = None
+        self.now = datetime.utcnow()
+        db = dashboard.SessionLocal()
+        try:
+            db.add_all([
+                dashboard.Booking(status="confirmed", agent_id="agent1", amount=100.0, response_time=10.0),
+                dashboard.Booking(status="pending", agent_id="agent2", amount=50.0,
+                                  created_at=self.now - timedelta(days=2)),
+                dashboard.Alert(type="warning", message="Queue is long", severity=3),
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+    def write(self):
+        db = dashboard.SessionLocal()
+        try:
+            db.add(dashboard.Booking(status="confirmed", agent_id="agent3", amount=25.0, response_time=4.0))
+            db.commit()
+            pending = db.query(dashboard.Booking).filter_by(status="pending").one()
+            pending.status = "cancelled"
+            pending.reason = "sick"
+            db.query(dashboard.Alert).one().resolved = True
+            db.add(dashboard.Alert(type="error", message="Payments down", severity=5))
+            db.commit()
+        finally:
+            db.close()
+
+    def merge(self, state, delta):
+        for key, value in delta.items():
+            if value is None:
+                state.pop(key, None)
+            elif isinstance(value, dict) and isinstance(state.get(key), dict):
+                self.merge(state[key], value)
+            else:
+                state[key] = value
+
+    def test_deltas_follow_writes_exactly(self):
+        async def consume():
+            loop = asyncio.get_running_loop()
+            updates = dashboard.live.updates()
+            version, kind, data = await updates.__anext__()
+            self.assertEqual(kind, "snapshot")
+            state = json.loads(data)
+            await loop.run_in_executor(None, self.write)
+            expected = await loop.run_in_executor(None, lambda: json.loads(json.dumps(
+                dashboard.render_live_overview(dashboard.load_live_overview()[0]))))
+            async for message in updates:
+                if message is None:
+                    continue
+                self.assertEqual(message[1], "delta")
+                self.assertGreater(message[0], version)
+                version = message[0]
+                self.merge(state, json.loads(message[2]))
+                if state == expected:
+                    break
+            await updates.aclose()
+            return state
+
+        state = asyncio.run(asyncio.wait_for(consume(), 10))
+        self.assertEqual(state["booking_stats"]["total"], 3)
+        self.assertEqual(state["booking_stats"]["cancelled"], 1)
+        self.assertAlmostEqual(state["booking_stats"]["revenue"], 125.0)
+        self.assertEqual(state["cancellation_stats"]["reasons"], {"sick": 1})
+        self.assertEqual([alert["message"] for alert in state["alerts"].values()], ["Payments down"])
+
+    def test_websocket_sends_snapshot_then_deltas(self):
+        with TestClient(dashboard.app).websocket_connect("/dashboard/live/ws") as websocket:
+            snapshot = websocket.receive_json()
+            self.assertEqual(snapshot["type"], "snapshot")
+            self.assertEqual(snapshot["data"]["booking_stats"]["total"], 2)
+            [alert_id] = snapshot["data"]["alerts"]
+            self.write()
+            alerts = dict(snapshot["data"]["alerts"])
+            while alert_id in alerts or not alerts:
+                message = websocket.receive_json()
+                if message["type"] == "delta":
+                    self.merge(alerts, message["data"].get("alerts", {}))
+        self.assertEqual([alert["severity"] for alert in alerts.values()], [5])
+
+    def test_slow_screen_gets_a_snapshot_instead_of_a_backlog(self):
+        class IdleFeed:
+            async def changes(self, after):
+                yield None
+                await asyncio.Event().wait()
+
+        view = LiveView(IdleFeed(), lambda: ({"n": 0}, 0), None, dict, queue_size=2, interval=60)
+
+        async def consume():
+            updates = view.updates()
+            _, kind, data = await updates.__anext__()
+            for n in range(1, 6):
+                view._state["n"] = n
+                view._dirty = True
+                view._flush()
+            message = await updates.__anext__()
+            await updates.aclose()
+            return kind, json.loads(data), message
+
+        kind, data, (version, latest_kind, latest) = asyncio.run(consume())
+        self.assertEqual((kind, data), ("snapshot", {"n": 0}))
+        self.assertEqual((version, latest_kind, json.loads(latest)), (5, "snapshot", {"n": 5}))
+
+    def test_diff_keeps_changed_fields_only(self):
+        self.assertEqual(
+            diff({"a": 1, "b": {"c": 2, "d": 3}, "e": 4}, {"a": 1, "b": {"c": 2, "d": 5}, "f": [6]}),
+            {"b": {"d": 5}, "e": None, "f": [6]},
+        )
+
 
 def test_dashboard_service():
     print("Testing dashboard service...")
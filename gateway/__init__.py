@@ -0,0 +1 @@
+# Make gateway a package
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+# Priority classes, most important first
+CRITICAL, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", LOW: "low"}
+
+# Share of the worker-wide budget a class may use before it is shed, so
+# analytics reads always go first and critical writes go last.
+GLOBAL_SHARE = {CRITICAL: 1.0, NORMAL: 0.8, LOW: 0.5}
+
+# Critical requests may queue this many times deeper than the mount limit
+CRITICAL_QUEUE_FACTOR = 4
+
+
+class Shed(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+
+class MountLimiter:
+    """Concurrency slots plus a bounded, priority-ordered wait queue."""
+
+    def __init__(self, concurrency, queue_depth, queue_timeout=5.0, retry_after=1):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiters = {priority: deque() for priority in PRIORITY_NAMES}
+
+    def queued(self):
+        return sum(len(waiters) for waiters in self.waiters.values())
+
+    async def acquire(self, priority):
+        if self.active < self.concurrency and not self.queued():
+            self.active += 1
+            return
+
+        depth = self.queue_depth * (CRITICAL_QUEUE_FACTOR if priority == CRITICAL else 1)
+        if self.queued() >= depth:
+            raise Shed(self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Slot was handed over just as we timed out; keep it
+                return
+            self.waiters[priority].remove(future)
+            raise Shed(self.retry_after)
+        except asyncio.CancelledError:
+            if future.done():
+                self.release()
+            else:
+                self.waiters[priority].remove(future)
+            raise
+
+    def release(self):
+        for priority in sorted(self.waiters):
+            waiters = self.waiters[priority]
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    # Hand the slot straight to the waiter; active stays the same
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """Per-mount concurrency limits with priority-aware load shedding.
+
+    ``limits`` maps a mount prefix to a MountLimiter; ``classify`` maps
+    (mount, method, path) to a priority class. Saturated mounts answer with
+    a fast 503 and ``Retry-After`` instead of queueing without bound.
+    ``streaming`` paths are long-lived event streams that bypass the limits,
+    since each would otherwise hold a slot for as long as it is open.
+    """
+
+    def __init__(self, app, limits, classify, metrics, global_limit=None, streaming=()):
+        self.app = app
+        self.limits = limits
+        self.classify = classify
+        self.metrics = metrics
+        self.global_limit = global_limit
+        self.streaming = set(streaming)
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        mount = self.metrics.mount_for(path)
+        limiter = self.limits.get(mount)
+        if limiter is None or path.rstrip("/") in self.streaming:
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.classify(mount, scope["method"], path)
+        if self.global_limit and self.active >= self.global_limit * GLOBAL_SHARE[priority]:
+            await self._shed(send, mount, priority, limiter.retry_after)
+            return
+
+        started = time.perf_counter()
+        try:
+            await limiter.acquire(priority)
+        except Shed as e:
+            await self._shed(send, mount, priority, e.retry_after)
+            return
+        self.metrics.observe_histogram("queue_wait", mount, time.perf_counter() - started)
+
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+            limiter.release()
+
+    async def _shed(self, send, mount, priority, retry_after):
+        self.metrics.inc(f"shed_{PRIORITY_NAMES[priority]}_requests", mount)
+        body = json.dumps({"detail": "Service overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def mount_limit(name, concurrency, queue_depth):
+    """Limits for a mount, overridable with e.g. GATEWAY_REPORTS_CONCURRENCY."""
+    prefix = f"GATEWAY_{name.upper()}"
+    return MountLimiter(
+        int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        int(os.getenv(f"{prefix}_QUEUE", queue_depth)),
+        queue_timeout=float(os.getenv("GATEWAY_QUEUE_TIMEOUT", 5.0)),
+    )
@@ -0,0 +1,283 @@
+"""Benchmarks for the unified gateway.
+
+Compare WSGIMiddleware against WSGIAdapter for each Flask mount, measure
+the per-request cost of the metrics middleware, or compare bytes on the wire
+and CPU per request for each response encoding, or check that database-bound
+endpoints leave the event loop free under 100 concurrent clients. Run from
+the project root:
+
+    python -m gateway.bench_gateway --requests 500 --concurrency 50
+    python -m gateway.bench_gateway --metrics-overhead
+    python -m gateway.bench_gateway --compression
+    python -m gateway.bench_gateway --offload --requests 500 --concurrency 100
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.wsgi import WSGIMiddleware
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway.compression import CompressionMiddleware, brotli
+from gateway.metrics import MetricsMiddleware, MetricsRegistry
+from gateway.wsgi import WSGIAdapter, wsgi_threads
+
+# mount prefix -> (import path, cheap GET endpoint under the mount)
+MOUNTS = {
+    "/ai": ("ai_settings.ai_settings", "/ai/templates"),
+    "/admin": ("admin_controls.admin_controls", "/admin/integrations"),
+    "/monitoring": ("monitoring.monitoring", "/monitoring/token"),
+    "/reports": ("reports.reports", "/reports/token"),
+    "/standby": ("standby.app", "/api/workers"),
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(asgi_app, path, total, concurrency):
+    transport = httpx.ASGITransport(app=asgi_app)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                await client.get(path)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def metrics_overhead(iterations):
+    """Average microseconds MetricsMiddleware adds around a trivial ASGI app."""
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/booking/shifts/42", "path_params": {}}
+    wrapped = MetricsMiddleware(endpoint, MetricsRegistry(["/booking"]))
+
+    timings = {}
+    for name, app in (("bare", endpoint), ("metrics", wrapped)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await app(dict(scope), receive, send)
+        timings[name] = (time.perf_counter() - started) / iterations * 1e6
+    return {
+        "iterations": iterations,
+        "bare_us": round(timings["bare"], 2),
+        "metrics_us": round(timings["metrics"], 2),
+        "overhead_us": round(timings["metrics"] - timings["bare"], 2),
+    }
+
+
+def sample_payloads():
+    """Bodies shaped like the largest responses the gateway serves."""
+    conversations = [
+        {
+            "id": i,
+            "customer_name": f"Customer {i}",
+            "phone_number": f"+3161234{i:04d}",
+            "status": "open" if i % 3 else "closed",
+            "messages": [
+                {"sender": "customer", "text": "Is my booking for tomorrow confirmed?", "timestamp": "2024-01-01T10:00:00"},
+                {"sender": "agent", "text": "Yes, your booking is confirmed for 10:00.", "timestamp": "2024-01-01T10:01:00"},
+            ],
+        }
+        for i in range(500)
+    ]
+    logs = [
+        {"id": i, "automation": "reminder", "status": "success", "message": f"Reminder sent for booking {i}",
+         "created_at": "2024-01-01T10:00:00"}
+        for i in range(2000)
+    ]
+    return {
+        "/chat/conversations/export/json": json.dumps(conversations, indent=2).encode(),
+        "/monitoring/monitoring/data/automation-logs": json.dumps(logs).encode(),
+    }
+
+
+async def compression_cost(iterations, chunk_size=16384):
+    """Bytes sent and CPU milliseconds per request for each encoding."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    results = {}
+    for path, payload in sample_payloads().items():
+        chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+            for i, chunk in enumerate(chunks):
+                await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+        app = CompressionMiddleware(
+            endpoint, {"default": {"enabled": True, "level": 6, "min_size": 1024}}, MetricsRegistry(["/chat", "/monitoring"])
+        )
+        results[path] = {}
+        for encoding in encodings:
+            sent = []
+
+            async def send(message):
+                sent.append(len(message.get("body", b"")))
+
+            scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"accept-encoding", encoding.encode())]}
+            started = time.process_time()
+            for _ in range(iterations):
+                await app(dict(scope), receive, send)
+            cpu = time.process_time() - started
+            results[path][encoding] = {
+                "bytes": sum(sent) // iterations,
+                "cpu_ms_per_request": round(cpu / iterations * 1000, 3),
+            }
+    return results
+
+
+def seed_offload_databases(directory, bookings=50000, workers=2000):
+    """Point dashboard and cancellations at fresh files and fill them."""
+    os.environ["DASHBOARD_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'dashboard.db')}"
+    os.environ["CANCELLATIONS_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'cancellations.db')}"
+    dashboard = importlib.import_module("dashboard.main")
+    cancellations = importlib.import_module("cancellations_panel.main")
+
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with dashboard.engine.begin() as connection:
+        connection.execute(dashboard.Booking.__table__.insert(), [
+            {
+                "status": rng.choice(["confirmed", "cancelled", "standby", "pending", "completed"]),
+                "created_at": now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+                "response_time": rng.uniform(1, 120),
+                "agent_id": f"agent{rng.randrange(50)}",
+                "customer_id": f"customer{rng.randrange(5000)}",
+                "service_type": rng.choice(["cleaning", "catering", "security"]),
+                "amount": rng.uniform(20, 500),
+                "reason": rng.choice([None, "sick", "schedule conflict", "no show"]),
+            }
+            for _ in range(bookings)
+        ])
+    with cancellations.engine.begin() as connection:
+        connection.execute(cancellations.Worker.__table__.insert(), [
+            {"name": f"Worker {i}", "status": True, "is_standby": i % 5 == 0, "created_at": now, "updated_at": now}
+            for i in range(workers)
+        ])
+    return {
+        "/dashboard": (dashboard.app, "/dashboard/overview"),
+        "/cancellations": (cancellations.app, "/workers"),
+        "/chat": (importlib.import_module("chat.app").app, "/conversations/export/json"),
+    }
+
+
+async def offload_load(mounts, total, concurrency):
+    """Throughput per mount, plus how long a trivial endpoint on the same loop waits."""
+    gateway = FastAPI()
+
+    @gateway.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    for prefix, (service, _) in mounts.items():
+        gateway.mount(prefix, service)
+
+    results = {}
+    transport = httpx.ASGITransport(app=gateway)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for prefix, (_, endpoint) in mounts.items():
+            done = asyncio.Event()
+            ping_latencies = []
+
+            async def probe():
+                # Timed from when the probe asks to wake up, so time spent
+                # waiting for a blocked event loop is counted
+                while not done.is_set():
+                    started = time.perf_counter() + 0.01
+                    await asyncio.sleep(0.01)
+                    await client.get("/ping")
+                    ping_latencies.append(time.perf_counter() - started)
+
+            probe_task = asyncio.create_task(probe())
+            load = await run_load(gateway, prefix + endpoint, total, concurrency)
+            done.set()
+            await probe_task
+            load["ping_p50_ms"] = round(percentile(ping_latencies, 50) * 1000, 2)
+            load["ping_p99_ms"] = round(percentile(ping_latencies, 99) * 1000, 2)
+            results[prefix + endpoint] = load
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--metrics-overhead", action="store_true")
+    parser.add_argument("--compression", action="store_true")
+    parser.add_argument("--offload", action="store_true")
+    args = parser.parse_args()
+
+    if args.offload:
+        with tempfile.TemporaryDirectory() as directory:
+            mounts = seed_offload_databases(directory)
+            print(json.dumps(asyncio.run(offload_load(mounts, args.requests, args.concurrency)), indent=2))
+        return
+
+    if args.compression:
+        print(json.dumps(asyncio.run(compression_cost(50)), indent=2))
+        return
+
+    if args.metrics_overhead:
+        print(json.dumps(asyncio.run(metrics_overhead(100000)), indent=2))
+        return
+
+    results = {}
+    for prefix, (module_path, endpoint) in MOUNTS.items():
+        wsgi_app = importlib.import_module(module_path).app
+        name = prefix.strip("/")
+        modes = {
+            "legacy": WSGIMiddleware(wsgi_app),
+            "native": WSGIAdapter(wsgi_app, max_workers=wsgi_threads(name), name=name),
+        }
+        results[prefix] = {}
+        for mode, mounted in modes.items():
+            gateway = FastAPI()
+            gateway.mount(prefix, mounted)
+            results[prefix][mode] = asyncio.run(
+                run_load(gateway, prefix + endpoint, args.requests, args.concurrency)
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
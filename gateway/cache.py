@@ -0,0 +1,271 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+from common.changes import etag_matches
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def normalize_query(query_string):
+    """Sort query parameters so ``?a=1&b=2`` and ``?b=2&a=1`` share an entry."""
+    return urlencode(sorted(parse_qsl(query_string.decode("latin1"), keep_blank_values=True)))
+
+
+def is_private(headers):
+    """Whether a response is for its requester only: it sets a cookie or its
+    Cache-Control says ``private`` or ``no-store``"""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"set-cookie":
+            return True
+        if name == b"cache-control":
+            directives = {directive.split(b"=")[0].strip() for directive in value.lower().split(b",")}
+            if directives & {b"private", b"no-store"}:
+                return True
+    return False
+
+
+class SQLiteCacheBackend:
+    """Cache store shared by all gunicorn workers through one SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache "
+            "(key TEXT PRIMARY KEY, expires_at REAL, meta TEXT, body BLOB)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_generations "
+            "(mount TEXT PRIMARY KEY, generation INTEGER)"
+        )
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=0.1, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT expires_at, meta, body FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[0] < time.time():
+            return None
+        status, headers = json.loads(row[1])
+        return status, [(name.encode("latin1"), value.encode("latin1")) for name, value in headers], row[2]
+
+    def set(self, key, entry, ttl):
+        status, headers, body = entry
+        meta = json.dumps([status, [[name.decode("latin1"), value.decode("latin1")] for name, value in headers]])
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, expires_at, meta, body) VALUES (?, ?, ?, ?)",
+                (key, time.time() + ttl, meta, body),
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+        finally:
+            conn.close()
+
+    def generation(self, mount):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT generation FROM cache_generations WHERE mount = ?", (mount,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+
+    def bump(self, mount):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO cache_generations (mount, generation) VALUES (?, 1) "
+                "ON CONFLICT(mount) DO UPDATE SET generation = generation + 1",
+                (mount,),
+            )
+        finally:
+            conn.close()
+
+
+class ResponseCache:
+    """Bounded LRU of GET responses with per-route TTLs.
+
+    Entries are keyed by mount, path, normalized query string and the
+    mount's generation; any write under a mount bumps its generation, which
+    orphans every cached entry for that mount at once. With a ``backend``
+    the generation and the entries are shared between workers, with the
+    local LRU as a first tier.
+    """
+
+    def __init__(self, ttls, max_entries=1024, max_bytes=32 * 1024 * 1024, backend=None):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 16
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_for(self, path):
+        return self.ttls.get(path.rstrip("/") or "/")
+
+    async def generation(self, mount):
+        if self.backend is not None:
+            try:
+                self.generations[mount] = await asyncio.to_thread(self.backend.generation, mount)
+            except sqlite3.Error:
+                pass
+        return self.generations.get(mount, 0)
+
+    async def invalidate(self, mount):
+        self.generations[mount] = self.generations.get(mount, 0) + 1
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.bump, mount)
+            except sqlite3.Error:
+                pass
+
+    async def get(self, key):
+        item = self.entries.get(key)
+        if item is not None:
+            expires_at, entry = item
+            if expires_at >= time.monotonic():
+                self.entries.move_to_end(key)
+                return entry
+            self._remove(key)
+        if self.backend is not None:
+            try:
+                return await asyncio.to_thread(self.backend.get, key)
+            except sqlite3.Error:
+                return None
+        return None
+
+    async def set(self, key, entry, ttl):
+        body = entry[2]
+        if len(body) > self.max_entry_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl, entry)
+        self.size += len(body)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, key, entry, ttl)
+            except sqlite3.Error:
+                pass
+
+    def _remove(self, key):
+        _, entry = self.entries.pop(key)
+        self.size -= len(entry[2])
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CacheMiddleware:
+    """Serve configured GET routes from a ResponseCache and invalidate on writes."""
+
+    def __init__(self, app, cache, metrics):
+        self.app = app
+        self.cache = cache
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        mount = self.metrics.mount_for(path)
+
+        if method in WRITE_METHODS:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                await self.cache.invalidate(mount)
+            return
+
+        ttl = self.cache.ttl_for(path) if method == "GET" else None
+        headers = dict(scope.get("headers", []))
+        if ttl is None or b"authorization" in headers or b"no-cache" in headers.get(b"cache-control", b""):
+            await self.app(scope, receive, send)
+            return
+
+        generation = await self.cache.generation(mount)
+        key = f"{mount}|{generation}|{path}?{normalize_query(scope['query_string'])}"
+        entry = await self.cache.get(key)
+        if entry is not None:
+            self.cache.hits += 1
+            self.metrics.inc("cache_hits", mount)
+            status, response_headers, body = entry
+            etag = dict(response_headers).get(b"etag")
+            if etag is not None and etag_matches(headers.get(b"if-none-match", b"").decode("latin1"), etag.decode("latin1")):
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [(b"etag", etag), (b"x-cache", b"HIT")],
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": response_headers + [(b"x-cache", b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.cache.misses += 1
+        self.metrics.inc("cache_misses", mount)
+        captured = {"status": None, "headers": None, "body": [], "size": 0, "cacheable": True}
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+                captured["cacheable"] = message["status"] == 200 and not is_private(captured["headers"])
+                message = dict(message)
+                message["headers"] = captured["headers"] + [(b"x-cache", b"MISS")]
+            elif message["type"] == "http.response.body" and captured["cacheable"]:
+                body = message.get("body", b"")
+                captured["size"] += len(body)
+                if captured["size"] > self.cache.max_entry_bytes:
+                    captured["cacheable"] = False
+                    captured["body"] = []
+                else:
+                    captured["body"].append(body)
+            await send(message)
+
+        await self.app(scope, receive, capturing_send)
+
+        if captured["cacheable"] and captured["status"] is not None:
+            await self.cache.set(
+                key, (captured["status"], captured["headers"], b"".join(captured["body"])), ttl
+            )
@@ -0,0 +1,166 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"application/x-ndjson",
+    b"application/javascript",
+    b"application/xml",
+    b"text/csv",
+    b"text/plain",
+    b"text/html",
+    b"text/xml",
+)
+
+
+class _GzipEncoder:
+    name = b"gzip"
+
+    def __init__(self, level):
+        # wbits=31 writes a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class _BrotliEncoder:
+    name = b"br"
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def choose_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return _BrotliEncoder
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return _GzipEncoder
+    return None
+
+
+class CompressionMiddleware:
+    """Compress large text responses incrementally with gzip or brotli.
+
+    ``settings`` maps a mount prefix to ``{"enabled", "min_size", "level"}``
+    with a ``"default"`` entry for everything else. Bodies are held back
+    only until ``min_size`` bytes have arrived, then each chunk is encoded
+    and sent as it comes, so streaming exports are never buffered whole.
+    """
+
+    def __init__(self, app, settings, metrics):
+        self.app = app
+        self.settings = settings
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mount = self.metrics.mount_for(scope["path"])
+        settings = self.settings.get(mount, self.settings["default"])
+        headers = dict(scope.get("headers", []))
+        encoder_class = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin1"))
+        if not settings.get("enabled", True) or encoder_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoder_class, settings.get("level", 6), settings.get("min_size", 1024))
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send, encoder_class, level, min_size):
+        self._send = send
+        self.encoder_class = encoder_class
+        self.level = level
+        self.min_size = min_size
+        self.start = None
+        self.pending = []
+        self.pending_size = 0
+        self.encoder = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = dict((name.lower(), value) for name, value in message.get("headers", []))
+            content_type = headers.get(b"content-type", b"").split(b";")[0].strip()
+            content_length = headers.get(b"content-length")
+            self.passthrough = (
+                content_type not in COMPRESSIBLE_TYPES
+                or b"content-encoding" in headers
+                or (content_length is not None and int(content_length) < self.min_size)
+            )
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if self.pending_size < self.min_size:
+                if more_body:
+                    return
+                # Whole body is below the threshold: send it as is
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": b"".join(self.pending)})
+                return
+            await self._start_encoding()
+            body = b"".join(self.pending)
+            self.pending = []
+
+        data = self.encoder.compress(body)
+        if not more_body:
+            data += self.encoder.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _start_encoding(self):
+        self.encoder = self.encoder_class(self.level)
+        headers = [
+            (name, value) for name, value in self.start.get("headers", [])
+            if name.lower() not in (b"content-length", b"vary", b"etag")
+        ]
+        vary = [value for name, value in self.start.get("headers", []) if name.lower() == b"vary"]
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        headers.append((b"content-encoding", self.encoder.name))
+        # A strong ETag names the identity bytes; the encoded body gets a weak one
+        for name, value in self.start.get("headers", []):
+            if name.lower() == b"etag":
+                headers.append((b"etag", value if value.startswith(b"W/") else b"W/" + value))
+        start = dict(self.start)
+        start["headers"] = headers
+        await self._send(start)
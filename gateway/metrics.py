@@ -0,0 +1,304 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds; the implicit last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Distinct route templates tracked per mount before folding into "other"
+MAX_ROUTES_PER_MOUNT = 200
+
+# Snapshot files not rewritten for this many flush intervals belong to
+# workers that are gone (or stuck), and are deleted when merging
+STALE_FLUSHES = 3
+
+# Series layout: [count, duration_sum, request_bytes, response_bytes, *bucket_counts]
+_COUNT, _SUM, _REQ_BYTES, _RESP_BYTES, _BUCKETS = 0, 1, 2, 3, 4
+
+
+def route_template(path, path_params):
+    """Turn a concrete path into a low-cardinality template.
+
+    Segments matching a path parameter become ``{name}``; any remaining
+    numeric segment becomes ``{id}`` (WSGI mounts expose no params).
+    """
+    by_value = {str(value): name for name, value in (path_params or {}).items()}
+    segments = []
+    for segment in path.split("/"):
+        if segment in by_value:
+            segments.append("{" + by_value[segment] + "}")
+        elif segment.isdigit():
+            segments.append("{id}")
+        else:
+            segments.append(segment)
+    return "/".join(segments)
+
+
+class MetricsRegistry:
+    """Per-process request metrics with optional file-backed aggregation.
+
+    Recording only touches plain dicts and lists from the event loop thread,
+    so no lock is taken on the request path. When ``directory`` is set each
+    worker periodically writes a snapshot there and ``/metrics`` merges the
+    snapshots of every worker.
+    """
+
+    def __init__(self, prefixes, directory=None, flush_interval=5.0):
+        self.prefixes = set(prefixes)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.series = {}
+        self.in_flight = {}
+        self.routes = {}
+        self.counters = {}
+        self.histograms = {}
+        self.pid = os.getpid()
+
+    def mount_for(self, path):
+        prefix = "/" + path.split("/", 2)[1]
+        return prefix if prefix in self.prefixes else "/"
+
+    def inc(self, name, mount, value=1):
+        """Increment a plain counter (e.g. cache hits) for a mount."""
+        key = (name, mount)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_histogram(self, name, mount, value):
+        """Record a value in a per-mount histogram (e.g. queue wait time)."""
+        key = (name, mount)
+        values = self.histograms.get(key)
+        if values is None:
+            values = self.histograms[key] = [0, 0.0] + [0] * (len(BUCKETS) + 1)
+        values[0] += 1
+        values[1] += value
+        values[2 + bisect_left(BUCKETS, value)] += 1
+
+    def observe(self, mount, route, method, status, duration, request_bytes, response_bytes):
+        routes = self.routes.setdefault(mount, set())
+        if route not in routes:
+            if len(routes) >= MAX_ROUTES_PER_MOUNT:
+                route = "other"
+            routes.add(route)
+
+        key = (mount, route, method, str(status))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0, 0.0, 0, 0] + [0] * (len(BUCKETS) + 1)
+        series[_COUNT] += 1
+        series[_SUM] += duration
+        series[_REQ_BYTES] += request_bytes
+        series[_RESP_BYTES] += response_bytes
+        series[_BUCKETS + bisect_left(BUCKETS, duration)] += 1
+
+    def snapshot(self):
+        """A copy of this worker's metrics; take it on the event loop thread"""
+        return {
+            "pid": self.pid,
+            "series": [list(key) + values for key, values in self.series.items()],
+            "in_flight": dict(self.in_flight),
+            "counters": [list(key) + [value] for key, value in self.counters.items()],
+            "histograms": [list(key) + values for key, values in self.histograms.items()],
+        }
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self, snapshot=None):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.pid)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot or self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    async def flush_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await loop.run_in_executor(None, self.flush, self.snapshot())
+            except OSError:
+                pass
+
+    def _snapshots(self, own):
+        if not self.directory:
+            return [own]
+        self.flush(own)
+        snapshots = [own]
+        oldest = time.time() - STALE_FLUSHES * self.flush_interval
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            if path == self._path(self.pid):
+                continue
+            try:
+                modified = os.path.getmtime(path)
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if modified < oldest or not _pid_alive(snapshot["pid"]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+    async def render_in_executor(self):
+        """``render`` with the file reads and the merge off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.render, self.snapshot())
+
+    def render(self, own=None):
+        """Merge all worker snapshots into Prometheus text exposition format.
+
+        ``own`` is this worker's snapshot when taken beforehand on the event
+        loop thread, as ``render_in_executor`` does.
+        """
+        series = {}
+        in_flight = {}
+        counters = {}
+        histograms = {}
+        for snapshot in self._snapshots(own or self.snapshot()):
+            for row in snapshot["series"]:
+                key, values = tuple(row[:4]), row[4:]
+                merged = series.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+            for mount, value in snapshot["in_flight"].items():
+                in_flight[mount] = in_flight.get(mount, 0) + value
+            for name, mount, value in snapshot.get("counters", []):
+                counters[(name, mount)] = counters.get((name, mount), 0) + value
+            for row in snapshot.get("histograms", []):
+                key, values = tuple(row[:2]), row[2:]
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+
+        lines = [
+            "# HELP gateway_requests_total Requests handled by the gateway.",
+            "# TYPE gateway_requests_total counter",
+        ]
+        for key, values in sorted(series.items()):
+            lines.append(f"gateway_requests_total{{{_labels(key)}}} {values[_COUNT]}")
+
+        lines += [
+            "# HELP gateway_request_duration_seconds Request latency.",
+            "# TYPE gateway_request_duration_seconds histogram",
+        ]
+        for key, values in sorted(series.items()):
+            labels = _labels(key)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), values[_BUCKETS:]):
+                cumulative += count
+                lines.append(f'gateway_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"gateway_request_duration_seconds_sum{{{labels}}} {values[_SUM]:.6f}")
+            lines.append(f"gateway_request_duration_seconds_count{{{labels}}} {values[_COUNT]}")
+
+        lines += [
+            "# HELP gateway_request_bytes_total Request body bytes received.",
+            "# TYPE gateway_request_bytes_total counter",
+        ]
+        for key, values in sorted(series.items()):
+            lines.append(f"gateway_request_bytes_total{{{_labels(key)}}} {values[_REQ_BYTES]}")
+
+        lines += [
+            "# HELP gateway_response_bytes_total Response body bytes sent.",
+            "# TYPE gateway_response_bytes_total counter",
+        ]
+        for key, values in sorted(series.items()):
+            lines.append(f"gateway_response_bytes_total{{{_labels(key)}}} {values[_RESP_BYTES]}")
+
+        lines += [
+            "# HELP gateway_requests_in_flight Requests currently being handled.",
+            "# TYPE gateway_requests_in_flight gauge",
+        ]
+        for mount, value in sorted(in_flight.items()):
+            lines.append(f'gateway_requests_in_flight{{mount="{mount}"}} {value}')
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE gateway_{name}_total counter")
+            for (counter, mount), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f'gateway_{name}_total{{mount="{mount}"}} {value}')
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE gateway_{name}_seconds histogram")
+            for (histogram, mount), values in sorted(histograms.items()):
+                if histogram != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), values[2:]):
+                    cumulative += count
+                    lines.append(f'gateway_{name}_seconds_bucket{{mount="{mount}",le="{bound}"}} {cumulative}')
+                lines.append(f'gateway_{name}_seconds_sum{{mount="{mount}"}} {values[1]:.6f}')
+                lines.append(f'gateway_{name}_seconds_count{{mount="{mount}"}} {values[0]}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key):
+    mount, route, method, status = key
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'mount="{mount}",route="{route}",method="{method}",status="{status}"'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-mount request metrics."""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        path = scope["path"]
+        mount = registry.mount_for(path)
+        state = {"status": 500, "request_bytes": 0, "response_bytes": 0}
+
+        async def counting_receive():
+            message = await receive()
+            state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight[mount] = registry.in_flight.get(mount, 0) + 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            duration = time.perf_counter() - started
+            registry.in_flight[mount] -= 1
+            registry.observe(
+                mount,
+                route_template(path, scope.get("path_params")),
+                scope["method"],
+                state["status"],
+                duration,
+                state["request_bytes"],
+                state["response_bytes"],
+            )
@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+import logging
+import time
+
+from common.database import create_schema
+
+logger = logging.getLogger(__name__)
+
+
+class LazyMount:
+    """ASGI app that imports and initializes a service on first use.
+
+    ``module`` is imported in a worker thread so the event loop keeps
+    answering ``/health`` while pandas, table creation and cache warm-up
+    run. ``wrap`` turns the imported app into an ASGI app (e.g. a WSGI
+    adapter) and ``init`` runs once after import.
+    """
+
+    def __init__(self, prefix, module, attr="app", wrap=None, init=None):
+        self.prefix = prefix
+        self.module = module
+        self.attr = attr
+        self.wrap = wrap
+        self.init = init
+        self.app = None
+        self.error = None
+        self.import_seconds = None
+        self.init_seconds = None
+        self._lock = None
+
+    def _load(self):
+        started = time.perf_counter()
+        module = importlib.import_module(self.module)
+        self.import_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if self.init is not None:
+            self.init(module)
+        app = getattr(module, self.attr)
+        if self.wrap is not None:
+            app = self.wrap(app)
+        self.init_seconds = time.perf_counter() - started
+        return app
+
+    async def load(self):
+        if self.app is not None:
+            return self.app
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.app is None:
+                loop = asyncio.get_running_loop()
+                try:
+                    self.app = await loop.run_in_executor(None, self._load)
+                    self.error = None
+                    logger.info(
+                        "Mounted %s (import %.3fs, init %.3fs)",
+                        self.prefix, self.import_seconds, self.init_seconds,
+                    )
+                except Exception as e:
+                    self.error = str(e)
+                    logger.exception("Failed to mount %s", self.prefix)
+                    raise
+        return self.app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            app = await self.load()
+        except Exception:
+            if scope["type"] != "http":
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"5")],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"detail":"Service unavailable"}',
+            })
+            return
+        await app(scope, receive, send)
+
+    def status(self):
+        return {
+            "loaded": self.app is not None,
+            "import_seconds": round(self.import_seconds, 4) if self.import_seconds is not None else None,
+            "init_seconds": round(self.init_seconds, 4) if self.init_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class MountRegistry:
+    """Ordered collection of lazy mounts for the unified gateway."""
+
+    def __init__(self):
+        self.mounts = {}
+
+    def register(self, app, prefix, module, **kwargs):
+        mount = LazyMount(prefix, module, **kwargs)
+        self.mounts[prefix] = mount
+        app.mount(prefix, mount)
+        return mount
+
+    async def warm_up(self):
+        """Load every mount one after another in the background."""
+        for mount in self.mounts.values():
+            try:
+                await mount.load()
+            except Exception:
+                continue
+
+    def status(self):
+        return {prefix: mount.status() for prefix, mount in self.mounts.items()}
+
+
+def create_tables(module):
+    """Create SQLAlchemy tables and indexes for services that only do it under __main__."""
+    if hasattr(module, "Base") and hasattr(module, "engine"):
+        create_schema(module.Base.metadata, module.engine)
@@ -0,0 +1,86 @@
+import asyncio
+
+from gateway.cache import is_private, normalize_query
+
+# Request headers that can change the response body for the same URL
+VARY_HEADERS = (b"accept", b"accept-encoding", b"if-none-match")
+
+
+class SingleFlightMiddleware:
+    """Coalesce identical concurrent GETs into one upstream execution.
+
+    Only paths listed in ``routes`` take part. The first request for a key
+    runs normally while capturing its response; requests with the same key
+    that arrive before it finishes wait and replay the captured response.
+    If the leader fails, its body exceeds ``max_body_bytes`` or its
+    response is private (as CacheMiddleware decides), waiters fall back to
+    running their own request.
+    """
+
+    def __init__(self, app, routes, metrics, max_body_bytes=8 * 1024 * 1024):
+        self.app = app
+        self.routes = set(routes)
+        self.metrics = metrics
+        self.max_body_bytes = max_body_bytes
+        self.in_flight = {}
+        self.coalesced = 0
+
+    def _key(self, scope):
+        headers = dict(scope.get("headers", []))
+        if b"authorization" in headers:
+            return None
+        vary = "|".join(headers.get(name, b"").decode("latin1") for name in VARY_HEADERS)
+        return f"{scope['path']}?{normalize_query(scope['query_string'])}|{vary}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"].rstrip("/") not in self.routes:
+            await self.app(scope, receive, send)
+            return
+
+        key = self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        mount = self.metrics.mount_for(scope["path"])
+        leader = self.in_flight.get(key)
+        if leader is not None:
+            self.coalesced += 1
+            self.metrics.inc("coalesced_requests", mount)
+            result = await asyncio.shield(leader)
+            if result is not None:
+                status, headers, body = result
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+            await self.app(scope, receive, send)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        self.metrics.inc("singleflight_leaders", mount)
+        captured = {"status": None, "headers": None, "body": [], "size": 0, "shareable": True}
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+                captured["shareable"] = not is_private(captured["headers"])
+            elif message["type"] == "http.response.body" and captured["shareable"]:
+                body = message.get("body", b"")
+                captured["size"] += len(body)
+                if captured["size"] > self.max_body_bytes:
+                    captured["shareable"] = False
+                    captured["body"] = []
+                else:
+                    captured["body"].append(body)
+            await send(message)
+
+        result = None
+        try:
+            await self.app(scope, receive, capturing_send)
+            if captured["shareable"] and captured["status"] is not None:
+                result = (captured["status"], captured["headers"], b"".join(captured["body"]))
+        finally:
+            del self.in_flight[key]
+            future.set_result(result)
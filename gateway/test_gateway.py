@@ -0,0 +1,463 @@
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+from fastapi import FastAPI, Response as FastAPIResponse
+from fastapi.testclient import TestClient
+from flask import Flask, Response, request, jsonify
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway.admission import CRITICAL, LOW, AdmissionMiddleware, MountLimiter, mount_limit
+from gateway.cache import CacheMiddleware, ResponseCache, SQLiteCacheBackend
+from gateway.compression import CompressionMiddleware
+from gateway.metrics import MetricsMiddleware, MetricsRegistry
+from gateway.mounts import MountRegistry
+from gateway.singleflight import SingleFlightMiddleware
+from gateway.wsgi import WSGIAdapter
+
+
+def make_flask_app():
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/echo', methods=['POST'])
+    def echo():
+        return jsonify({'length': len(request.get_data()), 'path': request.path, 'root': request.script_root})
+
+    @flask_app.route('/stream')
+    def stream():
+        return Response((f'{i}\n' for i in range(5)), mimetype='text/plain')
+
+    @flask_app.route('/missing')
+    def missing():
+        return jsonify({'error': 'not found'}), 404
+
+    return flask_app
+
+
+class TestWSGIAdapter(unittest.TestCase):
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.mount('/svc', WSGIAdapter(make_flask_app(), max_workers=2, name='svc'))
+        self.client = TestClient(self.app)
+
+    def test_request_body_and_script_root(self):
+        response = self.client.post('/svc/echo', content=b'x' * 200000)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'length': 200000, 'path': '/echo', 'root': '/svc'})
+
+    def test_streamed_response(self):
+        response = self.client.get('/svc/stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, '0\n1\n2\n3\n4\n')
+        self.assertTrue(response.headers['content-type'].startswith('text/plain'))
+
+    def test_status_code_passthrough(self):
+        response = self.client.get('/svc/missing')
+        self.assertEqual(response.status_code, 404)
+
+
+class TestLazyMount(unittest.TestCase):
+    def setUp(self):
+        module = types.ModuleType('lazy_service')
+        module.app = make_flask_app()
+        sys.modules['lazy_service'] = module
+
+        self.app = FastAPI()
+        self.mounts = MountRegistry()
+        self.mounts.register(self.app, '/lazy', 'lazy_service', wrap=WSGIAdapter)
+        self.mounts.register(self.app, '/broken', 'no_such_service_module')
+        self.client = TestClient(self.app)
+
+    def tearDown(self):
+        sys.modules.pop('lazy_service', None)
+
+    def test_loaded_on_first_request(self):
+        self.assertFalse(self.mounts.status()['/lazy']['loaded'])
+
+        response = self.client.get('/lazy/stream')
+        self.assertEqual(response.status_code, 200)
+
+        status = self.mounts.status()['/lazy']
+        self.assertTrue(status['loaded'])
+        self.assertIsNotNone(status['import_seconds'])
+        self.assertIsNotNone(status['init_seconds'])
+
+    def test_failed_import_returns_503(self):
+        response = self.client.get('/broken/anything')
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNotNone(self.mounts.status()['/broken']['error'])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = FastAPI()
+        sub_app = FastAPI()
+
+        @sub_app.get('/items/{item_id}')
+        def get_item(item_id: int):
+            return {'id': item_id}
+
+        self.app.mount('/svc', sub_app)
+        self.app.mount('/legacy', WSGIAdapter(make_flask_app(), max_workers=2, name='legacy'))
+        self.registry = MetricsRegistry(['/svc', '/legacy'])
+        self.app.add_middleware(MetricsMiddleware, registry=self.registry)
+        self.client = TestClient(self.app)
+
+    def test_records_route_templates(self):
+        self.client.get('/svc/items/1')
+        self.client.get('/svc/items/2')
+        self.client.post('/legacy/echo', content=b'abc')
+
+        text = self.registry.render()
+        self.assertIn('gateway_requests_total{mount="/svc",route="/svc/items/{item_id}",method="GET",status="200"} 2', text)
+        self.assertIn('gateway_request_bytes_total{mount="/legacy",route="/legacy/echo",method="POST",status="200"} 3', text)
+        self.assertIn('le="+Inf"} 2', text)
+        self.assertIn('gateway_requests_in_flight{mount="/svc"} 0', text)
+
+    def test_merges_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = MetricsRegistry(['/svc'], directory=directory)
+            second = MetricsRegistry(['/svc'], directory=directory)
+            second.pid = os.getppid()
+            first.observe('/svc', '/svc/items', 'GET', 200, 0.01, 0, 10)
+            second.observe('/svc', '/svc/items', 'GET', 200, 0.02, 0, 10)
+            second.flush()
+
+            text = first.render()
+            self.assertIn('gateway_request_duration_seconds_count{mount="/svc",route="/svc/items",method="GET",status="200"} 2', text)
+            self.assertIn('gateway_response_bytes_total{mount="/svc",route="/svc/items",method="GET",status="200"} 20', text)
+
+    def test_drops_snapshots_of_gone_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = MetricsRegistry(['/svc'], directory=directory)
+            exited = subprocess.Popen([sys.executable, '-c', ''])
+            exited.wait()
+            gone, stuck = MetricsRegistry(['/svc'], directory=directory), MetricsRegistry(['/svc'], directory=directory)
+            gone.pid, stuck.pid = exited.pid, os.getppid()
+            for registry in (first, gone, stuck):
+                registry.observe('/svc', '/svc/items', 'GET', 200, 0.01, 0, 10)
+            gone.flush()
+            stuck.flush()
+            old = time.time() - 4 * stuck.flush_interval
+            os.utime(os.path.join(directory, f'metrics-{stuck.pid}.json'), (old, old))
+
+            text = asyncio.run(first.render_in_executor())
+            self.assertIn('gateway_requests_total{mount="/svc",route="/svc/items",method="GET",status="200"} 1', text)
+            self.assertEqual(os.listdir(directory), [f'metrics-{first.pid}.json'])
+
+
+class TestResponseCache(unittest.TestCase):
+    def make_client(self, cache):
+        app = FastAPI()
+        sub_app = FastAPI()
+        calls = {'count': 0}
+
+        @sub_app.get('/items')
+        def list_items(response: FastAPIResponse, page: int = 1, size: int = 10):
+            calls['count'] += 1
+            response.headers['ETag'] = f'"v{page}"'
+            return {'page': page, 'size': size, 'calls': calls['count']}
+
+        @sub_app.post('/items')
+        def create_item():
+            return {'created': True}
+
+        app.mount('/svc', sub_app)
+        app.add_middleware(CacheMiddleware, cache=cache, metrics=MetricsRegistry(['/svc']))
+        return TestClient(app), calls
+
+    def test_hit_after_fill_with_normalized_query(self):
+        cache = ResponseCache({'/svc/items': 60})
+        client, calls = self.make_client(cache)
+
+        first = client.get('/svc/items?page=2&size=5')
+        second = client.get('/svc/items?size=5&page=2')
+        self.assertEqual(first.headers['x-cache'], 'MISS')
+        self.assertEqual(second.headers['x-cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(calls['count'], 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_cached_etag_answers_304(self):
+        cache = ResponseCache({'/svc/items': 60})
+        client, calls = self.make_client(cache)
+
+        etag = client.get('/svc/items?page=3').headers['etag']
+        response = client.get('/svc/items?page=3', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['etag'], etag)
+        self.assertEqual(calls['count'], 1)
+
+    def test_write_invalidates_mount(self):
+        cache = ResponseCache({'/svc/items': 60})
+        client, calls = self.make_client(cache)
+
+        client.get('/svc/items')
+        client.post('/svc/items')
+        response = client.get('/svc/items')
+        self.assertEqual(response.headers['x-cache'], 'MISS')
+        self.assertEqual(calls['count'], 2)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache({'/svc/items': 60}, max_entries=2)
+        client, calls = self.make_client(cache)
+
+        for page in (1, 2, 3):
+            client.get(f'/svc/items?page={page}')
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(client.get('/svc/items?page=1').headers['x-cache'], 'MISS')
+
+    def test_shared_backend_between_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            first_client, first_calls = self.make_client(ResponseCache({'/svc/items': 60}, backend=SQLiteCacheBackend(path)))
+            second_client, second_calls = self.make_client(ResponseCache({'/svc/items': 60}, backend=SQLiteCacheBackend(path)))
+
+            first_client.get('/svc/items')
+            self.assertEqual(second_client.get('/svc/items').headers['x-cache'], 'HIT')
+            self.assertEqual(second_calls['count'], 0)
+
+            second_client.post('/svc/items')
+            self.assertEqual(first_client.get('/svc/items').headers['x-cache'], 'MISS')
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_identical_gets_share_one_execution(self):
+        calls = {'count': 0}
+
+        async def slow_app(scope, receive, send):
+            calls['count'] += 1
+            await asyncio.sleep(0.05)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'shifts'})
+
+        metrics = MetricsRegistry(['/svc'])
+        app = SingleFlightMiddleware(slow_app, routes={'/svc/shifts'}, metrics=metrics)
+
+        async def request(path, query=b''):
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query, 'headers': []}
+            await app(scope, receive, send)
+            return messages
+
+        async def run():
+            return await asyncio.gather(
+                *(request('/svc/shifts', b'status=active') for _ in range(10)),
+                request('/svc/shifts', b'status=cancelled'),
+                request('/svc/other'),
+            )
+
+        results = asyncio.run(run())
+        self.assertEqual(calls['count'], 3)
+        self.assertEqual(app.coalesced, 9)
+        for messages in results[:10]:
+            self.assertEqual(messages[0]['status'], 200)
+            self.assertEqual(messages[-1]['body'], b'shifts')
+        self.assertIn('gateway_coalesced_requests_total{mount="/svc"} 9', metrics.render())
+
+    def test_private_responses_are_not_shared(self):
+        calls = {'count': 0}
+
+        async def personal_app(scope, receive, send):
+            calls['count'] += 1
+            session = calls['count']
+            await asyncio.sleep(0.05)
+            headers = [(b'set-cookie', b'session=%d' % session)] if scope['path'] == '/svc/shifts' else [
+                (b'cache-control', b'no-store, max-age=0')]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b'mine'})
+
+        app = SingleFlightMiddleware(personal_app, routes={'/svc/shifts', '/svc/me'}, metrics=MetricsRegistry(['/svc']))
+
+        async def request(path):
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                messages.append(message)
+
+            await app({'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []}, receive, send)
+            return messages[0]['headers']
+
+        async def run():
+            return await asyncio.gather(*(request(path) for path in ['/svc/shifts'] * 3 + ['/svc/me'] * 3))
+
+        headers = asyncio.run(run())
+        self.assertEqual(calls['count'], 6)
+        self.assertEqual(len({tuple(sent) for sent in headers[:3]}), 3)
+
+
+class TestAdmission(unittest.TestCase):
+    def run_requests(self, limiter, requests, global_limit=None, path='/svc/items'):
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await release.wait()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        metrics = MetricsRegistry(['/svc'])
+        app = AdmissionMiddleware(
+            slow_app,
+            limits={'/svc': limiter},
+            classify=lambda mount, method, path: CRITICAL if method == 'POST' else LOW,
+            metrics=metrics,
+            global_limit=global_limit,
+            streaming={'/svc/stream'},
+        )
+
+        async def request(method):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {'type': 'http', 'method': method, 'path': path, 'headers': []}
+            await app(scope, None, send)
+            return messages[0]
+
+        async def run():
+            tasks = [asyncio.create_task(request(method)) for method in requests]
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        return asyncio.run(run()), metrics
+
+    def test_sheds_beyond_queue_depth_with_retry_after(self):
+        limiter = MountLimiter(concurrency=1, queue_depth=1, retry_after=3)
+        starts, metrics = self.run_requests(limiter, ['GET', 'GET', 'GET'])
+
+        self.assertEqual([start['status'] for start in starts], [200, 200, 503])
+        self.assertIn((b'retry-after', b'3'), starts[2]['headers'])
+        self.assertIn('gateway_shed_low_requests_total{mount="/svc"} 1', metrics.render())
+        self.assertIn('gateway_queue_wait_seconds_count{mount="/svc"} 2', metrics.render())
+
+    def test_critical_writes_queue_past_reads(self):
+        limiter = MountLimiter(concurrency=1, queue_depth=1)
+        starts, _ = self.run_requests(limiter, ['GET', 'GET', 'POST', 'GET'])
+        self.assertEqual([start['status'] for start in starts], [200, 200, 200, 503])
+
+    def test_low_priority_shed_first_under_global_limit(self):
+        limiter = MountLimiter(concurrency=10, queue_depth=10)
+        starts, _ = self.run_requests(limiter, ['POST', 'GET', 'POST'], global_limit=2)
+        self.assertEqual([start['status'] for start in starts], [200, 503, 200])
+
+    def test_streams_bypass_limits(self):
+        limiter = MountLimiter(concurrency=1, queue_depth=0)
+        starts, _ = self.run_requests(limiter, ['GET', 'GET', 'GET'], path='/svc/stream')
+        self.assertEqual([start['status'] for start in starts], [200, 200, 200])
+        self.assertEqual(limiter.active, 0)
+
+    def test_live_dashboards_leave_dashboard_slots_free(self):
+        import main as gateway
+        limit = gateway.ADMISSION_LIMITS['/dashboard']
+        opened = asyncio.Event()
+        close = asyncio.Event()
+        streams = []
+
+        async def dashboard_app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            if scope['path'] == '/dashboard/dashboard/live':
+                streams.append(scope)
+                if len(streams) == 3 * limit[0]:
+                    opened.set()
+                await close.wait()
+            await send({'type': 'http.response.body', 'body': b''})
+
+        app = AdmissionMiddleware(
+            dashboard_app,
+            limits={'/dashboard': mount_limit('dashboard', *limit)},
+            classify=gateway.request_priority,
+            metrics=MetricsRegistry(['/dashboard']),
+            global_limit=gateway.GLOBAL_CONCURRENCY,
+            streaming=gateway.STREAMING_ROUTES,
+        )
+
+        async def request(path):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            await app({'type': 'http', 'method': 'GET', 'path': path, 'headers': []}, None, send)
+            return messages[0]['status']
+
+        async def run():
+            live = [asyncio.create_task(request('/dashboard/dashboard/live')) for _ in range(3 * limit[0])]
+            await asyncio.wait_for(opened.wait(), 5)
+            report = await asyncio.wait_for(request('/dashboard/dashboard/reports/1'), 5)
+            close.set()
+            return report, await asyncio.gather(*live)
+
+        report, live = asyncio.run(run())
+        self.assertEqual(report, 200)
+        self.assertEqual(set(live), {200})
+
+
+class TestCompression(unittest.TestCase):
+    def request(self, chunks, content_type=b'application/json', accept_encoding=b'gzip', extra_headers=()):
+        async def streaming_app(scope, receive, send):
+            headers = [(b'content-type', content_type), (b'etag', b'"v1"')] + list(extra_headers)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            for i, chunk in enumerate(chunks):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': i < len(chunks) - 1})
+
+        settings = {'default': {'enabled': True, 'level': 6, 'min_size': 256}}
+        app = CompressionMiddleware(streaming_app, settings, MetricsRegistry(['/svc']))
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/svc/export', 'headers': [(b'accept-encoding', accept_encoding)]}
+        asyncio.run(app(scope, None, send))
+        return dict(messages[0]['headers']), messages[1:]
+
+    def test_streams_gzip_chunk_by_chunk(self):
+        chunks = [json.dumps({'id': i, 'message': 'hello ' * 50}).encode() for i in range(20)]
+        headers, bodies = self.request(chunks)
+
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(headers[b'vary'], b'Accept-Encoding')
+        self.assertEqual(headers[b'etag'], b'W/"v1"')
+        self.assertGreater(len(bodies), 1)
+        self.assertFalse(bodies[-1]['more_body'])
+        encoded = b''.join(message['body'] for message in bodies)
+        self.assertEqual(gzip.decompress(encoded), b''.join(chunks))
+        self.assertLess(len(encoded), len(b''.join(chunks)) // 5)
+
+    def test_passes_through_small_binary_or_unaccepted_bodies(self):
+        large = [b'x' * 4096]
+        for headers, bodies in (
+            self.request([b'{}']),
+            self.request(large, content_type=b'image/png'),
+            self.request(large, accept_encoding=b'gzip;q=0, identity'),
+            self.request(large, extra_headers=[(b'content-encoding', b'br')]),
+        ):
+            self.assertNotIn(b'vary', headers)
+            self.assertEqual(headers[b'etag'], b'"v1"')
+            self.assertIn(b''.join(message['body'] for message in bodies), (b'{}', large[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_environ(scope, body):
+    """Build a WSGI environ from an ASGI scope and a readable body stream."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = f"HTTP_{name}".upper().replace("-", "_")
+        value = value.decode("latin1")
+        if key in environ:
+            value = environ[key] + "," + value
+        environ[key] = value
+    return environ
+
+
+class _RequestBody(io.RawIOBase):
+    """Readable wsgi.input that pulls ASGI body chunks on demand.
+
+    Reads happen in the worker thread and hop onto the event loop only when
+    the current chunk is exhausted, so uploads are never buffered whole.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b""
+        self._more_body = True
+
+    def readable(self):
+        return True
+
+    def _pull(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message["type"] == "http.disconnect":
+            self._more_body = False
+            raise ConnectionError("Client disconnected")
+        self._chunk = message.get("body", b"")
+        self._more_body = message.get("more_body", False)
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more_body:
+            self._pull()
+        if not self._chunk:
+            return 0
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+class _WSGIResponder:
+    def __init__(self, app, scope, receive, send, loop):
+        self.app = app
+        self.scope = scope
+        self.send = send
+        self.loop = loop
+        self.body = io.BufferedReader(_RequestBody(receive, loop))
+        self.status = None
+        self.headers = None
+        self.started = False
+
+    def _send(self, message):
+        asyncio.run_coroutine_threadsafe(self.send(message), self.loop).result()
+
+    def _start(self):
+        if not self.started:
+            self.started = True
+            self._send({
+                "type": "http.response.start",
+                "status": self.status,
+                "headers": self.headers,
+            })
+
+    def start_response(self, status, response_headers, exc_info=None):
+        if exc_info is not None and self.started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = int(status.split(" ", 1)[0])
+        self.headers = [
+            (name.strip().encode("ascii").lower(), value.strip().encode("ascii"))
+            for name, value in response_headers
+        ]
+        return self.write
+
+    def write(self, data):
+        if data:
+            self._start()
+            self._send({"type": "http.response.body", "body": data, "more_body": True})
+
+    def run(self):
+        """Run the WSGI app in a worker thread, streaming each chunk out."""
+        environ = build_environ(self.scope, self.body)
+        result = self.app(environ, self.start_response)
+        try:
+            for chunk in result:
+                self.write(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        self._start()
+        self._send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class WSGIAdapter:
+    """ASGI adapter for a WSGI app with its own bounded thread pool.
+
+    Unlike ``WSGIMiddleware`` this streams request and response bodies chunk
+    by chunk and runs the app on a per-mount executor, so a slow Flask service
+    can only tie up ``max_workers`` threads instead of the shared default pool.
+    """
+
+    def __init__(self, app, max_workers=8, name="wsgi"):
+        self.app = app
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"wsgi-{name}")
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        loop = asyncio.get_running_loop()
+        responder = _WSGIResponder(self.app, scope, receive, send, loop)
+        await loop.run_in_executor(self.executor, responder.run)
+
+
+def wsgi_threads(name, default=8):
+    """Thread pool size for a WSGI mount, e.g. GATEWAY_REPORTS_THREADS=4."""
+    value = os.getenv(f"GATEWAY_{name.upper()}_THREADS") or os.getenv("GATEWAY_WSGI_THREADS")
+    return int(value) if value else default
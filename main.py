@@ -1,23 +1,155 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.wsgi import WSGIMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-# FastAPI apps
-from booking_manager.main import app as booking_app
-from dashboard.main import app as dashboard_app
-from cancellations_panel.main import app as cancellations_app
-from chat.app import app as chat_app
-
-# Flask apps
-from ai_settings.ai_settings import app as ai_settings_app
-from admin_controls.admin_controls import app as admin_controls_app
-from monitoring.monitoring import app as monitoring_app
-from reports.reports import app as reports_app
-from standby.app import app as standby_app
+from gateway.admission import CRITICAL, LOW, NORMAL, AdmissionMiddleware, mount_limit
+from gateway.cache import CacheMiddleware, ResponseCache, SQLiteCacheBackend
+from gateway.compression import CompressionMiddleware
+from gateway.metrics import MetricsMiddleware, MetricsRegistry
+from gateway.mounts import MountRegistry, create_tables
+from gateway.singleflight import SingleFlightMiddleware
+from gateway.wsgi import WSGIAdapter, wsgi_threads
 
 app = FastAPI(title="Unified Watsapp API", description="Combined API for all Watsapp services")
 
-# CORS setup
+# GATEWAY_WSGI_MODE=legacy falls back to Starlette's buffering WSGIMiddleware
+WSGI_MODE = os.getenv("GATEWAY_WSGI_MODE", "native")
+
+# GATEWAY_CACHE=0 disables the response cache; GATEWAY_CACHE_DB points all
+# workers at one shared SQLite cache file
+CACHE_ENABLED = os.getenv("GATEWAY_CACHE", "1") != "0"
+CACHE_DB = os.getenv("GATEWAY_CACHE_DB")
+
+# Read-through cache TTLs (seconds) for the GET routes dashboards poll
+CACHE_TTLS = {
+    "/dashboard/dashboard/overview": 5,
+    "/booking/shifts": 5,
+    "/booking/workers": 5,
+    "/ai/ai/templates": 30,
+    "/standby/api/workers": 10,
+}
+
+# Slow idempotent GETs where identical concurrent requests share one execution
+SINGLE_FLIGHT_ROUTES = {
+    "/dashboard/dashboard/overview",
+    "/booking/shifts",
+    "/booking/workers",
+    "/booking/shifts/available-workers",
+}
+
+# Long-lived event streams, exempt from admission limits
+STREAMING_ROUTES = {
+    "/booking/changes/stream",
+    "/dashboard/dashboard/live",
+    "/dashboard/dashboard/live/ws",
+}
+
+# Per-mount (concurrency, queue depth) admission limits for each worker
+ADMISSION_LIMITS = {
+    "/booking": (32, 64),
+    "/dashboard": (8, 16),
+    "/cancellations": (16, 32),
+    "/chat": (8, 16),
+    "/ai": (8, 16),
+    "/admin": (8, 16),
+    "/monitoring": (8, 16),
+    "/reports": (4, 8),
+    "/standby": (8, 16),
+}
+
+# Per-mount response compression. GATEWAY_COMPRESSION=0 turns it off;
+# GATEWAY_COMPRESSION_LEVEL and GATEWAY_COMPRESSION_MIN_SIZE tune the default.
+COMPRESSION_ENABLED = os.getenv("GATEWAY_COMPRESSION", "1") != "0"
+COMPRESSION = {
+    "default": {
+        "enabled": COMPRESSION_ENABLED,
+        "level": int(os.getenv("GATEWAY_COMPRESSION_LEVEL", 6)),
+        "min_size": int(os.getenv("GATEWAY_COMPRESSION_MIN_SIZE", 1024)),
+    },
+    # Exports and log dumps are large and mostly repeated keys
+    "/chat": {"enabled": COMPRESSION_ENABLED, "level": 6, "min_size": 512},
+    "/monitoring": {"enabled": COMPRESSION_ENABLED, "level": 6, "min_size": 512},
+    # Reports serve CSV/XLSX downloads; a cheaper level keeps CPU down
+    "/reports": {"enabled": COMPRESSION_ENABLED, "level": 1, "min_size": 4096},
+}
+
+# Worker-wide cap on admitted requests; low priority is shed at half of it
+GLOBAL_CONCURRENCY = int(os.getenv("GATEWAY_CONCURRENCY", 64))
+
+def request_priority(mount, method, path):
+    """Booking and cancellation writes are critical, analytics reads low."""
+    if mount in ("/booking", "/cancellations") and method != "GET":
+        return CRITICAL
+    if mount in ("/reports", "/dashboard") or "/export" in path:
+        return LOW
+    return NORMAL
+
+# GATEWAY_WARMUP=0 leaves every service to be loaded by its first request
+WARMUP = os.getenv("GATEWAY_WARMUP", "1") != "0"
+
+def wsgi_mount(name):
+    def wrap(wsgi_app):
+        if WSGI_MODE == "legacy":
+            return WSGIMiddleware(wsgi_app)
+        return WSGIAdapter(wsgi_app, max_workers=wsgi_threads(name), name=name)
+    return wrap
+
+def init_booking(module):
+    # Mounted apps get no startup event, so build the occupancy bitmaps and
+    # start the template materializer here
+    create_tables(module)
+    module.load_occupancy()
+    module.start_materializer()
+
+# Services are imported on first request to their prefix (or by the
+# background warm-up), so /health answers before pandas and the ORMs load.
+mounts = MountRegistry()
+
+# Mount FastAPI apps (ASGI)
+mounts.register(app, "/booking", "booking_manager.main", init=init_booking)
+mounts.register(app, "/dashboard", "dashboard.main", init=create_tables)
+mounts.register(app, "/cancellations", "cancellations_panel.main", init=create_tables)
+mounts.register(app, "/chat", "chat.app")
+
+# Mount Flask apps (WSGI)
+mounts.register(app, "/ai", "ai_settings.ai_settings", wrap=wsgi_mount("ai"))
+mounts.register(app, "/admin", "admin_controls.admin_controls", wrap=wsgi_mount("admin"))
+mounts.register(app, "/monitoring", "monitoring.monitoring", wrap=wsgi_mount("monitoring"))
+mounts.register(app, "/reports", "reports.reports", wrap=wsgi_mount("reports"))
+mounts.register(app, "/standby", "standby.app", wrap=wsgi_mount("standby"))
+
+# Per-mount request metrics; with GATEWAY_METRICS_DIR set, every gunicorn
+# worker writes snapshots there and /metrics merges them.
+metrics = MetricsRegistry(mounts.mounts, directory=os.getenv("GATEWAY_METRICS_DIR"))
+
+# Middleware is added innermost first. Requests pass CORS -> metrics ->
+# compression -> cache -> single-flight -> admission, so cache hits and
+# coalesced waiters never take admission slots, the cache stores identity
+# bodies, and metrics count the bytes actually sent.
+app.add_middleware(
+    AdmissionMiddleware,
+    limits={prefix: mount_limit(prefix.strip("/"), *limit) for prefix, limit in ADMISSION_LIMITS.items()},
+    classify=request_priority,
+    metrics=metrics,
+    global_limit=GLOBAL_CONCURRENCY,
+    streaming=STREAMING_ROUTES,
+)
+
+app.add_middleware(SingleFlightMiddleware, routes=SINGLE_FLIGHT_ROUTES, metrics=metrics)
+
+response_cache = ResponseCache(CACHE_TTLS, backend=SQLiteCacheBackend(CACHE_DB) if CACHE_DB else None)
+if CACHE_ENABLED:
+    app.add_middleware(CacheMiddleware, cache=response_cache, metrics=metrics)
+
+app.add_middleware(CompressionMiddleware, settings=COMPRESSION, metrics=metrics)
+
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# CORS setup (outermost, so shed and cached responses carry the headers too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,18 +158,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount FastAPI apps (ASGI)
-app.mount("/booking", booking_app)
-app.mount("/dashboard", dashboard_app)
-app.mount("/cancellations", cancellations_app)
-app.mount("/chat", chat_app)
+@app.on_event("startup")
+async def start_background_tasks():
+    if WARMUP:
+        app.state.warm_up = asyncio.create_task(mounts.warm_up())
+    if metrics.directory:
+        app.state.metrics_flush = asyncio.create_task(metrics.flush_periodically())
 
-# Mount Flask apps (WSGI)
-app.mount("/ai", WSGIMiddleware(ai_settings_app))
-app.mount("/admin", WSGIMiddleware(admin_controls_app))
-app.mount("/monitoring", WSGIMiddleware(monitoring_app))
-app.mount("/reports", WSGIMiddleware(reports_app))
-app.mount("/standby", WSGIMiddleware(standby_app))
+@app.get("/health")
+async def health():
+    """Liveness check; answers before the services have finished loading"""
+    status = mounts.status()
+    return {
+        "status": "ok",
+        "loaded": sum(1 for mount in status.values() if mount["loaded"]),
+        "total": len(status),
+    }
+
+@app.get("/health/mounts")
+async def mount_status():
+    """Per-service load state with import and initialization timings"""
+    return mounts.status()
+
+@app.get("/health/cache")
+async def cache_status():
+    """Response cache size and hit/miss counters for this worker"""
+    return response_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Gateway metrics in Prometheus text format"""
+    return PlainTextResponse(await metrics.render_in_executor(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
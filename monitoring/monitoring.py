@@ -3,13 +3,19 @@ from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from functools import wraps
 import os
+import sys
 import hashlib
 import base64
 import binascii
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.database import configure_flask
+
 # Initialize Flask app and database
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///monitoring.db'
+configure_flask(app, 'monitoring', 'instance/monitoring.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this to a secure key in production
 db = SQLAlchemy(app)
@@ -4,13 +4,19 @@ from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 import os
+import sys
 from functools import wraps
 import base64
 import io
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.database import configure_flask
+
 # Initialize Flask app and database
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///reports.db'
+configure_flask(app, 'reports', 'instance/reports.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this in production
 db = SQLAlchemy(app)
@@ -33,8 +33,12 @@ if ai_path:
 else:
     print("Warning: ai_routes.py not found")
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # --- Local Imports ---
 from .models import db, Worker, StandbyRecord, Shift
+from common.database import configure_flask
 
 # Try to import AI routes
 try:
@@ -51,7 +55,7 @@ app = Flask(__name__)
 CORS(app)
 
 # --- Database Configuration ---
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///standby.db'
+configure_flask(app, 'standby', 'instance/standby.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
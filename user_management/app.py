@@ -2,14 +2,25 @@ from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from flask_cors import CORS
+import os
+import sys
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.changes import track_changes, table_versions, make_etag, etag_matches
+from common.database import configure_flask
 
 app = Flask(__name__)
 CORS(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+configure_flask(app, 'users', 'instance/users.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
+# Keep per-table change counters for ETags
+track_changes(db.session)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_type = db.Column(db.String(50), nullable=False)  # worker, client, admin
@@ -70,8 +81,11 @@ def add_user():
 
 @app.route('/users/all', methods=['GET'])
 def get_all_users():
+    etag = make_etag(table_versions(db.session, [User.__tablename__]), sorted(request.args.items(multi=True)))
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return '', 304, {'ETag': etag}
     users = User.query.all()
-    return jsonify([u.to_dict() for u in users])
+    return jsonify([u.to_dict() for u in users]), 200, {'ETag': etag}
 
 @app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):